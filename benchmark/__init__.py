@@ -0,0 +1,3 @@
+"""
+性能压测，使用模拟com后端，可在linux上无界面运行
+"""
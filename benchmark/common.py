@@ -0,0 +1,112 @@
+"""
+压测公共工具
+"""
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+import psutil
+
+from wechatbot_client.com_wechat.backend import load_messages
+
+DATA_PATH = Path(__file__).parent / "data"
+"""录制消息目录"""
+TIMESTAMP_BASE = 1_600_000_000
+"""生成消息的时间戳起点，时间戳同时作为消息序号，用来在接收端匹配延迟"""
+
+
+def generate_messages(
+    count: int, template_file: Optional[Path] = None
+) -> tuple[list[str], list[int]]:
+    """
+    说明:
+        从录制的消息模板生成指定数量的消息，每条消息的`msgid`与`timestamp`唯一
+
+    参数:
+        * `count`: 消息数量
+        * `template_file`: 模板文件，默认使用`data/messages.jsonl`
+
+    返回:
+        * `list[str]`: 原始消息
+        * `list[int]`: 每条消息的序号(时间戳)
+    """
+    templates = [
+        json.loads(one)
+        for one in load_messages(template_file or DATA_PATH / "messages.jsonl")
+    ]
+    messages = []
+    seqs = []
+    for index in range(count):
+        msg = dict(templates[index % len(templates)])
+        seq = TIMESTAMP_BASE + index
+        msg["msgid"] = index + 1
+        msg["timestamp"] = seq
+        messages.append(json.dumps(msg, ensure_ascii=False))
+        seqs.append(seq)
+    return messages, seqs
+
+
+def percentile(data: list[float], percent: float) -> float:
+    """计算百分位数，data需已排序"""
+    if not data:
+        return 0.0
+    index = min(len(data) - 1, max(0, round(percent / 100 * len(data)) - 1))
+    return data[index]
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    """
+    说明:
+        汇总延迟，单位毫秒
+
+    参数:
+        * `latencies`: 延迟列表，单位秒
+    """
+    data = sorted(latencies)
+    if not data:
+        return {"count": 0}
+    return {
+        "count": len(data),
+        "mean": round(statistics.fmean(data) * 1000, 3),
+        "p50": round(percentile(data, 50) * 1000, 3),
+        "p99": round(percentile(data, 99) * 1000, 3),
+        "max": round(data[-1] * 1000, 3),
+    }
+
+
+class RssSampler:
+    """
+    周期采样进程常驻内存
+    """
+
+    def __init__(self) -> None:
+        self.process = psutil.Process()
+        self.start = self.current()
+        self.peak = self.start
+
+    def current(self) -> int:
+        return self.process.memory_info().rss
+
+    def sample(self) -> None:
+        self.peak = max(self.peak, self.current())
+
+    def dict(self) -> dict[str, float]:
+        """单位MB"""
+        return {
+            "rss_start_mb": round(self.start / 2**20, 1),
+            "rss_peak_mb": round(self.peak / 2**20, 1),
+            "rss_end_mb": round(self.current() / 2**20, 1),
+        }
+
+
+class Timer:
+    """记录运行时长"""
+
+    def __enter__(self) -> "Timer":
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.elapsed = time.perf_counter() - self.begin
@@ -0,0 +1,55 @@
+"""
+原始消息解析微基准，对比pydantic验证与快速解析:
+ - pydantic: `Message.parse_raw`
+ - fast: `parse_message`，字段类型完全符合时直接生成`MessageRecord`
+
+    python -m benchmark.decode --number 20000
+    python -m benchmark.decode --file recorded.jsonl
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from wechatbot_client.com_wechat import Message, MessageRecord, parse_message
+
+from .common import generate_messages
+
+
+def bench(func: Callable[[str], Any], messages: list[str], repeat: int = 5) -> float:
+    """返回单条消息的最短平均耗时，单位微秒"""
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        for one in messages:
+            func(one)
+        best = min(best, (time.perf_counter() - begin) / len(messages) * 1e6)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="原始消息解析微基准")
+    parser.add_argument("--number", type=int, default=20000, help="消息数量")
+    parser.add_argument("--file", type=Path, default=None, help="录制的消息文件")
+    args = parser.parse_args()
+
+    messages, _ = generate_messages(args.number, args.file)
+    for one in messages:
+        if parse_message(one).dict() != Message.parse_raw(one).dict():
+            raise ValueError(f"解析结果不一致: {one}")
+    fast = sum(isinstance(parse_message(one), MessageRecord) for one in messages)
+    pydantic = bench(Message.parse_raw, messages)
+    record = bench(parse_message, messages)
+    result = {
+        "messages": len(messages),
+        "fast_path": round(fast / len(messages), 3),
+        "pydantic_us": round(pydantic, 3),
+        "fast_us": round(record, 3),
+        "speedup": round(pydantic / record, 1),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+action分发开销微基准，对比分发表与原先的反射调用:
+ - legacy: `getattr` + `iscoroutinefunction` + `model.dict()`
+ - table: 预先绑定的分发表 + 直接读取已验证字段
+
+只测试取出函数与参数的开销，不调用action本身:
+    python -m benchmark.dispatch --number 100000
+"""
+import argparse
+import json
+import time
+from inspect import iscoroutinefunction
+
+from wechatbot_client.action_manager import (
+    ActionManager,
+    ActionRequest,
+    check_action_params,
+)
+
+ACTIONS = [
+    ("get_version", {}),
+    ("get_user_info", {"user_id": "wxid_1"}),
+    (
+        "send_message",
+        {
+            "detail_type": "group",
+            "group_id": "1@chatroom",
+            "message": [
+                {"type": "text", "data": {"text": "hello"}},
+                {"type": "mention", "data": {"user_id": "wxid_1"}},
+                {"type": "text", "data": {"text": "world"}},
+            ],
+        },
+    ),
+]
+"""测试的action"""
+
+
+def legacy_dispatch(manager: ActionManager, action_name: str, model) -> None:
+    func = getattr(manager, action_name)
+    iscoroutinefunction(func)
+    func, model.dict()
+
+
+def table_dispatch(manager: ActionManager, action_name: str, model) -> None:
+    func, handler = manager.actions[action_name]
+    handler.is_async
+    func, handler.unpack(model)
+
+
+def bench(func, number: int) -> float:
+    """返回单次调用的平均耗时，单位微秒"""
+    begin = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - begin) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="action分发开销微基准")
+    parser.add_argument("--number", type=int, default=100000, help="每项的执行次数")
+    args = parser.parse_args()
+
+    manager = ActionManager()
+    results = []
+    for action, params in ACTIONS:
+        request = ActionRequest(action=action, params=params)
+        action_name, model = check_action_params(request)
+        legacy = bench(lambda: legacy_dispatch(manager, action_name, model), args.number)
+        table = bench(lambda: table_dispatch(manager, action_name, model), args.number)
+        check = bench(lambda: check_action_params(request), args.number // 10)
+        results.append(
+            {
+                "action": action,
+                "check_action_params_us": round(check, 3),
+                "legacy_dispatch_us": round(legacy, 3),
+                "table_dispatch_us": round(table, 3),
+                "speedup": round(legacy / table, 1),
+            }
+        )
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
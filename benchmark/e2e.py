@@ -0,0 +1,257 @@
+"""
+端到端压测: 模拟com后端重放消息 -> 消息流水线 -> 事件生成 -> 反向ws与webhook上报
+
+在本地启动反向ws与webhook接收端，统计每个接收端的事件吞吐、延迟与进程内存:
+    python -m benchmark.e2e --count 20000 --rate 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+import msgpack
+import websockets
+
+from wechatbot_client.com_wechat import FakeBackend
+from wechatbot_client.config import Config
+from wechatbot_client.log import default_filter
+from wechatbot_client.metrics import metrics
+from wechatbot_client.trace import tracer
+from wechatbot_client.wechat import WeChatManager
+
+from .common import RssSampler, generate_messages, summarize
+
+
+class Sink:
+    """
+    事件接收端，按事件的`time`匹配发送时间
+    """
+
+    name: str
+
+    def __init__(self, sent: dict[int, float], expected: int) -> None:
+        self.sent = sent
+        self.expected = expected
+        self.latencies: list[float] = []
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def on_event(self, event: dict) -> None:
+        now = time.perf_counter()
+        sent = self.sent.get(event.get("time"))
+        if sent is None:
+            # 元事件
+            return
+        self.latencies.append(now - sent)
+        if self.first is None:
+            self.first = now
+        self.last = now
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+    def result(self, started: float) -> dict:
+        elapsed = (self.last or started) - started
+        result = {"sink": self.name, "elapsed_s": round(elapsed, 3)}
+        if elapsed > 0:
+            result["events_per_s"] = round(len(self.latencies) / elapsed, 1)
+        result["latency_ms"] = summarize(self.latencies)
+        return result
+
+
+class WebSocketSink(Sink):
+    """反向ws接收端"""
+
+    name = "reverse_ws"
+
+    def __init__(self, sent: dict[int, float], expected: int) -> None:
+        super().__init__(sent, expected)
+        self.connected = asyncio.Event()
+        self.server = None
+
+    async def handler(self, websocket, path: str = "/") -> None:
+        self.connected.set()
+        async for data in websocket:
+            if isinstance(data, bytes):
+                self.on_event(msgpack.unpackb(data))
+            else:
+                self.on_event(json.loads(data))
+
+    async def start(self, port: int) -> None:
+        self.server = await websockets.serve(
+            self.handler, "127.0.0.1", port, max_size=None
+        )
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class WebhookSink(Sink):
+    """webhook接收端，最小化的http/1.1服务，避免框架开销影响结果"""
+
+    name = "webhook"
+
+    async def handler(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                body = await reader.readexactly(length)
+                # 响应一次写完，避免触发延迟确认
+                writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+                data = json.loads(body)
+                # 合并批次时为事件数组
+                for event in data if isinstance(data, list) else [data]:
+                    self.on_event(event)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, port: int) -> None:
+        self.server = await asyncio.start_server(self.handler, "127.0.0.1", port)
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    default_filter.level = args.log_level
+    messages, seqs = generate_messages(args.count)
+    sent: dict[int, float] = {}
+
+    sinks: list[Sink] = []
+    ws_sink = WebSocketSink(sent, args.count)
+    await ws_sink.start(args.ws_port)
+    sinks.append(ws_sink)
+    webhook_sink = None
+    if not args.no_webhook:
+        webhook_sink = WebhookSink(sent, args.count)
+        await webhook_sink.start(args.webhook_port)
+        sinks.append(webhook_sink)
+
+    config = Config(
+        _env_file=None,
+        com_backend="fake",
+        fake_com_latency=args.latency,
+        websocekt_type="Backward",
+        websocket_url={f"ws://127.0.0.1:{args.ws_port}/"},
+        websocket_encoding=args.encoding,
+        enable_http_webhook=webhook_sink is not None,
+        webhook_url={f"http://127.0.0.1:{args.webhook_port}/"},
+        msg_workers=args.workers,
+        msg_queue_size=args.queue_size,
+        event_journal_enabled=args.journal,
+        webhook_max_in_flight=args.webhook_in_flight,
+        webhook_batch_size=args.webhook_batch,
+        contact_refresh_interval=0,
+        log_level=args.log_level,
+        metrics_enabled=args.metrics,
+        trace_sample_rate=args.trace_rate,
+    )
+    wechat = WeChatManager(config)
+    wechat.init()
+
+    # 替换重放的消息，并在事件线程上报时记录发送时间
+    com_api = wechat.action_manager.com_api
+    com_api.backend = FakeBackend(messages, args.rate, args.latency / 1000, False)
+    reporter = com_api.msg_reporter
+    report = reporter.report
+    seq_iter = iter(seqs)
+
+    def timed_report(msg: str) -> None:
+        sent[next(seq_iter)] = time.perf_counter()
+        report(msg)
+
+    reporter.report = timed_report
+
+    rss = RssSampler()
+    with tempfile.TemporaryDirectory() as cache:
+        # 事件日志写入工作目录下的data目录
+        cwd = os.getcwd()
+        os.chdir(cache)
+        await wechat.start_webhook()
+        await wechat.start_journal()
+        await wechat.start_backward()
+        await asyncio.wait_for(ws_sink.connected.wait(), 10)
+        started = time.perf_counter()
+        wechat.open_recv_msg(cache)
+        waiter = asyncio.gather(*(sink.done.wait() for sink in sinks))
+        deadline = started + args.timeout
+        while not waiter.done() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+            rss.sample()
+        waiter.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await waiter
+        wechat.close()
+        webhook_stats = wechat.webhook_stats()
+        await wechat.stop_backward()
+        await wechat.stop_journal()
+        await wechat.stop_webhook()
+        os.chdir(cwd)
+    await wechat.driver.close_http_client()
+    for sink in sinks:
+        await sink.stop()
+
+    return {
+        "messages": args.count,
+        "rate": args.rate,
+        "com_latency_ms": args.latency,
+        "encoding": args.encoding,
+        "workers": args.workers,
+        "journal": args.journal,
+        "pipeline": wechat.pipeline.stats(),
+        "webhook": webhook_stats,
+        "sinks": [sink.result(started) for sink in sinks],
+        **rss.dict(),
+        "traces": {"started": tracer.started, "finished": tracer.finished},
+        "slow_traces": [trace.dict() for trace in tracer.slowest(args.slow_traces)],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="端到端事件上报压测")
+    parser.add_argument("--count", type=int, default=10000, help="消息数量")
+    parser.add_argument("--rate", type=float, default=2000, help="每秒重放消息数量")
+    parser.add_argument("--latency", type=float, default=0, help="模拟com延迟(毫秒)")
+    parser.add_argument("--workers", type=int, default=4, help="消息处理worker数量")
+    parser.add_argument("--queue-size", type=int, default=1024, help="接收消息队列大小")
+    parser.add_argument(
+        "--encoding", choices=["json", "msgpack"], default="json", help="ws编码"
+    )
+    parser.add_argument("--no-webhook", action="store_true", help="不启用webhook接收端")
+    parser.add_argument("--journal", action="store_true", help="启用事件日志")
+    parser.add_argument("--webhook-in-flight", type=int, default=4, help="webhook并发请求数")
+    parser.add_argument("--webhook-batch", type=int, default=1, help="webhook合并批次大小")
+    parser.add_argument("--ws-port", type=int, default=18080)
+    parser.add_argument("--webhook-port", type=int, default=18081)
+    parser.add_argument("--timeout", type=float, default=120, help="最长运行时间(秒)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument(
+        "--metrics", action="store_true", help="开启指标统计，结束后输出/metrics的内容"
+    )
+    parser.add_argument("--trace-rate", type=float, default=0, help="消息追踪采样率")
+    parser.add_argument(
+        "--slow-traces", type=int, default=1, help="输出耗时最长的追踪数量"
+    )
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.metrics:
+        print(metrics.render())
+
+
+if __name__ == "__main__":
+    main()
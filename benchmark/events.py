@@ -0,0 +1,137 @@
+"""
+消息事件微基准，对比pydantic事件与轻量事件:
+ - pydantic: `GroupMessageEvent`/`PrivateMessageEvent` + `EventPayload` + 日志用的`dict()`
+ - lite: `LiteGroupMessageEvent`/`LitePrivateMessageEvent` + `EventPayload`
+
+事件由录制的消息生成，同时检查两者的json与msgpack编码完全相同:
+    python -m benchmark.events --number 20000
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from wechatbot_client.com_wechat import MessageHandler, parse_message
+from wechatbot_client.file_manager import FileManager
+from wechatbot_client.onebot12 import (
+    GroupMessageEvent,
+    LiteGroupMessageEvent,
+    LiteMessageEvent,
+    PrivateMessageEvent,
+)
+from wechatbot_client.onebot12.event import BotSelf
+from wechatbot_client.wechat.payload import EventPayload
+
+from .common import generate_messages
+
+
+def legacy_event(event: LiteMessageEvent) -> Any:
+    """原先的方式: 生成pydantic事件，总是计算日志用的`dict()`"""
+    params = {
+        "id": event.id,
+        "time": event.time,
+        "self": BotSelf(user_id=event.self_id),
+        "message_id": event.message_id,
+        "message": event.message,
+        "alt_message": event.alt_message,
+        "user_id": event.user_id,
+    }
+    if isinstance(event, LiteGroupMessageEvent):
+        pydantic_event = GroupMessageEvent(group_id=event.group_id, **params)
+    else:
+        pydantic_event = PrivateMessageEvent(**params)
+    pydantic_event.dict()
+    return pydantic_event
+
+
+def legacy(event: LiteMessageEvent) -> EventPayload:
+    """pydantic事件并编码"""
+    return EventPayload(legacy_event(event))
+
+
+def lite(event: LiteMessageEvent) -> EventPayload:
+    """轻量事件: 重新生成轻量事件"""
+    params = {
+        "id": event.id,
+        "time": event.time,
+        "self_id": event.self_id,
+        "message_id": event.message_id,
+        "message": event.message,
+        "user_id": event.user_id,
+        "alt_message": event.alt_message,
+    }
+    if isinstance(event, LiteGroupMessageEvent):
+        return LiteGroupMessageEvent(group_id=event.group_id, **params)
+    return event.__class__(**params)
+
+
+def lite_payload(event: LiteMessageEvent) -> EventPayload:
+    """轻量事件并编码"""
+    return EventPayload(lite(event))
+
+
+def measure(
+    func: Callable[[Any], Any], events: list[LiteMessageEvent]
+) -> dict[str, float]:
+    """单个事件的耗时(微秒)，以及每个事件保留的内存与内存块数"""
+    begin = time.perf_counter()
+    for one in events:
+        func(one)
+    elapsed = (time.perf_counter() - begin) / len(events) * 1e6
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [func(one) for one in events]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in diff)
+    blocks = sum(stat.count_diff for stat in diff)
+    del kept
+    return {
+        "us": round(elapsed, 3),
+        "retained_bytes": round(size / len(events), 1),
+        "retained_blocks": round(blocks / len(events), 1),
+    }
+
+
+async def make_events(number: int) -> list[LiteMessageEvent]:
+    raw_messages, _ = generate_messages(number)
+    with tempfile.TemporaryDirectory() as cache:
+        cache_path = Path(cache)
+        handler = MessageHandler(
+            cache_path / "image", cache_path / "voice", cache_path, FileManager(None)
+        )
+        events = [
+            await handler.message_to_event(parse_message(one)) for one in raw_messages
+        ]
+    return [one for one in events if isinstance(one, LiteMessageEvent)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="消息事件微基准")
+    parser.add_argument("--number", type=int, default=20000, help="消息数量")
+    args = parser.parse_args()
+
+    events = asyncio.run(make_events(args.number))
+    for one in events:
+        old, new = legacy(one), lite_payload(one)
+        if old.json != new.json or old.msgpack != new.msgpack:
+            raise ValueError(f"编码结果不一致: {old.json} != {new.json}")
+
+    result = {
+        "events": len(events),
+        "event": {"pydantic": measure(legacy_event, events)},
+        "event+payload": {"pydantic": measure(legacy, events)},
+    }
+    result["event"]["lite"] = measure(lite, events)
+    result["event+payload"]["lite"] = measure(lite_payload, events)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
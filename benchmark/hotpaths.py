@@ -0,0 +1,140 @@
+"""
+热点路径微基准:
+ - `parse_message`: 原始消息解析
+ - `MessageHandler.message_to_event`: 消息生成事件
+ - `EventPayload`: 事件编码(json与msgpack)
+ - `ActionManager.request`: action调用(经过com线程)
+
+    python -m benchmark.hotpaths --number 20000
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from wechatbot_client.action_manager import (
+    ActionManager,
+    ActionRequest,
+    check_action_params,
+)
+from wechatbot_client.com_wechat import MessageHandler, parse_message
+from wechatbot_client.config import Config
+from wechatbot_client.file_manager import FileManager
+from wechatbot_client.log import default_filter
+from wechatbot_client.wechat.payload import EventPayload
+
+from .common import generate_messages, summarize
+
+ACTIONS = [
+    ("get_version", {}),
+    ("get_friend_list", {}),
+    (
+        "send_message",
+        {
+            "detail_type": "private",
+            "user_id": "wxid_1",
+            "message": [{"type": "text", "data": {"text": "hello"}}],
+        },
+    ),
+]
+"""压测的action"""
+
+
+def bench(name: str, func: Callable[[Any], Any], items: list) -> dict:
+    """同步函数逐条计时"""
+    latencies = []
+    begin = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - begin
+    return {
+        "name": name,
+        "ops_per_s": round(len(items) / elapsed, 1),
+        "latency_ms": summarize(latencies),
+    }
+
+
+async def abench(name: str, func: Callable[[Any], Awaitable], items: list) -> dict:
+    """异步函数逐条计时"""
+    latencies = []
+    begin = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        await func(item)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - begin
+    return {
+        "name": name,
+        "ops_per_s": round(len(items) / elapsed, 1),
+        "latency_ms": summarize(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    default_filter.level = args.log_level
+    raw_messages, _ = generate_messages(args.number)
+    results = []
+
+    results.append(bench("parse_message", parse_message, raw_messages))
+    messages = [parse_message(one) for one in raw_messages]
+
+    with tempfile.TemporaryDirectory() as cache:
+        cache_path = Path(cache)
+        handler = MessageHandler(
+            cache_path / "image", cache_path / "voice", cache_path, FileManager(None)
+        )
+        results.append(
+            await abench(
+                "MessageHandler.message_to_event", handler.message_to_event, messages
+            )
+        )
+        events = [await handler.message_to_event(one) for one in messages]
+    events = [one for one in events if one is not None]
+    results.append(bench("EventPayload.json", EventPayload, events))
+    results.append(
+        bench("EventPayload.msgpack", lambda e: EventPayload(e).msgpack, events)
+    )
+
+    config = Config(
+        _env_file=None,
+        com_backend="fake",
+        fake_com_latency=args.latency,
+        contact_refresh_interval=0,
+        send_rate=0,
+        send_chat_rate=0,
+    )
+    manager = ActionManager()
+    manager.init(FileManager(None), config)
+    for action, params in ACTIONS:
+        requests = [
+            check_action_params(ActionRequest(action=action, params=params))
+            for _ in range(args.number // 10)
+        ]
+        results.append(
+            await abench(
+                f"ActionManager.request[{action}]",
+                lambda item: manager.request(*item),
+                requests,
+            )
+        )
+    manager.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="热点路径微基准")
+    parser.add_argument("--number", type=int, default=20000, help="每项的执行次数")
+    parser.add_argument("--latency", type=float, default=0, help="模拟com延迟(毫秒)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
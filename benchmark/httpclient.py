@@ -0,0 +1,145 @@
+"""
+http客户端压测，在本地启动保持连接的http/1.1服务，对比:
+ - new_client: 每次请求创建新的`httpx.AsyncClient`(原先的实现)
+ - shared: `Driver.request`，使用共享的连接池
+
+服务端每次响应都设置cookie，同时统计携带cookie的请求数量，共享客户端应为0:
+    python -m benchmark.httpclient --number 300 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+from wechatbot_client.config import Config
+from wechatbot_client.driver import Driver, Request
+from wechatbot_client.log import default_filter
+
+from .common import summarize
+
+BODY = json.dumps({"type": "message", "detail_type": "private", "message": "x" * 200})
+"""请求体，与一个webhook事件大小相近"""
+
+
+class StubServer:
+    """最小化的http/1.1服务，响应设置cookie，记录连接数与携带cookie的请求数"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.with_cookie = 0
+
+    async def handler(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name = line.lower()
+                    if name.startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                    elif name.startswith(b"cookie:"):
+                        self.with_cookie += 1
+                await reader.readexactly(length)
+                self.requests += 1
+                writer.write(
+                    b"HTTP/1.1 204 No Content\r\n"
+                    b"Set-Cookie: session=%d; Path=/\r\n"
+                    b"Content-Length: 0\r\n\r\n" % self.requests
+                )
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, port: int) -> None:
+        self.server = await asyncio.start_server(self.handler, "127.0.0.1", port)
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    def reset(self) -> None:
+        self.requests = self.connections = self.with_cookie = 0
+
+
+async def bench(
+    server: StubServer,
+    send: Callable[[], Awaitable[int]],
+    number: int,
+    concurrency: int,
+) -> dict:
+    """以指定并发发送`number`个请求，返回吞吐与延迟"""
+    server.reset()
+    latencies: list[float] = []
+    remaining = number
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            begin = time.perf_counter()
+            status = await send()
+            latencies.append(time.perf_counter() - begin)
+            assert status == 204, status
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - begin
+    return {
+        "concurrency": concurrency,
+        "requests_per_s": round(number / elapsed, 1),
+        "latency_ms": summarize(latencies),
+        "connections": server.connections,
+        "requests_with_cookie": server.with_cookie,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    default_filter.level = "WARNING"
+    url = f"http://127.0.0.1:{args.port}/"
+    server = StubServer()
+    await server.start(args.port)
+    driver = Driver(Config(_env_file=None))
+
+    async def new_client() -> int:
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            response = await client.post(url, content=BODY)
+        return response.status_code
+
+    async def shared() -> int:
+        setup = Request("POST", url, content=BODY, timeout=5.0)
+        response = await driver.request(setup)
+        return response.status_code
+
+    results = {}
+    try:
+        for name, send in (("new_client", new_client), ("shared", shared)):
+            results[name] = [
+                await bench(server, send, args.number, concurrency)
+                for concurrency in sorted({1, args.concurrency})
+            ]
+    finally:
+        await driver.close_http_client()
+        await server.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="http客户端压测")
+    parser.add_argument("--number", type=int, default=300, help="每项的请求数量")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发请求数")
+    parser.add_argument("--port", type=int, default=18082)
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+消息xml解析微基准，对比按需提取字段与原先的完整解析:
+ - legacy: `ET.fromstring` + 逐个`find`
+ - extract: 各处理函数声明的字段，较长的xml增量解析，找到后停止
+
+使用`data/xml.jsonl`中录制的消息xml:
+    python -m benchmark.xmlparse --number 5000
+"""
+import argparse
+import json
+import time
+from typing import Callable, Optional
+from xml.etree import ElementTree as ET
+
+from wechatbot_client.com_wechat.message import (
+    APP_FIELDS,
+    APP_PATHS,
+    CARD_FIELDS,
+    EMOJI_FIELDS,
+    SYS_MSG_FIELDS,
+    SYS_MSG_PATHS,
+    TEXT_FIELDS,
+)
+from wechatbot_client.com_wechat.type import WxType
+from wechatbot_client.com_wechat.xml_fields import XmlScanner, compile_path
+
+from .common import DATA_PATH
+
+
+def legacy_find(root: ET.Element, path: str) -> Optional[str]:
+    """原先处理函数中的`find`"""
+    element, attr = compile_path(path)
+    elem = root.find(f"./{element}") if element else root
+    if elem is None:
+        return None
+    return elem.get(attr) if attr else elem.text
+
+
+def legacy_parse(_type: int, raw: str) -> None:
+    """原先的解析方式，总是完整解析"""
+    root = ET.fromstring(raw)
+    match _type:
+        case WxType.TEXT_MSG:
+            root.find("./atuserlist")
+        case WxType.CARD_MSG:
+            for path in CARD_FIELDS.fields.values():
+                legacy_find(root, path)
+        case WxType.EMOJI_MSG:
+            root.find("./emoji").attrib.get("cdnurl")
+        case WxType.APP_MSG:
+            fields = APP_FIELDS.get(int(root.find("./appmsg/type").text))
+            for path in fields.fields.values() if fields else ():
+                legacy_find(root, path)
+        case WxType.SYSTEM_MSG:
+            fields = SYS_MSG_FIELDS.get(root.attrib["type"])
+            for path in fields.fields.values() if fields else ():
+                legacy_find(root, path)
+
+
+def extract(_type: int, raw: str) -> None:
+    """与处理函数相同的按需提取"""
+    match _type:
+        case WxType.TEXT_MSG:
+            if "<atuserlist" in raw:
+                TEXT_FIELDS.extract(raw)
+        case WxType.CARD_MSG:
+            CARD_FIELDS.extract(raw)
+        case WxType.EMOJI_MSG:
+            EMOJI_FIELDS.extract(raw)
+        case WxType.APP_MSG:
+            scanner = XmlScanner(raw, APP_PATHS)
+            fields = APP_FIELDS.get(int(scanner.get("appmsg/type")))
+            if fields is not None:
+                scanner.extract(fields)
+            scanner.close()
+        case WxType.SYSTEM_MSG:
+            scanner = XmlScanner(raw, SYS_MSG_PATHS)
+            fields = SYS_MSG_FIELDS.get(scanner.get("@type"))
+            if fields is not None:
+                scanner.extract(fields)
+            scanner.close()
+
+
+def bench(func: Callable[[], None], number: int, repeat: int = 5) -> float:
+    """返回单次调用的最短平均耗时，单位微秒"""
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - begin) / number * 1e6)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="消息xml解析微基准")
+    parser.add_argument("--number", type=int, default=5000, help="每项的执行次数")
+    args = parser.parse_args()
+
+    results = []
+    with open(DATA_PATH / "xml.jsonl", encoding="utf-8") as f:
+        payloads = [json.loads(line) for line in f if line.strip()]
+    for payload in payloads:
+        _type, raw = int(payload["type"]), payload["xml"]
+        legacy = bench(lambda: legacy_parse(_type, raw), args.number)
+        new = bench(lambda: extract(_type, raw), args.number)
+        results.append(
+            {
+                "name": payload["name"],
+                "size": len(raw),
+                "legacy_us": round(legacy, 3),
+                "extract_us": round(new, 3),
+                "speedup": round(legacy / new, 1),
+            }
+        )
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
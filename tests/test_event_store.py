@@ -0,0 +1,28 @@
+"""
+get_latest_events的事件存储
+"""
+from wechatbot_client.wechat.event_store import EventStore
+
+
+def test_bounded_drops_oldest() -> None:
+    store = EventStore(3)
+    for index in range(5):
+        store.append(index)
+    assert store.read() == [2, 3, 4]
+
+
+def test_zero_capacity_is_unbounded() -> None:
+    store = EventStore(0)
+    for index in range(2000):
+        store.append(index)
+    assert store.read("a", limit=1000) == list(range(1000))
+    # 只有一个消费者时，读取过的事件被丢弃
+    assert store.first_seq == 1000
+    assert store.read("b") == list(range(1000, 2000))
+    assert store.read("a", limit=500) == list(range(1000, 1500))
+    # 两个消费者都已读取的事件被丢弃
+    assert store.first_seq == 1500
+    store.append(2000)
+    assert store.read("a") == list(range(1500, 2001))
+    assert store.read("b") == [2000]
+    assert len(store) == 0
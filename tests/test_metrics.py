@@ -0,0 +1,50 @@
+"""
+指标统计
+"""
+import asyncio
+import os
+from pathlib import Path
+
+from wechatbot_client.action_manager import ActionRequest
+from wechatbot_client.config import Config
+from wechatbot_client.metrics import get_metrics, metrics
+from wechatbot_client.wechat import WeChatManager
+
+
+def test_metrics_reflect_send(tmp_path: Path) -> None:
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    wechat = WeChatManager(
+        Config(
+            _env_file=None,
+            com_backend="fake",
+            metrics_enabled=True,
+            contact_refresh_interval=0,
+            send_rate=5,
+            send_burst=10,
+        )
+    )
+    try:
+        wechat.init()
+        request = ActionRequest(
+            action="send_message",
+            params={
+                "detail_type": "private",
+                "user_id": "wxid_test",
+                "message": [{"type": "text", "data": {"text": "hello"}}],
+            },
+        )
+
+        async def main() -> str:
+            response = await wechat.action_request(request)
+            assert response.status == "ok", response
+            return (await get_metrics()).body.decode("utf-8")
+
+        body = asyncio.run(main())
+    finally:
+        wechat.close()
+        metrics.enabled = False
+        os.chdir(cwd)
+    # 指标来自init之后实际使用的调度器
+    assert wechat.action_manager.send_scheduler.rate == 5
+    assert 'wechat_send_total{lane="interactive",result="sent"} 1' in body
@@ -0,0 +1,39 @@
+"""
+原始消息解析
+"""
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from wechatbot_client.com_wechat.model import Message, MessageRecord, parse_message
+
+RAW = {
+    "extrainfo": "",
+    "filepath": None,
+    "isSendByPhone": None,
+    "isSendMsg": False,
+    "message": "hello",
+    "msgid": 1,
+    "pid": 2,
+    "self": "wxid_self",
+    "sender": "wxid_sender",
+    "sign": "",
+    "thumb_path": "",
+    "time": "2023-01-02 03:04:05",
+    "timestamp": 1672599845,
+    "type": 1,
+    "wxid": "wxid_sender",
+}
+
+
+def test_fast_record_same_as_message() -> None:
+    record = parse_message(json.dumps(RAW))
+    assert isinstance(record, MessageRecord)
+    assert record.dict() == Message.parse_obj(RAW).dict()
+
+
+@pytest.mark.parametrize("time", ["2023-13-45 99:99:99", "2023-02-30 00:00:00"])
+def test_invalid_time_rejected(time: str) -> None:
+    with pytest.raises(ValidationError):
+        parse_message(json.dumps({**RAW, "time": time}))
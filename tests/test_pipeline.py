@@ -0,0 +1,61 @@
+"""
+接收消息流水线与溢出暂存文件
+"""
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+from wechatbot_client.config import OverflowPolicy
+from wechatbot_client.wechat.pipeline import MessagePipeline, SpillFile
+
+
+def test_spill_drain_spill(tmp_path: Path) -> None:
+    spill = SpillFile(tmp_path / "spill.jsonl")
+    for round in range(3):
+        messages = [f"消息{round}-{index}" for index in range(5)]
+        for msg in messages:
+            spill.push(msg)
+        assert [spill.pop()[0] for _ in messages] == messages
+        assert spill.pending == 0
+        assert spill.path.stat().st_size == 0
+    spill.close()
+
+
+def test_dispatch_survives_bad_spill_line(tmp_path: Path) -> None:
+    handled: list[str] = []
+
+    async def handler(message: SimpleNamespace) -> None:
+        handled.append(message.msg)
+
+    async def main() -> None:
+        pipeline = MessagePipeline(
+            parser=lambda msg: SimpleNamespace(sender="wxid", msg=msg),
+            handler=handler,
+            maxsize=1,
+            worker_count=1,
+            policy=OverflowPolicy.Spill,
+            spill_path=tmp_path / "spill.jsonl",
+        )
+        pipeline.start()
+        # 入口队列已满后写入暂存文件，并损坏第一行暂存的消息
+        await pipeline.put("a")
+        await pipeline.put("b")
+        await pipeline.put("c")
+        pipeline._spill._writer.flush()
+        with open(pipeline._spill.path, mode="r+b") as f:
+            f.write(b"\xff")
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if len(handled) == 2:
+                break
+        # 暂存区清空后再次溢出
+        for msg in ("d", "e", "f"):
+            await pipeline.put(msg)
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if len(handled) == 5:
+                break
+        pipeline.stop()
+
+    asyncio.run(main())
+    assert handled == ["a", "c", "d", "e", "f"]
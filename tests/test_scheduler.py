@@ -0,0 +1,28 @@
+"""
+发送调度器
+"""
+import asyncio
+import time
+
+from wechatbot_client.action_manager.scheduler import SendScheduler
+
+
+def test_configure_in_place() -> None:
+    async def main() -> list[float]:
+        scheduler = SendScheduler()
+        scheduler.configure(
+            rate=10, burst=1, chat_rate=0, chat_burst=1, queue_size=8
+        )
+        sent: list[float] = []
+
+        async def send() -> None:
+            sent.append(time.monotonic())
+
+        await asyncio.gather(*(scheduler.submit("wxid", send) for _ in range(3)))
+        scheduler.stop()
+        return sent
+
+    sent = asyncio.run(main())
+    assert len(sent) == 3
+    # 突发1条后按每秒10条发送
+    assert sent[2] - sent[0] >= 0.18
@@ -19,7 +19,7 @@ def init() -> None:
     env = Env()
     config = Config(_common_config=env.dict())
     default_filter.level = config.log_level
-    log_init(config.log_days)
+    log_init(config.log_days, config.log_queue_size)
     logger.info(f"Current <y><b>Env: {env.environment}</b></y>")
     logger.debug(f"Loaded <y><b>Config</b></y>: {str(config.dict())}")
 
@@ -2,8 +2,8 @@
 用来检测action参数的模块
 """
 
-from inspect import Parameter
-from typing import Callable, ParamSpec, Type, TypeVar
+from inspect import Parameter, iscoroutinefunction
+from typing import Any, Callable, ParamSpec, Type, TypeVar
 
 from pydantic import BaseConfig, BaseModel, Extra, ValidationError, create_model
 
@@ -12,14 +12,49 @@ from wechatbot_client.utils import get_typed_signature, logger_wrapper
 
 from .model import ActionRequest
 
-ACTION_DICT: dict[str, Type[BaseModel]] = {}
-"""标准action模型字典"""
-
 P = ParamSpec("P")
 R = TypeVar("R")
 log = logger_wrapper("Action Manager")
 
 
+class ActionHandler:
+    """
+    action分发表的一项，在注册时生成，调用时不再需要反射
+    """
+
+    __slots__ = ("name", "func", "model", "is_async", "fields")
+
+    name: str
+    """action函数名"""
+    func: Callable[..., Any]
+    """action函数(未绑定)"""
+    model: Type[BaseModel]
+    """参数验证模型"""
+    is_async: bool
+    """是否为协程函数"""
+    fields: tuple[str, ...]
+    """参数名"""
+
+    def __init__(self, func: Callable[..., Any], model: Type[BaseModel]) -> None:
+        self.name = func.__name__
+        self.func = func
+        self.model = model
+        self.is_async = iscoroutinefunction(func)
+        self.fields = tuple(model.__fields__)
+
+    def unpack(self, model: BaseModel) -> dict[str, Any]:
+        """
+        说明:
+            取出参数，直接读取已验证的字段，不像`model.dict()`那样再复制一遍
+        """
+        values = model.__dict__
+        return {name: values[name] for name in self.fields}
+
+
+ACTION_TABLE: dict[str, ActionHandler] = {}
+"""action分发表，键为请求的action名称"""
+
+
 class ModelConfig(BaseConfig):
     """action模型config"""
 
@@ -45,26 +80,21 @@ def check_action_params(request: ActionRequest) -> tuple[str, BaseModel]:
     if request.params is None:
         request.params = {}
 
-    action_model = ACTION_DICT.get(request.action)
-    if action_model is None:
+    handler = ACTION_TABLE.get(request.action)
+    if handler is None:
         log("ERROR", f"<r>未实现的action:{request.action}</r>")
         raise TypeError(f"未实现的action:{request.action}")
 
     try:
-        model = action_model.parse_obj(request.params)
+        model = handler.model.parse_obj(request.params)
     except ValidationError as e:
         log("ERROR", f"<r>action参数错误:{e}</r>")
         raise ValueError("请求参数错误...")
-    return action_model.__name__, model
+    return handler.name, model
 
 
-def standard_action(func: Callable[P, R]) -> Callable[P, R]:
-    """
-    说明:
-        使用此装饰器表示将此函数加入标准action字典中，会生成验证模型，注意参数的类型标注
-    """
-
-    global ACTION_DICT
+def _create_model(func: Callable[..., Any]) -> Type[BaseModel]:
+    """根据函数签名生成参数验证模型"""
     signature = get_typed_signature(func)
     field = {}
     for parameter in signature.parameters.values():
@@ -76,8 +106,17 @@ def standard_action(func: Callable[P, R]) -> Callable[P, R]:
                 field[name] = (annotation, ...)
             else:
                 field[name] = (annotation, default)
-    action_type = create_model(func.__name__, __config__=ModelConfig, **field)
-    ACTION_DICT[func.__name__] = action_type
+    return create_model(func.__name__, __config__=ModelConfig, **field)
+
+
+def standard_action(func: Callable[P, R]) -> Callable[P, R]:
+    """
+    说明:
+        使用此装饰器表示将此函数加入标准action字典中，会生成验证模型，注意参数的类型标注
+    """
+
+    global ACTION_TABLE
+    ACTION_TABLE[func.__name__] = ActionHandler(func, _create_model(func))
     return func
 
 
@@ -88,21 +127,9 @@ def expand_action(func: Callable[P, R]) -> Callable[P, R]:
         拓展action会使用<PREFIX>.action
     """
 
-    global ACTION_DICT
-    signature = get_typed_signature(func)
-    field = {}
-    for parameter in signature.parameters.values():
-        name = parameter.name
-        annotation = parameter.annotation
-        default = parameter.default
-        if name != "self":
-            if default == Parameter.empty:
-                field[name] = (annotation, ...)
-            else:
-                field[name] = (annotation, default)
-    action_type = create_model(func.__name__, __config__=ModelConfig, **field)
+    global ACTION_TABLE
     action_name = f"{PREFIX}.{func.__name__}"
-    ACTION_DICT[action_name] = action_type
+    ACTION_TABLE[action_name] = ActionHandler(func, _create_model(func))
     return func
 
 
@@ -110,4 +137,4 @@ def get_supported_actions() -> list[str]:
     """
     获取支持的动作列表
     """
-    return list(ACTION_DICT.keys())
+    return list(ACTION_TABLE.keys())
@@ -1,28 +1,82 @@
+import asyncio
 import time
 from base64 import b64decode
+from functools import partial
 from inspect import iscoroutinefunction
 from pathlib import Path
 from sys import exit
-from typing import Callable, Literal, Optional, ParamSpec, TypeVar, Union
-
-from pydantic import BaseModel
-
-from wechatbot_client.com_wechat import ComWechatApi
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Coroutine,
+    Literal,
+    Optional,
+    ParamSpec,
+    TypeVar,
+    Union,
+)
+
+from pydantic import BaseModel, ValidationError
+
+from wechatbot_client.com_wechat import (
+    AsyncComWechatApi,
+    ComWechatApi,
+    create_backend,
+)
 from wechatbot_client.config import Config
 from wechatbot_client.consts import IMPL, ONEBOT_VERSION, PREFIX, VERSION
-from wechatbot_client.exception import FileNotFound, NoThisUserInGroup
+from wechatbot_client.exception import (
+    ComCallTimeout,
+    FileNotFound,
+    NoThisUserInGroup,
+    SendQueueFull,
+)
 from wechatbot_client.file_manager import FileCache, FileManager
+from wechatbot_client.metrics import ACTION_SECONDS, ACTIONS, metrics
 from wechatbot_client.onebot12 import Message, MessageSegment
+from wechatbot_client.trace import Trace, tracer
 from wechatbot_client.utils import escape_tag, logger_wrapper
 
-from .check import expand_action, get_supported_actions, standard_action
-from .model import ActionResponse, BotSelf
+from .check import (
+    ACTION_TABLE,
+    ActionHandler,
+    check_action_params,
+    expand_action,
+    get_supported_actions,
+    standard_action,
+)
+from .model import ActionRequest, ActionResponse, BotSelf
+from .scheduler import SendPriority, SendScheduler, send_priority
 
 log = logger_wrapper("Action Manager")
 P = ParamSpec("P")
 R = TypeVar("R")
 
-SEGMENT_HANDLER: dict[str, Callable[P, R]] = {}
+
+class SegmentHandler:
+    """
+    消息段处理函数，注册时记录是否为协程函数
+    """
+
+    __slots__ = ("func", "is_async")
+
+    func: Callable[..., Any]
+    """处理函数(未绑定)"""
+    is_async: bool
+    """是否为协程函数"""
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        self.func = func
+        self.is_async = iscoroutinefunction(func)
+
+    async def __call__(self, *args: Any) -> Any:
+        if self.is_async:
+            return await self.func(*args)
+        return self.func(*args)
+
+
+SEGMENT_HANDLER: dict[str, SegmentHandler] = {}
 """消息段处理函数"""
 
 
@@ -33,27 +87,56 @@ def add_segment_handler(_type: str) -> Callable[P, R]:
 
     def _handler(func: Callable[P, R]) -> Callable[P, R]:
         global SEGMENT_HANDLER
-        SEGMENT_HANDLER[_type] = func
+        SEGMENT_HANDLER[_type] = SegmentHandler(func)
         return func
 
     return _handler
 
 
+def message_cost(message: Message) -> int:
+    """
+    说明:
+        发送消息时实际发出的消息条数，at会合并到文本中
+    """
+    return sum(
+        segment.type != "mention" and segment.type != "mention_all"
+        for segment in message
+    )
+
+
 class ApiManager:
     """
     api管理器，实现与com交互
     """
 
     com_api: ComWechatApi
-    """com交互api"""
+    """com交互api，只能在com线程中使用"""
+    com: AsyncComWechatApi
+    """com交互api的异步外观，在事件循环中使用"""
     file_manager: FileManager
     """文件管理器"""
     file_base_url: str
     """文件base url"""
+    actions: dict[str, tuple[Callable[..., Any], ActionHandler]]
+    """绑定到实例的action分发表，键为action函数名"""
+    batch_max_size: int
+    """批量action单次请求的action数量上限"""
+    batch_max_concurrency: int
+    """批量action的并发数量上限"""
+    send_scheduler: SendScheduler
+    """发送调度器，所有发送消息的action都经过它限速排队"""
 
     def __init__(self) -> None:
         self.com_api = ComWechatApi()
+        self.com = AsyncComWechatApi(self.com_api)
         self.file_manager = None
+        self.actions = {
+            handler.name: (getattr(self, handler.name), handler)
+            for handler in ACTION_TABLE.values()
+        }
+        self.batch_max_size = 1000
+        self.batch_max_concurrency = 16
+        self.send_scheduler = SendScheduler()
 
     def init(self, file_manager: FileManager, config: Config) -> None:
         """
@@ -61,22 +144,37 @@ class ApiManager:
         """
         self.file_manager = file_manager
         self.file_base_url = f"http://{config.host}:{config.port}/get_file/"
+        self.batch_max_size = config.batch_max_size
+        self.batch_max_concurrency = config.batch_max_concurrency
+        self.send_scheduler.configure(
+            rate=config.send_rate,
+            burst=config.send_burst,
+            chat_rate=config.send_chat_rate,
+            chat_burst=config.send_chat_burst,
+            queue_size=config.send_queue_size,
+        )
+        self.com_api.group_members.ttl = config.group_member_cache_ttl
+        self.com_api.group_members.max_members = config.group_member_cache_size
+        self.com.timeout = config.com_call_timeout or None
+        self.com_api.backend = create_backend(config)
+        # com对象只能在创建它的线程中使用，初始化也在com线程中进行
+        self.com.start()
         # 初始化com组件
         log("DEBUG", "<y>初始化com组件...</y>")
-        if not self.com_api.init():
+        if not self.com.call_sync(self.com_api.init):
             log("ERROR", "<r>未安装com组件，启动失败，请使用目录下`install.bat`安装组件...</r>")
             exit(0)
         log("DEBUG", "<g>com组件初始化成功...</g>")
         # 启动微信进程
         log("DEBUG", "<y>正在初始化微信进程...</y>")
-        if not self.com_api.init_wechat_pid():
+        if not self.com.call_sync(self.com_api.init_wechat_pid):
             log("ERROR", "<r>微信进程启动失败...</r>")
             self.com_api.close()
             exit(0)
         log("DEBUG", "<g>找到微信进程...</g>")
         # 注入dll
         log("DEBUG", "<y>正在注入微信...</y>")
-        if not self.com_api.start_service():
+        if not self.com.call_sync(self.com_api.start_service):
             log("ERROR", "<r>微信进程启动失败...</r>")
             self.com_api.close()
             exit(0)
@@ -95,7 +193,7 @@ class ApiManager:
         """
         while True:
             try:
-                if self.com_api.is_wechat_login():
+                if self.com.call_sync(self.com_api.is_wechat_login):
                     return True
                 time.sleep(1)
             except KeyboardInterrupt:
@@ -109,20 +207,24 @@ class ApiManager:
         self.com_api.register_msg_event()
         log("DEBUG", "<g>注册消息事件成功...</g>")
         # 启动消息hook
-        result = self.com_api.start_receive_message()
+        result = self.com.call_sync(self.com_api.start_receive_message)
         if not result:
             log("ERROR", "<r>启动消息hook失败...</r>")
         log("DEBUG", "<g>启动消息hook成功...</g>")
         # 启动图片hook
         file = Path(file_path)
         img_file = file / "image"
-        result = self.com_api.hook_image_msg(str(img_file.absolute()))
+        result = self.com.call_sync(
+            self.com_api.hook_image_msg, str(img_file.absolute())
+        )
         if not result:
             log("ERROR", "<r>启动图片hook失败...</r>")
         log("DEBUG", "<g>启动图片hook成功...</g>")
         # 启动语音hook
         voice_file = file / "voice"
-        result = self.com_api.hook_voice_msg(str(voice_file.absolute()))
+        result = self.com.call_sync(
+            self.com_api.hook_voice_msg, str(voice_file.absolute())
+        )
         if not result:
             log("ERROR", "<r>启动语音hook失败...</r>")
         log("DEBUG", "<g>启动语音hook成功...</g>")
@@ -131,13 +233,50 @@ class ApiManager:
         """
         关闭
         """
+        self.send_scheduler.stop()
         self.com_api.close()
+        self.com.shutdown()
 
     def get_info(self) -> dict:
         """
         获取自身信息
         """
-        return self.com_api.get_self_info()
+        return self.com.call_sync(self.com_api.get_self_info)
+
+    async def refresh_contacts(self) -> int:
+        """
+        重新加载通讯录，返回联系人数量
+        """
+        return len(await self.com.get_contacts())
+
+    async def invalidate_group_members(self, group_id: str) -> None:
+        """
+        说明:
+            群成员变动时，使群成员缓存失效
+
+        参数:
+            * `group_id`: 群聊id
+        """
+        # 缓存只在com线程中读写
+        await self.com.run(self.com_api.group_members.invalidate, group_id)
+
+    async def sync_contact(self, wxid: str) -> None:
+        """
+        说明:
+            联系人不在通讯录中时，查询后增量加入
+
+        参数:
+            * `wxid`: 联系人wxid
+        """
+        if await self.com.run(self._sync_contact, wxid):
+            log("DEBUG", f"通讯录新增联系人: {wxid}")
+
+    def _sync_contact(self, wxid: str) -> bool:
+        """在com线程中检查并加入联系人，返回是否新增"""
+        contacts = self.com_api.contacts
+        if not contacts.loaded or wxid in contacts:
+            return False
+        return self.com_api.add_contact(wxid) is not None
 
     async def request(
         self, action_name: str, action_model: BaseModel
@@ -153,35 +292,165 @@ class ApiManager:
         返回:
             * `response`: action返回值
         """
-        func = getattr(self, action_name)
+        if not metrics.enabled:
+            return await self._request(action_name, action_model)
+        begin = time.perf_counter()
+        response = await self._request(action_name, action_model)
+        ACTION_SECONDS.observe(time.perf_counter() - begin, action_name)
+        ACTIONS.inc(action_name, response.status)
+        return response
+
+    async def _request(
+        self, action_name: str, action_model: BaseModel
+    ) -> ActionResponse:
+        """调用action，所有错误转换为失败的响应"""
+        func, handler = self.actions[action_name]
         try:
-            if iscoroutinefunction(func):
-                result = await func(**action_model.dict())
+            if handler.is_async:
+                result = await func(**handler.unpack(action_model))
             else:
-                result = func(**action_model.dict())
+                result = func(**handler.unpack(action_model))
+        except ComCallTimeout as e:
+            log("ERROR", f"<r>调用api超时: {e}</r>")
+            return ActionResponse(
+                status="failed", retcode=20002, message="com调用超时", data=None
+            )
+        except SendQueueFull as e:
+            log("WARNING", f"<y>{e}</y>")
+            return ActionResponse(
+                status="failed", retcode=36000, message="发送队列已满，请稍后再试", data=None
+            )
         except Exception as e:
             log("ERROR", f"<r>调用api错误: {e}</r>")
             return ActionResponse(
                 status="failed", retcode=20002, message="内部服务错误", data=None
             )
-        log("DEBUG", f"<g>调用api成功，返回:</g> {escape_tag(str(result))}")
+        log("DEBUG", lambda: f"<g>调用api成功，返回:</g> {escape_tag(str(result))}")
         return result
 
-    def register_message_handler(self, func: Callable[[str], None]) -> None:
+    async def call_action(self, request: ActionRequest) -> ActionResponse:
+        """
+        说明:
+            验证action参数并调用
+
+        参数:
+            * `request`: action请求
+
+        返回:
+            * `ActionResponse`: action返回值
+        """
+        try:
+            action_name, action_model = check_action_params(request)
+        except TypeError:
+            return ActionResponse(
+                status="failed",
+                retcode=10002,
+                data=None,
+                message=f"未实现的action: {request.action}",
+            )
+        except ValueError:
+            return ActionResponse(
+                status="failed",
+                retcode=10003,
+                data=None,
+                message="Param参数错误",
+            )
+        return await self.request(action_name, action_model)
+
+    def check_batch(
+        self, actions: list[dict], concurrency: int
+    ) -> Optional[ActionResponse]:
+        """
+        说明:
+            检测批量action的数量与并发数
+
+        返回:
+            * `ActionResponse`: 不符合时的错误返回值，符合时为None
+        """
+        if len(actions) > self.batch_max_size:
+            return ActionResponse(
+                status="failed",
+                retcode=10003,
+                data=None,
+                message=f"action数量超过上限: {self.batch_max_size}",
+            )
+        if not 1 <= concurrency <= self.batch_max_concurrency:
+            return ActionResponse(
+                status="failed",
+                retcode=10003,
+                data=None,
+                message=f"并发数需要在 1 到 {self.batch_max_concurrency} 之间",
+            )
+        return None
+
+    async def _call_batch_item(self, item: dict) -> ActionResponse:
+        """执行批量action中的一项"""
+        try:
+            request = ActionRequest.parse_obj({"params": {}, **item})
+        except (ValidationError, TypeError):
+            return ActionResponse(
+                status="failed", retcode=10001, data=None, message="无效的action请求"
+            )
+        if request.action == f"{PREFIX}.batch":
+            return ActionResponse(
+                status="failed", retcode=10003, data=None, message="不支持嵌套批量action"
+            )
+        # 在各自的task中执行，只影响本项，批量发送让位于交互回复
+        send_priority.set(SendPriority.Bulk)
+        return await self.call_action(request)
+
+    async def run_batch(
+        self, actions: list[dict], concurrency: int, ordered: bool
+    ) -> AsyncGenerator[tuple[int, ActionResponse], None]:
+        """
+        说明:
+            按顺序开始执行多个action，最多同时执行`concurrency`个，每项的错误互不影响
+
+        参数:
+            * `actions`: action请求列表
+            * `concurrency`: 并发数
+            * `ordered`: 是否按请求顺序产出结果，否则按完成顺序
+
+        返回:
+            * `tuple[int, ActionResponse]`: 请求序号与返回值
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, item: dict) -> tuple[int, ActionResponse]:
+            async with semaphore:
+                return index, await self._call_batch_item(item)
+
+        tasks = [
+            asyncio.create_task(run(index, item)) for index, item in enumerate(actions)
+        ]
+        try:
+            if ordered:
+                for task in tasks:
+                    yield await task
+            else:
+                for future in asyncio.as_completed(tasks):
+                    yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def register_message_handler(
+        self, func: Callable[[str, Optional[Trace]], Coroutine]
+    ) -> None:
         """注册一个消息处理器"""
         self.com_api.register_message_handler(func)
 
     @add_segment_handler("text")
-    def _send_text(
+    async def _send_text(
         self, id: str, segment: MessageSegment, at_list: list[str] = None
     ) -> bool:
         """
         发送文本
         """
         if at_list is None:
-            return self.com_api.send_text(wxid=id, message=segment.data["text"])
+            return await self.com.send_text(wxid=id, message=segment.data["text"])
         else:
-            return self.com_api.send_at_message(
+            return await self.com.send_at_message(
                 group_id=id,
                 at_users=at_list,
                 message=segment.data["text"],
@@ -195,7 +464,7 @@ class ApiManager:
         file_path, _ = await self.file_manager.get_file(file_id)
         if file_path is None:
             raise FileNotFound(file_id)
-        return self.com_api.send_image(id, file_path)
+        return await self.com.send_image(id, file_path)
 
     @add_segment_handler("file")
     async def _send_file(self, id: str, segment: MessageSegment) -> bool:
@@ -204,7 +473,7 @@ class ApiManager:
         file_path, _ = await self.file_manager.get_file(file_id)
         if file_path is None:
             raise FileNotFound(file_id)
-        return self.com_api.send_file(id, file_path)
+        return await self.com.send_file(id, file_path)
 
     @add_segment_handler(f"{PREFIX}.emoji")
     async def _send_emoji(self, id: str, segment: MessageSegment) -> bool:
@@ -213,7 +482,7 @@ class ApiManager:
         file_path, _ = await self.file_manager.get_file(file_id)
         if file_path is None:
             raise FileNotFound(file_id)
-        return self.com_api.send_gif(id, file_path)
+        return await self.com.send_gif(id, file_path)
 
     @add_segment_handler(f"{PREFIX}.link")
     async def _send_link(self, id: str, segment: MessageSegment) -> bool:
@@ -227,7 +496,7 @@ class ApiManager:
         title = segment.data["title"]
         des = segment.data["des"]
         url = segment.data["url"]
-        return self.com_api.send_message_card(id, title, des, url, file_path)
+        return await self.com.send_message_card(id, title, des, url, file_path)
 
 
 class ActionManager(ApiManager):
@@ -244,11 +513,11 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=actions)
 
     @standard_action
-    def get_status(self) -> ActionResponse:
+    async def get_status(self) -> ActionResponse:
         """
         获取运行状态
         """
-        user_info = self.get_self_info()
+        user_info = await self.get_self_info()
         bot = {
             "self": BotSelf(user_id=user_info.data["user_id"]).dict(),
             "online": True,
@@ -291,15 +560,23 @@ class ActionManager(ApiManager):
                     return ActionResponse(
                         status="failed", retcode=10003, data=None, message="参数缺失"
                     )
-                return await self._send_private_msg(message, user_id)
+                return await self.send_scheduler.send(
+                    user_id,
+                    partial(self._send_private_msg, message, user_id),
+                    message_cost(message),
+                )
             case "group":
                 if group_id is None:
                     return ActionResponse(
                         status="failed", retcode=10003, data=None, message="参数缺失"
                     )
-                return await self._send_group_msg(message, group_id)
+                return await self.send_scheduler.send(
+                    group_id,
+                    partial(self._send_group_msg, message, group_id),
+                    message_cost(message),
+                )
 
-    def _pre_handle_msg(
+    async def _pre_handle_msg(
         self, group_id: str, message: Message
     ) -> tuple[list[list[str]], Message]:
         """
@@ -316,7 +593,7 @@ class ActionManager(ApiManager):
                 new_msg.append(segment)
             elif segment.type == "mention":
                 user_id = segment.data["user_id"]
-                nickname = self.com_api.get_groupmember_nickname(group_id, user_id)
+                nickname = await self.com.get_groupmember_nickname(group_id, user_id)
                 if nickname == "":
                     raise NoThisUserInGroup(group_id, user_id)
                 seg = MessageSegment.text(f"@{nickname} ")
@@ -359,10 +636,7 @@ class ActionManager(ApiManager):
                 if handler is None:
                     exceptions.append(f"不支持的消息段:{segment.type}")
                     continue
-                if iscoroutinefunction(handler):
-                    await handler(self, user_id, segment)
-                else:
-                    handler(self, user_id, segment)
+                await handler(self, user_id, segment)
             except FileNotFound as e:
                 log("ERROR", repr(e))
                 exceptions.append("无效的file_id")
@@ -385,7 +659,7 @@ class ActionManager(ApiManager):
         """
         exceptions: list[str] = []
         try:
-            all_at_list, message = self._pre_handle_msg(group_id, message)
+            all_at_list, message = await self._pre_handle_msg(group_id, message)
         except NoThisUserInGroup as e:
             log("ERROR", repr(e))
             return ActionResponse(
@@ -402,11 +676,9 @@ class ActionManager(ApiManager):
                         at_list = None
                     else:
                         at_list = all_at_list.pop(0)
-                    handler(self, group_id, segment, at_list)
-                elif iscoroutinefunction(handler):
-                    await handler(self, group_id, segment)
+                    await handler(self, group_id, segment, at_list)
                 else:
-                    handler(self, group_id, segment)
+                    await handler(self, group_id, segment)
             except FileNotFound as e:
                 log("ERROR", repr(e))
                 exceptions.append("无效的file_id")
@@ -424,11 +696,11 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=None)
 
     @standard_action
-    def get_self_info(self) -> ActionResponse:
+    async def get_self_info(self) -> ActionResponse:
         """
         获取机器人自身信息
         """
-        info = self.com_api.get_self_info()
+        info = await self.com.get_self_info()
         data = {
             "user_id": info["wxId"],
             "user_name": info["wxNickName"],
@@ -440,11 +712,11 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def get_user_info(self, user_id: str) -> ActionResponse:
+    async def get_user_info(self, user_id: str) -> ActionResponse:
         """
         获取用户信息
         """
-        info = self.com_api.get_user_info(user_id)
+        info = await self.com.get_user_info(user_id)
         data = {
             "user_id": user_id,
             "user_name": info["wxNickName"],
@@ -459,29 +731,29 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def get_friend_list(self) -> ActionResponse:
+    async def get_friend_list(self) -> ActionResponse:
         """
         获取好友列表
         """
-        res = self.com_api.get_friend_list()
+        res = await self.com.get_friend_list()
         data = [
             {
-                "user_id": one["wxid"],
-                "user_name": one["wxNickName"],
+                "user_id": one.wxid,
+                "user_name": one.wxNickName,
                 "user_displayname": "",
-                "user_remark": one["wxRemark"],
-                f"{PREFIX}.verify_flag": one["wxVerifyFlag"],  # 好友标志
+                "user_remark": one.wxRemark,
+                f"{PREFIX}.verify_flag": one.wxVerifyFlag,  # 好友标志
             }
             for one in res
         ]
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def get_group_info(self, group_id: str) -> ActionResponse:
+    async def get_group_info(self, group_id: str) -> ActionResponse:
         """
         获取群信息
         """
-        info = self.com_api.get_user_info(group_id)
+        info = await self.com.get_user_info(group_id)
         data = {
             "group_id": info["wxId"],
             "group_name": info["wxNickName"]
@@ -492,54 +764,48 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def get_group_list(self) -> ActionResponse:
+    async def get_group_list(self) -> ActionResponse:
         """
         获取群列表
         """
-        res = self.com_api.get_group_list()
+        res = await self.com.get_group_list()
         data = [
             {
-                "group_id": one["wxid"],
-                "group_name": one["wxNickName"],
+                "group_id": one.wxid,
+                "group_name": one.wxNickName,
             }
             for one in res
         ]
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def get_group_member_info(self, group_id: str, user_id: str) -> ActionResponse:
+    async def get_group_member_info(self, group_id: str, user_id: str) -> ActionResponse:
         """
         获取群成员信息
         """
-        res = self.com_api.get_group_members(group_id)
-        members = res["members"]
-        flag = False
-        for one in members:
-            if one["wxId"] == user_id:
-                data = {
-                    "user_id": one["wxId"],
-                    "user_name": one["wxNickName"],
-                    "user_displayname": "",
-                    f"{PREFIX}.avatar": one["wxBigAvatar"],  # 头像
-                    f"{PREFIX}.wx_number": one["wxNumber"],  # 微信号
-                    f"{PREFIX}.nation": one["wxNation"],  # 国家
-                    f"{PREFIX}.province": one["wxProvince"],  # 省份
-                    f"{PREFIX}.city": one["wxCity"],  # 城市
-                }
-                flag = True
-                break
-        if not flag:
+        one = await self.com.get_group_member_info(group_id, user_id)
+        if one is None:
             return ActionResponse(
                 status="failed", retcode=35001, data=None, message="群内没有该联系人"
             )
+        data = {
+            "user_id": one["wxId"],
+            "user_name": one["wxNickName"],
+            "user_displayname": "",
+            f"{PREFIX}.avatar": one["wxBigAvatar"],  # 头像
+            f"{PREFIX}.wx_number": one["wxNumber"],  # 微信号
+            f"{PREFIX}.nation": one["wxNation"],  # 国家
+            f"{PREFIX}.province": one["wxProvince"],  # 省份
+            f"{PREFIX}.city": one["wxCity"],  # 城市
+        }
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def get_group_member_list(self, group_id: str) -> ActionResponse:
+    async def get_group_member_list(self, group_id: str) -> ActionResponse:
         """
         获取群成员列表
         """
-        res = self.com_api.get_group_members(group_id)
+        res = await self.com.get_group_members(group_id)
         members = res["members"]
         data = [
             {
@@ -557,11 +823,11 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @standard_action
-    def set_group_name(self, group_id: str, group_name: str) -> ActionResponse:
+    async def set_group_name(self, group_id: str, group_name: str) -> ActionResponse:
         """
         设置群名称
         """
-        res = self.com_api.set_group_name(group_id, group_name)
+        res = await self.com.set_group_name(group_id, group_name)
         if res:
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
@@ -649,23 +915,23 @@ class ActionManager(ApiManager):
         )
 
     @expand_action
-    def get_public_account_list(self) -> ActionResponse:
+    async def get_public_account_list(self) -> ActionResponse:
         """
         获取公众号列表
         """
-        res = self.com_api.get_public_account_list()
+        res = await self.com.get_public_account_list()
         data = [
             {
-                "user_id": one["wxid"],
-                "user_name": one["wxNickName"],
-                "wx_number": one["wxNumber"],
+                "user_id": one.wxid,
+                "user_name": one.wxNickName,
+                "wx_number": one.wxNumber,
             }
             for one in res
         ]
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def follow_public_number(self, user_id: str) -> ActionResponse:
+    async def follow_public_number(self, user_id: str) -> ActionResponse:
         """
         说明:
             关注公众号
@@ -673,7 +939,7 @@ class ActionManager(ApiManager):
         参数:
             * `user_id`: 公众号id
         """
-        status = self.com_api.follow_public_number(user_id)
+        status = await self.com.follow_public_number(user_id)
         if status:
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
@@ -682,15 +948,16 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def search_contact_by_remark(self, remark: str) -> ActionResponse:
+    async def search_contact_by_remark(self, remark: str) -> ActionResponse:
         """
         通过备注搜索联系人
         """
-        info = self.com_api.search_friend_by_remark(remark)
-        if info is None:
+        contact = await self.com.search_friend_by_remark(remark)
+        if contact is None:
             return ActionResponse(
                 status="failed", retcode=35001, data=None, message="未找到联系人"
             )
+        info = await self.com.get_user_info(contact.wxid)
         data = {
             "user_id": info["wxId"],
             "user_name": info["wxNickName"],
@@ -705,15 +972,16 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def search_contact_by_wxnumber(self, wx_number: str) -> ActionResponse:
+    async def search_contact_by_wxnumber(self, wx_number: str) -> ActionResponse:
         """
         通过微信号搜索联系人
         """
-        info = self.com_api.search_friend_by_wxnumber(wx_number)
-        if info is None:
+        contact = await self.com.search_friend_by_wxnumber(wx_number)
+        if contact is None:
             return ActionResponse(
                 status="failed", retcode=35001, data=None, message="未找到联系人"
             )
+        info = await self.com.get_user_info(contact.wxid)
         data = {
             "user_id": info["wxId"],
             "user_name": info["wxNickName"],
@@ -728,15 +996,16 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def search_contact_by_nickname(self, nickname: str) -> ActionResponse:
+    async def search_contact_by_nickname(self, nickname: str) -> ActionResponse:
         """
         通过昵称搜索联系人
         """
-        info = self.com_api.search_friend_by_nickname(nickname)
-        if info is None:
+        contact = await self.com.search_friend_by_nickname(nickname)
+        if contact is None:
             return ActionResponse(
                 status="failed", retcode=35001, data=None, message="未找到联系人"
             )
+        info = await self.com.get_user_info(contact.wxid)
         data = {
             "user_id": info["wxId"],
             "user_name": info["wxNickName"],
@@ -751,7 +1020,7 @@ class ActionManager(ApiManager):
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def check_friend_status(self, user_id: str) -> ActionResponse:
+    async def check_friend_status(self, user_id: str) -> ActionResponse:
         """
         说明:
             检测好友状态
@@ -767,31 +1036,31 @@ class ActionManager(ApiManager):
                 * `0xB2`: 已拉黑
                 * `0xB5`: 被拉黑
         """
-        data = self.com_api.check_friend_status(user_id)
+        data = await self.com.check_friend_status(user_id)
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def get_db_info(self) -> ActionResponse:
+    async def get_db_info(self) -> ActionResponse:
         """
         获取数据库句柄和表信息
         """
-        data = self.com_api.get_db_handles()
+        data = await self.com.get_db_handles()
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def execute_sql(self, handle: int, sql: str) -> ActionResponse:
+    async def execute_sql(self, handle: int, sql: str) -> ActionResponse:
         """
         执行SQL
         """
-        data = self.com_api.execute_sql(handle, sql)
+        data = await self.com.execute_sql(handle, sql)
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def backup_db(self, handle: int, file_path: str) -> ActionResponse:
+    async def backup_db(self, handle: int, file_path: str) -> ActionResponse:
         """
         备份数据库
         """
-        status = self.com_api.backup_db(handle, file_path)
+        status = await self.com.backup_db(handle, file_path)
         if status:
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
@@ -800,7 +1069,7 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def accept_friend(self, v3: str, v4: str) -> ActionResponse:
+    async def accept_friend(self, v3: str, v4: str) -> ActionResponse:
         """
         说明:
             通过好友请求
@@ -809,7 +1078,7 @@ class ActionManager(ApiManager):
             * `v3`: v3数据(encryptUserName)
             * `v4`: v4数据(ticket)
         """
-        status = self.com_api.verify_friend_apply(v3, v4)
+        status = await self.com.verify_friend_apply(v3, v4)
         if status:
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
@@ -818,15 +1087,15 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def get_wechat_version(self) -> ActionResponse:
+    async def get_wechat_version(self) -> ActionResponse:
         """
         获取微信版本
         """
-        data = self.com_api.get_wechat_version()
+        data = await self.com.get_wechat_version()
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def set_wechat_version(self, version: str) -> ActionResponse:
+    async def set_wechat_version(self, version: str) -> ActionResponse:
         """
         说明:
             自定义微信版本号，一定程度上防止自动更新
@@ -834,7 +1103,7 @@ class ActionManager(ApiManager):
         参数:
             * `version`: 版本号，类似`3.7.0.26`
         """
-        status = self.com_api.change_wechat_version(version)
+        status = await self.com.change_wechat_version(version)
         if status:
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
@@ -843,13 +1112,12 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def delete_friend(self, user_id: str) -> ActionResponse:
+    async def delete_friend(self, user_id: str) -> ActionResponse:
         """
         删除好友
         """
-        status = self.com_api.delete_friend(user_id)
+        status = await self.com.delete_friend(user_id)
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -857,7 +1125,7 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def set_remark(self, user_id: str, remark: str) -> ActionResponse:
+    async def set_remark(self, user_id: str, remark: str) -> ActionResponse:
         """
         说明:
             修改好友或群聊备注
@@ -866,9 +1134,8 @@ class ActionManager(ApiManager):
             * `user_id`: wxid或group_id
             * `remark`: 要修改的备注
         """
-        status = self.com_api.edit_remark(user_id, remark)
+        status = await self.com.edit_remark(user_id, remark)
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -876,15 +1143,14 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def set_group_announcement(
+    async def set_group_announcement(
         self, group_id: str, announcement: str
     ) -> ActionResponse:
         """
         设置群公告.请确认具有相关权限再调用。
         """
-        status = self.com_api.set_group_announcement(group_id, announcement)
+        status = await self.com.set_group_announcement(group_id, announcement)
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -892,14 +1158,13 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def set_group_nickname(self, group_id: str, nickname: str) -> ActionResponse:
+    async def set_group_nickname(self, group_id: str, nickname: str) -> ActionResponse:
         """
         说明:
             设置群昵称
         """
-        status = self.com_api.set_group_nickname(group_id, nickname)
+        status = await self.com.set_group_nickname(group_id, nickname)
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -907,16 +1172,16 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def get_groupmember_nickname(self, group_id: str, user_id: str) -> ActionResponse:
+    async def get_groupmember_nickname(self, group_id: str, user_id: str) -> ActionResponse:
         """
         说明:
             获取群成员昵称
         """
-        nickname = self.com_api.get_groupmember_nickname(group_id, user_id)
+        nickname = await self.com.get_groupmember_nickname(group_id, user_id)
         return ActionResponse(status="ok", retcode=0, data=nickname)
 
     @expand_action
-    def delete_groupmember(
+    async def delete_groupmember(
         self, group_id: str, user_list: Union[str, list[str]]
     ) -> ActionResponse:
         """
@@ -927,9 +1192,8 @@ class ActionManager(ApiManager):
             * `group_id`: 群聊id
             * `user_list`: 要删除的成员wxid或wxid列表
         """
-        status = self.com_api.delete_groupmember(group_id, user_list)
+        status = await self.com.delete_groupmember(group_id, user_list)
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -937,7 +1201,7 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def add_groupmember(
+    async def add_groupmember(
         self, group_id: str, user_list: Union[str, list[str]]
     ) -> ActionResponse:
         """
@@ -948,9 +1212,8 @@ class ActionManager(ApiManager):
             * `group_id`: 群聊id
             * `user_list`: 要添加的成员wxid或wxid列表
         """
-        status = self.com_api.add_groupmember(group_id, user_list)
+        status = await self.com.add_groupmember(group_id, user_list)
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -958,7 +1221,7 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def get_public_history(self, public_id: str, offset: str = "") -> ActionResponse:
+    async def get_public_history(self, public_id: str, offset: str = "") -> ActionResponse:
         """
         说明:
             获取公众号历史消息，一次获取十条推送记录
@@ -967,11 +1230,11 @@ class ActionManager(ApiManager):
             * `public_id`: 公众号id
             * `offset`: 起始偏移，为空的话则从新到久获取十条，该值可从返回数据中取得. The default is ""
         """
-        data = self.com_api.get_history_public_msg(public_id, offset)
+        data = await self.com.get_history_public_msg(public_id, offset)
         return ActionResponse(status="ok", retcode=0, data=data)
 
     @expand_action
-    def send_forward_msg(self, user_id: str, message_id: int) -> ActionResponse:
+    async def send_forward_msg(self, user_id: str, message_id: int) -> ActionResponse:
         """
         说明:
             转发消息，只支持单条转发
@@ -980,9 +1243,10 @@ class ActionManager(ApiManager):
             * `wxid`: 消息接收人wxid
             * `message_id`: 消息id，可以在实时消息接口中获取.
         """
-        status = self.com_api.send_forward_msg(user_id, message_id)
+        status = await self.send_scheduler.send(
+            user_id, partial(self.com.send_forward_msg, user_id, message_id)
+        )
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -990,7 +1254,7 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def send_raw_xml(
+    async def send_raw_xml(
         self, user_id: str, xml: str, image_path: str = ""
     ) -> ActionResponse:
         """
@@ -1002,9 +1266,10 @@ class ActionManager(ApiManager):
             * `xml`: xml内容
             * `image_path`: 图片路径. 默认为空.
         """
-        status = self.com_api.send_xml(user_id, xml, image_path)
+        status = await self.send_scheduler.send(
+            user_id, partial(self.com.send_xml, user_id, xml, image_path)
+        )
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -1012,13 +1277,14 @@ class ActionManager(ApiManager):
             )
 
     @expand_action
-    def send_card(self, user_id: str, card_id: str, nickname: str) -> ActionResponse:
+    async def send_card(self, user_id: str, card_id: str, nickname: str) -> ActionResponse:
         """
         发送名片
         """
-        status = self.com_api.send_contact_card(user_id, card_id, nickname)
+        status = await self.send_scheduler.send(
+            user_id, partial(self.com.send_contact_card, user_id, card_id, nickname)
+        )
         if status:
-            self.com_api.get_contacts()
             return ActionResponse(status="ok", retcode=0, data=None)
         else:
             return ActionResponse(
@@ -1036,3 +1302,52 @@ class ActionManager(ApiManager):
         """
         nums = await self.file_manager.clean_cache(days)
         return ActionResponse(status="ok", retcode=0, data=nums)
+
+    @expand_action
+    def get_send_stats(self) -> ActionResponse:
+        """
+        说明:
+            获取发送队列的长度与等待时间
+        """
+        return ActionResponse(status="ok", retcode=0, data=self.send_scheduler.stats())
+
+    @expand_action
+    def get_slow_traces(self, limit: int = 10) -> ActionResponse:
+        """
+        说明:
+            获取最近的消息追踪中耗时最长的追踪，需要开启消息追踪
+
+        参数:
+            * `limit`: 返回的数量，默认为10
+        """
+        if not tracer.enabled:
+            return ActionResponse(
+                status="failed", retcode=10002, data=None, message="未开启消息追踪"
+            )
+        data = [trace.dict() for trace in tracer.slowest(limit)]
+        return ActionResponse(status="ok", retcode=0, data=data)
+
+    @expand_action
+    async def batch(
+        self,
+        actions: list[dict],
+        concurrency: int = 1,
+        ordered: bool = True,
+        stream: bool = False,
+    ) -> ActionResponse:
+        """
+        说明:
+            批量执行action，返回每一项的返回值
+
+        参数:
+            * `actions`: action请求列表，每项包含`action`与`params`
+            * `concurrency`: 并发数. 默认为1，按顺序执行.
+            * `ordered`: 流式返回时是否按请求顺序返回. 默认为True.
+            * `stream`: 是否流式返回，只在websocket中生效. 默认为False.
+        """
+        if error := self.check_batch(actions, concurrency):
+            return error
+        results: list[Optional[ActionResponse]] = [None] * len(actions)
+        async for index, response in self.run_batch(actions, concurrency, ordered):
+            results[index] = response
+        return ActionResponse(status="ok", retcode=0, data=results)
@@ -0,0 +1,439 @@
+"""
+发送调度器，所有发送消息的action都在这里排队，按限速依次交给com线程:
+    send_message -> SendScheduler -> 优先级队列 -> 各会话轮流 -> 令牌桶限速 -> com
+
+交互回复(单独请求的action)使用高优先级队列，批量action中的发送使用低优先级队列，
+群发时交互回复不会被阻塞。同一优先级中，同一会话的消息总是按提交顺序发送。
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Optional
+
+from wechatbot_client.exception import SendQueueFull
+from wechatbot_client.metrics import metrics
+from wechatbot_client.utils import logger_wrapper
+
+log = logger_wrapper("Send Scheduler")
+
+PRUNE_INTERVAL = 1024
+"""每发送多少次清理一次空闲会话的令牌桶"""
+
+
+class SendPriority(IntEnum):
+    """发送优先级，值越小越优先"""
+
+    Interactive = 0
+    """交互回复"""
+    Bulk = 1
+    """批量发送"""
+
+
+send_priority: ContextVar[SendPriority] = ContextVar(
+    "send_priority", default=SendPriority.Interactive
+)
+"""当前上下文中发送消息的优先级，批量action会设置为`Bulk`"""
+
+
+class TokenBucket:
+    """
+    令牌桶，每秒补充`rate`个令牌，最多存放`burst`个
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    rate: float
+    """每秒补充的令牌数量，0 表示不限速"""
+    burst: float
+    """令牌数量上限"""
+    tokens: float
+    """当前令牌数量"""
+    updated: float
+    """上次补充令牌的时间"""
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost: float, now: float) -> float:
+        """
+        说明:
+            获取`cost`个令牌需要等待的时间，不消耗令牌
+
+        返回:
+            * `float`: 等待秒数，0 表示令牌足够
+        """
+        if self.rate <= 0:
+            return 0
+        self._refill(now)
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            return 0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float, now: float) -> None:
+        """消耗令牌，令牌可以为负数，之后的请求需要等待补充"""
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens -= min(cost, self.burst)
+
+    def full(self, now: float) -> bool:
+        """令牌桶是否已满，满的令牌桶可以丢弃"""
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class SendJob:
+    """
+    一次排队的发送
+    """
+
+    __slots__ = ("chat_id", "cost", "func", "future", "queued_at")
+
+    chat_id: str
+    """会话id"""
+    cost: int
+    """消耗的令牌数量，即发送的消息条数"""
+    func: Callable[[], Awaitable[Any]]
+    """实际执行发送的函数"""
+    future: asyncio.Future
+    """发送结果"""
+    queued_at: float
+    """排队时间"""
+
+    def __init__(
+        self,
+        chat_id: str,
+        cost: int,
+        func: Callable[[], Awaitable[Any]],
+        future: asyncio.Future,
+    ) -> None:
+        self.chat_id = chat_id
+        self.cost = cost
+        self.func = func
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class LaneStats:
+    """
+    单个优先级队列的统计，时间单位为秒
+    """
+
+    __slots__ = ("sent", "rejected", "max_depth", "wait_total", "wait_max")
+
+    sent: int
+    """已发送的数量"""
+    rejected: int
+    """队列已满被拒绝的数量"""
+    max_depth: int
+    """队列曾达到的最大长度"""
+    wait_total: float
+    """排队等待总时间"""
+    wait_max: float
+    """排队等待最长时间"""
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float) -> None:
+        """记录一次发送"""
+        self.sent += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class SendScheduler:
+    """
+    发送调度器，有全局与每个会话两级令牌桶限速。
+    高优先级队列有可发送的会话时总是先发送，各会话之间轮流发送
+    """
+
+    rate: float
+    """全局每秒发送的消息数量，0 表示不限速"""
+    burst: int
+    """全局允许的突发消息数量"""
+    chat_rate: float
+    """单个会话每秒发送的消息数量，0 表示不限速"""
+    chat_burst: int
+    """单个会话允许的突发消息数量"""
+    queue_size: int
+    """每个优先级队列的长度上限"""
+
+    def __init__(
+        self,
+        rate: float = 0,
+        burst: int = 1,
+        chat_rate: float = 0,
+        chat_burst: int = 1,
+        queue_size: int = 1024,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.queue_size = queue_size
+        self._bucket = TokenBucket(rate, burst, time.monotonic())
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._lanes: dict[SendPriority, OrderedDict[str, deque[SendJob]]] = {
+            priority: OrderedDict() for priority in SendPriority
+        }
+        self._depth: dict[SendPriority, int] = {priority: 0 for priority in SendPriority}
+        self._stats: dict[SendPriority, LaneStats] = {
+            priority: LaneStats() for priority in SendPriority
+        }
+        self._dispatched = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(
+        self,
+        rate: float,
+        burst: int,
+        chat_rate: float,
+        chat_burst: int,
+        queue_size: int,
+    ) -> None:
+        """
+        说明:
+            修改限速与队列设置，排队中的发送与统计保留，令牌桶按新设置重建
+
+        参数:
+            * `rate`: 全局每秒发送的消息数量，0 表示不限速
+            * `burst`: 全局允许的突发消息数量
+            * `chat_rate`: 单个会话每秒发送的消息数量，0 表示不限速
+            * `chat_burst`: 单个会话允许的突发消息数量
+            * `queue_size`: 每个优先级队列的长度上限
+        """
+        self.rate = rate
+        self.burst = burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.queue_size = queue_size
+        self._bucket = TokenBucket(rate, burst, time.monotonic())
+        self._chat_buckets.clear()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """开启调度任务，首次提交时也会自动开启"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """停止调度任务，取消排队中的发送"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        for priority, lane in self._lanes.items():
+            for jobs in lane.values():
+                for job in jobs:
+                    job.future.cancel()
+            lane.clear()
+            self._depth[priority] = 0
+
+    def submit(
+        self,
+        chat_id: str,
+        func: Callable[[], Awaitable[Any]],
+        cost: int = 1,
+        priority: Optional[SendPriority] = None,
+    ) -> asyncio.Future:
+        """
+        说明:
+            提交一次发送，立即返回发送结果的future
+
+        参数:
+            * `chat_id`: 会话id
+            * `func`: 实际执行发送的函数
+            * `cost`: 发送的消息条数
+            * `priority`: 优先级，默认使用当前上下文的`send_priority`
+
+        返回:
+            * `asyncio.Future`: 发送完成后返回`func`的返回值，发送出错时抛出对应异常，
+              队列已满时抛出`SendQueueFull`
+        """
+        if priority is None:
+            priority = send_priority.get()
+        future = asyncio.get_running_loop().create_future()
+        if self._depth[priority] >= self.queue_size:
+            stats = self._stats[priority]
+            stats.rejected += 1
+            if stats.rejected == 1 or stats.rejected % 1000 == 0:
+                log(
+                    "WARNING",
+                    f"<y>{priority.name}发送队列已满，已拒绝 {stats.rejected} 次发送...</y>",
+                )
+            future.set_exception(SendQueueFull(chat_id))
+            return future
+        self.start()
+        lane = self._lanes[priority]
+        jobs = lane.get(chat_id)
+        if jobs is None:
+            jobs = lane[chat_id] = deque()
+        jobs.append(SendJob(chat_id, max(cost, 1), func, future))
+        depth = self._depth[priority] = self._depth[priority] + 1
+        stats = self._stats[priority]
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        self._wakeup.set()
+        return future
+
+    async def send(
+        self,
+        chat_id: str,
+        func: Callable[[], Awaitable[Any]],
+        cost: int = 1,
+    ) -> Any:
+        """
+        说明:
+            提交一次发送并等待结果
+
+        返回:
+            * `Any`: `func`的返回值
+        """
+        return await self.submit(chat_id, func, cost)
+
+    def _chat_bucket(self, chat_id: str, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate, self.chat_burst, now
+            )
+        return bucket
+
+    def _pick(self, now: float) -> tuple[Optional[SendJob], float]:
+        """
+        选出下一个可以发送的任务，没有时返回需要等待的秒数(无任务时为None)
+        """
+        wait: Optional[float] = None
+        for priority, lane in self._lanes.items():
+            for _ in range(len(lane)):
+                chat_id, jobs = next(iter(lane.items()))
+                while jobs and jobs[0].future.done():
+                    # 等待方已取消，不消耗令牌
+                    jobs.popleft()
+                    self._depth[priority] -= 1
+                if not jobs:
+                    del lane[chat_id]
+                    continue
+                job = jobs[0]
+                delay = max(
+                    self._chat_bucket(chat_id, now).delay(job.cost, now),
+                    self._bucket.delay(job.cost, now),
+                )
+                if delay > 0:
+                    # 该会话需要等待，轮到下一个会话
+                    lane.move_to_end(chat_id)
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                jobs.popleft()
+                if jobs:
+                    lane.move_to_end(chat_id)
+                else:
+                    del lane[chat_id]
+                self._depth[priority] -= 1
+                self._stats[priority].record(now - job.queued_at)
+                return job, 0
+        return None, wait
+
+    def _prune(self, now: float) -> None:
+        """丢弃没有排队任务且已补满的会话令牌桶"""
+        queued = set()
+        for lane in self._lanes.values():
+            queued.update(lane)
+        for chat_id in [
+            chat_id
+            for chat_id, bucket in self._chat_buckets.items()
+            if chat_id not in queued and bucket.full(now)
+        ]:
+            del self._chat_buckets[chat_id]
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            job, wait = self._pick(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._chat_bucket(job.chat_id, now).consume(job.cost, now)
+            self._bucket.consume(job.cost, now)
+            self._dispatched += 1
+            if self._dispatched % PRUNE_INTERVAL == 0:
+                self._prune(now)
+            try:
+                result = await job.func()
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        说明:
+            获取发送统计
+
+        返回:
+            * `dict`: 每个优先级队列的长度与等待时间，时间单位为毫秒
+        """
+        now = time.monotonic()
+        lanes = {}
+        for priority, lane in self._lanes.items():
+            stats = self._stats[priority]
+            oldest = min((jobs[0].queued_at for jobs in lane.values()), default=now)
+            lanes[priority.name.lower()] = {
+                "depth": self._depth[priority],
+                "chats": len(lane),
+                "max_depth": stats.max_depth,
+                "sent": stats.sent,
+                "rejected": stats.rejected,
+                "wait_avg": round(stats.wait_total / (stats.sent or 1) * 1000, 3),
+                "wait_max": round(stats.wait_max * 1000, 3),
+                "oldest": round((now - oldest) * 1000, 3),
+            }
+        return {"lanes": lanes, "chat_buckets": len(self._chat_buckets)}
+
+    def register_metrics(self) -> None:
+        """注册发送队列指标"""
+        metrics.collector(
+            "wechat_send_queue_depth",
+            "发送队列中等待的消息数量",
+            ("lane",),
+            lambda: [
+                ((priority.name.lower(),), depth)
+                for priority, depth in self._depth.items()
+            ],
+        )
+        metrics.collector(
+            "wechat_send_total",
+            "发送队列发送与拒绝的数量",
+            ("lane", "result"),
+            lambda: [
+                ((priority.name.lower(), key), getattr(stats, key))
+                for priority, stats in self._stats.items()
+                for key in ("sent", "rejected")
+            ],
+            type="counter",
+        )
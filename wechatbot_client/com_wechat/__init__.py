@@ -11,6 +11,17 @@ http/ws -> wechat -> comprocess -> com
 com -> msgreporter -> wechat -> http/ws
 """
 
+from .backend import ComBackend as ComBackend
+from .backend import FakeBackend as FakeBackend
+from .backend import create_backend as create_backend
 from .com_wechat import ComWechatApi as ComWechatApi
+from .contact import Contact as Contact
+from .contact import ContactDirectory as ContactDirectory
+from .executor import AsyncComWechatApi as AsyncComWechatApi
+from .member import GroupMemberCache as GroupMemberCache
+from .member import is_member_notice as is_member_notice
 from .message import MessageHandler as MessageHandler
 from .model import Message as Message
+from .model import MessageRecord as MessageRecord
+from .model import parse_message as parse_message
+from .type import WxType as WxType
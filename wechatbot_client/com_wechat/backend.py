@@ -0,0 +1,129 @@
+"""
+com后端，决定robot对象与事件泵的来源:
+ - comtypes: 真实的com组件，只能在windows上使用
+ - fake: 进程内的模拟robot，按固定速率重放录制的消息，用于压测
+"""
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+from wechatbot_client.config import ComBackendType, Config
+
+from .fake import FakeRobot
+from .reporter import ComEventPump, EventPump, FakeEventPump, MessageReporter
+
+
+class ComBackend:
+    """
+    com后端基类
+    """
+
+    def create_robot(self) -> Any:
+        """
+        说明:
+            创建robot对象，在com线程中调用
+
+        错误:
+            * `OSError`: com组件未安装
+        """
+        raise NotImplementedError
+
+    def create_event_pump(self, reporter: MessageReporter, wechat_pid: int) -> EventPump:
+        """
+        说明:
+            创建事件泵
+
+        参数:
+            * `reporter`: 消息接收器
+            * `wechat_pid`: 微信pid
+        """
+        raise NotImplementedError
+
+
+class ComtypesBackend(ComBackend):
+    """
+    真实的com组件
+    """
+
+    def create_robot(self) -> Any:
+        # comtypes只能在windows上导入
+        from comtypes.client import CreateObject
+
+        return CreateObject("WeChatRobot.CWeChatRobot")
+
+    def create_event_pump(self, reporter: MessageReporter, wechat_pid: int) -> EventPump:
+        return ComEventPump(reporter, wechat_pid)
+
+
+class FakeBackend(ComBackend):
+    """
+    模拟后端
+    """
+
+    messages: list[str]
+    """要重放的原始消息"""
+    rate: float
+    """每秒重放消息数量，为0则不重放"""
+    latency: float
+    """模拟的单次com调用延迟，单位秒"""
+    repeat: bool
+    """是否循环重放"""
+
+    def __init__(
+        self,
+        messages: Optional[list[str]] = None,
+        rate: float = 0,
+        latency: float = 0,
+        repeat: bool = True,
+    ) -> None:
+        self.messages = messages or []
+        self.rate = rate
+        self.latency = latency
+        self.repeat = repeat
+
+    def create_robot(self) -> FakeRobot:
+        return FakeRobot(self.latency)
+
+    def create_event_pump(self, reporter: MessageReporter, wechat_pid: int) -> EventPump:
+        return FakeEventPump(reporter, self.messages, self.rate, self.repeat)
+
+
+def load_messages(path: Path) -> list[str]:
+    """
+    说明:
+        读取录制的消息文件，每行一条消息json
+
+    参数:
+        * `path`: 文件路径
+
+    返回:
+        * `list[str]`: 原始消息
+    """
+    messages = []
+    with open(path, mode="r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                # 统一为紧凑格式，与com上报的格式保持一致
+                messages.append(json.dumps(json.loads(line), ensure_ascii=False))
+    return messages
+
+
+def create_backend(config: Config) -> ComBackend:
+    """
+    说明:
+        根据配置创建com后端
+
+    参数:
+        * `config`: 配置
+    """
+    if config.com_backend == ComBackendType.Fake:
+        messages = []
+        if config.fake_msg_file:
+            messages = load_messages(Path(config.fake_msg_file))
+        return FakeBackend(
+            messages=messages,
+            rate=config.fake_msg_rate,
+            latency=config.fake_com_latency / 1000,
+        )
+    return ComtypesBackend()
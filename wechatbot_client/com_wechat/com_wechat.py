@@ -1,33 +1,19 @@
-import asyncio
 import json
 from pathlib import Path
-from typing import Callable, Literal, Optional, Tuple, Union
+from typing import Callable, Coroutine, Literal, Optional, Union
 
 import psutil
-from comtypes.client import CreateObject, GetEvents
 
-from wechatbot_client.utils import escape_tag, logger_wrapper
+from wechatbot_client.trace import Trace
+from wechatbot_client.utils import logger_wrapper
 
-log = logger_wrapper("Com WeChat")
-
-
-class MessageReporter:
-    """
-    消息接收器
-    """
+from .backend import ComBackend, ComtypesBackend
+from .contact import Contact, ContactDirectory
+from .member import GroupMemberCache
+from .reporter import EventPump, MessageReporter
+from .type import ContactType
 
-    func: Callable[[str], None] = None
-    """消息处理器"""
-
-    def OnGetMessageEvent(self, message: Tuple[str, None]):
-        msg = message[0]
-        log("DEBUG", f"<g>接收到wechat消息</g> - {escape_tag(msg)}")
-        if self.func:
-            asyncio.create_task(self.func(msg))
-
-    def register_message_handler(self, func: Callable[[str], None]) -> None:
-        """注册一个消息处理器"""
-        self.func = func
+log = logger_wrapper("Com WeChat")
 
 
 class ComProgress:
@@ -35,34 +21,33 @@ class ComProgress:
     com通讯组件
     """
 
+    backend: ComBackend
+    """com后端"""
     robot = None
     """com通讯robot"""
-    event = None
-    """com通讯event"""
     com_pid: int
     """com进程的pid"""
     wechat_pid: int
     """微信pid"""
-    connection_point = None
-    """消息接收点"""
     msg_reporter: MessageReporter
     """消息接收器"""
+    event_pump: Optional[EventPump]
+    """事件泵线程"""
 
     def __init__(self) -> None:
+        self.backend = ComtypesBackend()
         self.robot = None
-        self.event = None
         self.com_pid = None
         self.wechat_pid = None
-        self.connection_point = None
         self.msg_reporter = MessageReporter()
+        self.event_pump = None
 
     def init(self) -> bool:
         """
         初始化com组件
         """
         try:
-            self.robot = CreateObject("WeChatRobot.CWeChatRobot")
-            self.event = CreateObject("WeChatRobot.RobotEvent")
+            self.robot = self.backend.create_robot()
             self.com_pid = self.robot.CStopRobotService(0)
         except OSError:
             return False
@@ -72,6 +57,7 @@ class ComProgress:
         """
         关闭com进程
         """
+        self.unregister_msg_event()
         if self.com_pid is not None:
             try:
                 com_process = psutil.Process(self.com_pid)
@@ -80,16 +66,34 @@ class ComProgress:
                 pass
         self.com_pid = None
 
-    def register_msg_event(self) -> None:
+    def register_msg_event(self, event_pump: Optional[EventPump] = None) -> None:
+        """
+        说明:
+            注册消息事件，开启事件线程，需要在事件循环中调用
+
+        参数:
+            * `event_pump`: 自定义事件泵，默认由com后端创建
+        """
+        self.msg_reporter.start()
+        if event_pump is None:
+            event_pump = self.backend.create_event_pump(
+                self.msg_reporter, self.wechat_pid
+            )
+        self.event_pump = event_pump
+        self.event_pump.start()
+
+    def unregister_msg_event(self) -> None:
         """
-        注册消息事件
+        关闭事件线程
         """
-        self.connection_point = GetEvents(self.event, self.msg_reporter)
-        self.event.CRegisterWxPidWithCookie(
-            self.wechat_pid, self.connection_point.cookie
-        )
+        if self.event_pump is not None:
+            self.event_pump.stop(timeout=1)
+            self.event_pump = None
+        self.msg_reporter.stop()
 
-    def register_message_handler(self, func: Callable[[str], None]) -> None:
+    def register_message_handler(
+        self, func: Callable[[str, Optional[Trace]], Coroutine]
+    ) -> None:
         """注册一个消息处理器"""
         self.msg_reporter.register_message_handler(func)
 
@@ -99,8 +103,20 @@ class ComWechatApi(ComProgress):
     com微信通信接口，继承ComProgress，这里只定义方法
     """
 
-    AddressBook: list[dict] = None
-    """通讯录列表"""
+    contacts: ContactDirectory
+    """通讯录目录"""
+    group_members: GroupMemberCache
+    """群成员缓存"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.contacts = ContactDirectory()
+        self.group_members = GroupMemberCache()
+
+    def _ensure_contacts(self, use_cache: bool) -> None:
+        """通讯录未加载或不使用缓存时重新加载"""
+        if not use_cache or not self.contacts.loaded:
+            self.get_contacts()
 
     def init_wechat_pid(self) -> bool:
         """
@@ -307,84 +323,97 @@ class ComWechatApi(ComProgress):
         self_info = self.robot.CGetSelfInfo(self.wechat_pid)
         return json.loads(self_info)
 
-    def get_contacts(self) -> list:
+    def get_contacts(self) -> list[Contact]:
         """
         说明:
-            获取所有联系人列表
+            获取所有联系人列表，并重建通讯录目录
 
         返回:
-            * `list`: 调用成功返回通讯录列表，调用失败返回空列表
+            * `list[Contact]`: 调用成功返回通讯录列表，调用失败返回空列表
 
         """
 
         try:
             friend_tuple = self.robot.CGetFriendList(self.wechat_pid)
-            self.AddressBook = [dict(i) for i in list(friend_tuple)]
+            self.contacts.load(dict(i) for i in friend_tuple)
         except IndexError:
-            self.AddressBook = []
-        return self.AddressBook
+            self.contacts.load(())
+        return self.contacts.all()
 
-    def get_friend_list(self, use_cache: bool = True) -> list:
+    def add_contact(self, wxid: str) -> Optional[Contact]:
         """
         说明:
-            从通讯录列表中筛选出好友列表
+            查询联系人信息，增量加入通讯录目录
+
+        参数:
+            * `wxid`: 联系人wxid
+
+        返回:
+            * `Contact | None`: 加入的联系人，查询失败返回None
+        """
+        try:
+            info = self.get_user_info(wxid)
+        except Exception:
+            return None
+        if not info.get("wxId"):
+            return None
+        contact = Contact(
+            wxid,
+            info.get("wxNumber", ""),
+            info.get("wxNickName", ""),
+            info.get("wxRemark", ""),
+            ContactType.GROUP if wxid.endswith("@chatroom") else ContactType.FRIEND,
+        )
+        self.contacts.upsert(contact)
+        return contact
+
+    def get_friend_list(self, use_cache: bool = True) -> list[Contact]:
+        """
+        说明:
+            从通讯录目录中取出好友列表
 
         参数:
             * `use_cache`: 是否使用缓存，默认使用
 
         返回:
-            * `list`: 好友列表
+            * `list[Contact]`: 好友列表
 
         """
-        if self.AddressBook is None or not use_cache:
-            self.get_contacts()
-        friend_list = [
-            item
-            for item in self.AddressBook
-            if (item["wxType"] == 3 and item["wxid"][0:3] != "gh_")
-        ]
-        return friend_list
+        self._ensure_contacts(use_cache)
+        return self.contacts.friends()
 
-    def get_group_list(self, use_cache: bool = True) -> list:
+    def get_group_list(self, use_cache: bool = True) -> list[Contact]:
         """
         说明:
-            从通讯录列表中筛选出群聊列表
+            从通讯录目录中取出群聊列表
 
         参数:
             * `use_cache`: 是否使用缓存，默认使用
 
         返回:
-            * `list`: 群聊列表
+            * `list[Contact]`: 群聊列表
         """
-        if self.AddressBook is None or not use_cache:
-            self.get_contacts()
-        chatroom_list = [item for item in self.AddressBook if item["wxType"] == 2]
-        return chatroom_list
+        self._ensure_contacts(use_cache)
+        return self.contacts.groups()
 
-    def get_public_account_list(self, use_cache: bool = True) -> list:
+    def get_public_account_list(self, use_cache: bool = True) -> list[Contact]:
         """
         说明:
-            从通讯录列表中筛选出公众号列表
+            从通讯录目录中取出公众号列表
 
         参数:
             * `use_cache`: 是否使用缓存，默认使用
 
         返回:
-            * `list`: 公众号列表
+            * `list[Contact]`: 公众号列表
 
         """
-        if self.AddressBook is None or not use_cache:
-            self.get_contacts()
-        official_account_list = [
-            item
-            for item in self.AddressBook
-            if (item["wxType"] == 3 and item["wxid"][0:3] == "gh_")
-        ]
-        return official_account_list
+        self._ensure_contacts(use_cache)
+        return self.contacts.public_accounts()
 
     def search_friend_by_remark(
         self, remark: str, use_cache: bool = True
-    ) -> Optional[dict]:
+    ) -> Optional[Contact]:
         """
         说明:
             通过备注搜索联系人
@@ -394,18 +423,14 @@ class ComWechatApi(ComProgress):
             * `use_cache`: 是否使用缓存，默认使用
 
         返回:
-            * `dict | None`: 搜索到返回联系人信息，否则返回None
+            * `Contact | None`: 搜索到返回联系人信息，否则返回None
         """
-        if self.AddressBook is None or not use_cache:
-            self.get_contacts()
-        for item in self.AddressBook:
-            if item["wxRemark"] == remark:
-                return item
-        return None
+        self._ensure_contacts(use_cache)
+        return self.contacts.by_remark(remark)
 
     def search_friend_by_wxnumber(
         self, wxnumber: str, use_cache: bool = True
-    ) -> Optional[dict]:
+    ) -> Optional[Contact]:
         """
         说明:
             通过微信号搜索联系人(非微信id)
@@ -415,18 +440,14 @@ class ComWechatApi(ComProgress):
             * `use_cache`: 是否使用缓存，默认使用
 
         返回:
-            * `dict | None`: 搜索到返回联系人信息，否则返回None
+            * `Contact | None`: 搜索到返回联系人信息，否则返回None
         """
-        if self.AddressBook is None or not use_cache:
-            self.get_contacts()
-        for item in self.AddressBook:
-            if item["wxNumber"] == wxnumber:
-                return item
-        return None
+        self._ensure_contacts(use_cache)
+        return self.contacts.by_number(wxnumber)
 
     def search_friend_by_nickname(
         self, nickname: str, use_cache: bool = True
-    ) -> Optional[dict]:
+    ) -> Optional[Contact]:
         """
         说明:
             通过昵称搜索联系人
@@ -436,14 +457,10 @@ class ComWechatApi(ComProgress):
             * `use_cache`: 是否使用缓存，默认使用
 
         返回:
-            * `dict | None`: 搜索到返回联系人信息，否则返回None
+            * `Contact | None`: 搜索到返回联系人信息，否则返回None
         """
-        if self.AddressBook is None or not use_cache:
-            self.get_contacts()
-        for item in self.AddressBook:
-            if item["wxNickName"] == nickname:
-                return item
-        return None
+        self._ensure_contacts(use_cache)
+        return self.contacts.by_nickname(nickname)
 
     def get_user_info(self, wxid: str) -> dict:
         """
@@ -461,10 +478,42 @@ class ComWechatApi(ComProgress):
         userinfo = self.robot.CGetWxUserInfo(self.wechat_pid, wxid)
         return json.loads(userinfo)
 
+    def _get_member_ids(self, group_id: str) -> Optional[tuple[str, ...]]:
+        """
+        说明:
+            获取群成员wxid列表，优先使用缓存
+
+        参数:
+            * `group_id`: 群聊id
+
+        返回:
+            * `tuple[str] | None`: 获取成功返回成员wxid，失败返回None
+        """
+        entry = self.group_members.group(group_id)
+        if entry.member_ids is None:
+            info = dict(self.robot.CGetChatRoomMembers(self.wechat_pid, group_id))
+            if not info:
+                return None
+            entry.member_ids = tuple(info["members"].split("^G"))
+            self.group_members.shrink()
+        return entry.member_ids
+
+    def _get_member_info(self, group_id: str, wxid: str) -> dict:
+        """获取群成员信息，优先使用缓存"""
+        entry = self.group_members.group(group_id)
+        info = entry.infos.get(wxid)
+        if info is None:
+            self.group_members.misses += 1
+            info = self.get_user_info(wxid)
+            entry.infos[wxid] = info
+        else:
+            self.group_members.hits += 1
+        return info
+
     def get_group_members(self, group_id: str) -> Optional[dict]:
         """
         说明:
-            获取群成员信息
+            获取群成员信息，整个群的成员信息会被缓存，过期或成员变动后重新获取
 
         参数:
             * `group_id`: 群聊id
@@ -473,17 +522,36 @@ class ComWechatApi(ComProgress):
             * `dict | None`: 获取成功返回群成员信息，失败返回None
 
         """
-        info = dict(self.robot.CGetChatRoomMembers(self.wechat_pid, group_id))
-        if not info:
+        members = self._get_member_ids(group_id)
+        if members is None:
             return None
-        members = info["members"].split("^G")
-        data = self.get_user_info(group_id)
-        data["members"] = []
-        for member in members:
-            member_info = self.get_user_info(member)
-            data["members"].append(member_info)
+        entry = self.group_members.group(group_id)
+        if entry.group_info is None:
+            entry.group_info = self.get_user_info(group_id)
+        data = dict(entry.group_info)
+        data["members"] = [self._get_member_info(group_id, one) for one in members]
+        self.group_members.shrink()
         return data
 
+    def get_group_member_info(self, group_id: str, wxid: str) -> Optional[dict]:
+        """
+        说明:
+            获取单个群成员信息
+
+        参数:
+            * `group_id`: 群聊id
+            * `wxid`: 群成员wxid
+
+        返回:
+            * `dict | None`: 获取成功返回成员信息，不在群内返回None
+        """
+        members = self._get_member_ids(group_id)
+        if members is None or wxid not in members:
+            return None
+        info = self._get_member_info(group_id, wxid)
+        self.group_members.shrink()
+        return info
+
     def check_friend_status(self, wxid: str) -> int:
         """
         说明:
@@ -807,6 +875,8 @@ class ComWechatApi(ComProgress):
         """
 
         stauts = self.robot.CDeleteUser(self.wechat_pid, wxid)
+        if stauts == 0:
+            self.contacts.remove(wxid)
         return stauts == 0
 
     def edit_remark(self, wxid: str, remark: Optional[str]) -> bool:
@@ -823,6 +893,8 @@ class ComWechatApi(ComProgress):
         """
 
         status = self.robot.CEditRemark(self.wechat_pid, wxid, remark)
+        if status == 0:
+            self.contacts.update(wxid, wxRemark=remark or "")
         return status == 0
 
     def set_group_name(self, group_id: str, name: str) -> bool:
@@ -839,6 +911,8 @@ class ComWechatApi(ComProgress):
         """
 
         status = self.robot.CSetChatRoomName(self.wechat_pid, group_id, name)
+        if status == 0:
+            self.group_members.invalidate(group_id)
         return status == 0
 
     def set_group_announcement(
@@ -878,6 +952,8 @@ class ComWechatApi(ComProgress):
         stauts = self.robot.CSetChatRoomSelfNickname(
             self.wechat_pid, group_id, nickname
         )
+        if stauts == 0:
+            self.group_members.invalidate(group_id)
         return stauts == 0
 
     def get_groupmember_nickname(self, group_id: str, wxid: str) -> str:
@@ -893,7 +969,18 @@ class ComWechatApi(ComProgress):
             * `str`: 成功返回群成员昵称,失败返回空字符串
         """
 
-        return self.robot.CGetChatRoomMemberNickname(self.wechat_pid, group_id, wxid)
+        entry = self.group_members.group(group_id)
+        nickname = entry.nicknames.get(wxid)
+        if nickname is not None:
+            self.group_members.hits += 1
+            return nickname
+        self.group_members.misses += 1
+        nickname = self.robot.CGetChatRoomMemberNickname(self.wechat_pid, group_id, wxid)
+        # 空字符串表示不在群内，成员加入后也不会因缓存而查不到
+        if nickname:
+            entry.nicknames[wxid] = nickname
+            self.group_members.shrink()
+        return nickname
 
     def delete_groupmember(self, group_id: str, wxid_list: Union[str, list]) -> bool:
         """
@@ -909,6 +996,8 @@ class ComWechatApi(ComProgress):
         """
 
         status = self.robot.CDelChatRoomMember(self.wechat_pid, group_id, wxid_list)
+        if status == 0:
+            self.group_members.invalidate(group_id)
         return status == 0
 
     def add_groupmember(self, group_id: str, wxid_list: Union[str, list]) -> bool:
@@ -925,6 +1014,8 @@ class ComWechatApi(ComProgress):
         """
 
         status = self.robot.CAddChatRoomMember(self.wechat_pid, group_id, wxid_list)
+        if status == 0:
+            self.group_members.invalidate(group_id)
         return status == 0
 
     def open_browser(self, url: str) -> bool:
@@ -1100,25 +1191,3 @@ class ComWechatApi(ComProgress):
         """
 
         return self.robot.CGetMsgCDN(self.wechat_pid, msgid)
-
-    async def get_msg_cdn(self, msgid: int) -> str:
-        """
-        下载图片、视频、文件
-
-        Parameters
-        ----------
-        msgid : int
-            msgid.
-
-        Returns
-        -------
-        str
-            成功返回文件路径，失败返回空字符串.
-
-        """
-        path = self._GetMsgCDN(msgid=msgid)
-        if path != "":
-            file = Path(path)
-            while not file.exists():
-                await asyncio.sleep(0.5)
-        return path
@@ -0,0 +1,251 @@
+"""
+通讯录目录，按wxid、微信号、备注、昵称建立索引，并按类型预先分区
+"""
+import time
+from typing import Iterable, Optional
+
+from .type import ContactType
+
+PUBLIC_ACCOUNT_PREFIX = "gh_"
+"""公众号wxid前缀"""
+
+
+class Contact:
+    """
+    通讯录联系人
+    """
+
+    __slots__ = ("wxid", "wxNumber", "wxNickName", "wxRemark", "wxType", "wxVerifyFlag")
+
+    wxid: str
+    """wxid"""
+    wxNumber: str
+    """微信号"""
+    wxNickName: str
+    """昵称"""
+    wxRemark: str
+    """备注"""
+    wxType: int
+    """联系人类型"""
+    wxVerifyFlag: int
+    """好友标志"""
+
+    def __init__(
+        self,
+        wxid: str,
+        wxNumber: str = "",
+        wxNickName: str = "",
+        wxRemark: str = "",
+        wxType: int = ContactType.FRIEND,
+        wxVerifyFlag: int = 0,
+    ) -> None:
+        self.wxid = wxid
+        self.wxNumber = wxNumber
+        self.wxNickName = wxNickName
+        self.wxRemark = wxRemark
+        self.wxType = wxType
+        self.wxVerifyFlag = wxVerifyFlag
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Contact":
+        """从com返回的通讯录字典创建"""
+        return cls(
+            data["wxid"],
+            data.get("wxNumber", ""),
+            data.get("wxNickName", ""),
+            data.get("wxRemark", ""),
+            data.get("wxType", ContactType.FRIEND),
+            data.get("wxVerifyFlag", 0),
+        )
+
+    def __getitem__(self, key: str):
+        """兼容原通讯录字典的取值方式"""
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def to_dict(self) -> dict:
+        """转换为通讯录字典"""
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    @property
+    def is_public_account(self) -> bool:
+        """是否为公众号"""
+        return self.wxid.startswith(PUBLIC_ACCOUNT_PREFIX)
+
+    @property
+    def partition(self) -> Optional[str]:
+        """所属分区，不属于任何分区返回None"""
+        if self.wxType == ContactType.GROUP:
+            return "groups"
+        if self.wxType == ContactType.FRIEND:
+            return "public_accounts" if self.is_public_account else "friends"
+        return None
+
+
+class ContactDirectory:
+    """
+    通讯录目录，查询均为O(1)，重复的索引值保留最先出现的联系人，与原线性查找一致
+    """
+
+    loaded_at: Optional[float]
+    """上次全量加载的时间(monotonic)，未加载为None"""
+
+    INDEXES = {
+        "wxNumber": "_by_number",
+        "wxRemark": "_by_remark",
+        "wxNickName": "_by_nickname",
+    }
+    """可更新字段与对应的索引"""
+
+    def __init__(self) -> None:
+        self.loaded_at = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._by_wxid: dict[str, Contact] = {}
+        self._by_number: dict[str, Contact] = {}
+        self._by_remark: dict[str, Contact] = {}
+        self._by_nickname: dict[str, Contact] = {}
+        self._partitions: dict[str, dict[str, Contact]] = {
+            "friends": {},
+            "groups": {},
+            "public_accounts": {},
+        }
+
+    def __len__(self) -> int:
+        return len(self._by_wxid)
+
+    def __contains__(self, wxid: str) -> bool:
+        return wxid in self._by_wxid
+
+    @property
+    def loaded(self) -> bool:
+        """是否已加载"""
+        return self.loaded_at is not None
+
+    def invalidate(self) -> None:
+        """标记为未加载，下次查询时重新加载"""
+        self.loaded_at = None
+
+    def load(self, items: Iterable[dict]) -> None:
+        """
+        说明:
+            全量加载通讯录，替换现有数据
+
+        参数:
+            * `items`: com返回的通讯录字典
+        """
+        self._reset()
+        for item in items:
+            self._insert(Contact.from_dict(item))
+        self.loaded_at = time.monotonic()
+
+    def _insert(self, contact: Contact) -> None:
+        self._by_wxid[contact.wxid] = contact
+        self._by_number.setdefault(contact.wxNumber, contact)
+        self._by_remark.setdefault(contact.wxRemark, contact)
+        self._by_nickname.setdefault(contact.wxNickName, contact)
+        if (partition := contact.partition) is not None:
+            self._partitions[partition][contact.wxid] = contact
+
+    def _unindex(self, index: dict[str, Contact], field: str, contact: Contact) -> None:
+        """从索引中移除联系人，若有同值的联系人则由其顶替"""
+        key = getattr(contact, field)
+        if index.get(key) is not contact:
+            return
+        del index[key]
+        # 同值联系人很少，移除操作也很少，这里直接扫描
+        for other in self._by_wxid.values():
+            if other is not contact and getattr(other, field) == key:
+                index[key] = other
+                break
+
+    def upsert(self, contact: Contact) -> None:
+        """
+        说明:
+            增量添加或替换一个联系人
+
+        参数:
+            * `contact`: 联系人
+        """
+        self.remove(contact.wxid)
+        self._insert(contact)
+
+    def remove(self, wxid: str) -> Optional[Contact]:
+        """
+        说明:
+            增量删除一个联系人
+
+        参数:
+            * `wxid`: 联系人wxid
+
+        返回:
+            * `Contact | None`: 被删除的联系人
+        """
+        contact = self._by_wxid.pop(wxid, None)
+        if contact is None:
+            return None
+        for field, index in self.INDEXES.items():
+            self._unindex(getattr(self, index), field, contact)
+        if (partition := contact.partition) is not None:
+            self._partitions[partition].pop(wxid, None)
+        return contact
+
+    def update(self, wxid: str, **fields: str) -> bool:
+        """
+        说明:
+            增量更新联系人字段
+
+        参数:
+            * `wxid`: 联系人wxid
+            * `fields`: 要更新的字段，如`wxRemark`
+
+        返回:
+            * `bool`: 联系人是否存在
+        """
+        contact = self._by_wxid.get(wxid)
+        if contact is None:
+            return False
+        for field, value in fields.items():
+            if field not in self.INDEXES:
+                setattr(contact, field, value)
+                continue
+            index: dict[str, Contact] = getattr(self, self.INDEXES[field])
+            self._unindex(index, field, contact)
+            setattr(contact, field, value)
+            index.setdefault(value, contact)
+        return True
+
+    def get(self, wxid: str) -> Optional[Contact]:
+        """通过wxid查询联系人"""
+        return self._by_wxid.get(wxid)
+
+    def by_number(self, wx_number: str) -> Optional[Contact]:
+        """通过微信号查询联系人"""
+        return self._by_number.get(wx_number)
+
+    def by_remark(self, remark: str) -> Optional[Contact]:
+        """通过备注查询联系人"""
+        return self._by_remark.get(remark)
+
+    def by_nickname(self, nickname: str) -> Optional[Contact]:
+        """通过昵称查询联系人"""
+        return self._by_nickname.get(nickname)
+
+    def all(self) -> list[Contact]:
+        """所有联系人"""
+        return list(self._by_wxid.values())
+
+    def friends(self) -> list[Contact]:
+        """好友列表"""
+        return list(self._partitions["friends"].values())
+
+    def groups(self) -> list[Contact]:
+        """群聊列表"""
+        return list(self._partitions["groups"].values())
+
+    def public_accounts(self) -> list[Contact]:
+        """公众号列表"""
+        return list(self._partitions["public_accounts"].values())
@@ -0,0 +1,247 @@
+"""
+com调用执行器，所有com调用都在同一个专用线程(STA)中执行，事件循环中通过异步接口等待结果:
+    事件循环 -> AsyncComWechatApi -> com线程 -> ComWechatApi -> com
+"""
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from wechatbot_client.exception import ComCallTimeout
+from wechatbot_client.file_manager import file_watcher
+from wechatbot_client.metrics import metrics
+from wechatbot_client.utils import logger_wrapper
+
+from .com_wechat import ComWechatApi
+
+log = logger_wrapper("Com Executor")
+R = TypeVar("R")
+
+_UNSET = object()
+
+
+def _co_initialize() -> None:
+    """com线程初始化，非windows平台跳过"""
+    try:
+        from comtypes import CoInitialize
+    except ImportError:
+        return
+    CoInitialize()
+
+
+class ComCallStats:
+    """
+    单个com方法的调用统计，时间单位为秒
+    """
+
+    __slots__ = (
+        "count",
+        "errors",
+        "timeouts",
+        "wait_total",
+        "wait_max",
+        "exec_total",
+        "exec_max",
+    )
+
+    count: int
+    """执行次数"""
+    errors: int
+    """执行出错次数"""
+    timeouts: int
+    """等待超时次数"""
+    wait_total: float
+    """排队等待总时间"""
+    wait_max: float
+    """排队等待最长时间"""
+    exec_total: float
+    """执行总时间"""
+    exec_max: float
+    """执行最长时间"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exec_total = 0.0
+        self.exec_max = 0.0
+
+    def record(self, wait: float, cost: float, error: bool) -> None:
+        """记录一次执行"""
+        self.count += 1
+        self.errors += error
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.exec_total += cost
+        self.exec_max = max(self.exec_max, cost)
+
+    def dict(self) -> dict[str, Any]:
+        """转换为字典，时间单位为毫秒"""
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "wait_avg": round(self.wait_total / count * 1000, 3),
+            "wait_max": round(self.wait_max * 1000, 3),
+            "exec_avg": round(self.exec_total / count * 1000, 3),
+            "exec_max": round(self.exec_max * 1000, 3),
+        }
+
+
+class AsyncComWechatApi:
+    """
+    ComWechatApi的异步外观，`await api.send_text(...)`会在com线程中执行`ComWechatApi.send_text`
+
+    com对象只能在创建它的线程中使用，因此执行器只有一个线程，调用按提交顺序执行
+    """
+
+    api: ComWechatApi
+    """被包装的com接口"""
+    timeout: Optional[float]
+    """默认调用超时时间，单位秒，None为不超时"""
+
+    def __init__(self, api: ComWechatApi, timeout: Optional[float] = None) -> None:
+        self.api = api
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats: dict[str, ComCallStats] = {}
+
+    def start(self) -> None:
+        """开启com线程"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="ComExecutor",
+                initializer=_co_initialize,
+            )
+
+    def shutdown(self) -> None:
+        """关闭com线程，丢弃未开始的调用"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_stats(self, name: str) -> ComCallStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = ComCallStats()
+        return stats
+
+    def _submit(self, func: Callable[..., R], args: tuple, kwargs: dict) -> Future:
+        """提交到com线程，记录排队与执行时间"""
+        if self._executor is None:
+            raise RuntimeError("com执行器未开启")
+        stats = self._get_stats(func.__name__)
+        submitted = time.perf_counter()
+
+        def job() -> R:
+            started = time.perf_counter()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                stats.record(started - submitted, time.perf_counter() - started, error)
+
+        return self._executor.submit(job)
+
+    def call_sync(self, func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """
+        说明:
+            在com线程中执行并阻塞等待结果，用于事件循环启动前的初始化
+
+        参数:
+            * `func`: 要执行的函数
+            * `args`, `kwargs`: 函数参数
+        """
+        return self._submit(func, args, kwargs).result()
+
+    async def run(
+        self,
+        func: Callable[..., R],
+        *args: Any,
+        timeout: Optional[float] = _UNSET,
+        **kwargs: Any,
+    ) -> R:
+        """
+        说明:
+            在com线程中执行函数，等待结果。
+            等待被取消或超时时，尚未开始的调用会被取消，已开始的调用无法中断，结果被丢弃
+
+        参数:
+            * `func`: 要执行的函数
+            * `args`, `kwargs`: 函数参数
+            * `timeout`: 超时时间，单位秒，默认使用`self.timeout`，None为不超时
+
+        返回:
+            * `R`: 函数返回值
+
+        错误:
+            * `ComCallTimeout`: 调用超时
+        """
+        if timeout is _UNSET:
+            timeout = self.timeout
+        future = asyncio.wrap_future(self._submit(func, args, kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._get_stats(func.__name__).timeouts += 1
+            log("WARNING", f"com调用超时: {func.__name__}")
+            raise ComCallTimeout(func.__name__, timeout) from None
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        attr = getattr(self.api, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+
+    async def get_msg_cdn(self, msgid: int) -> str:
+        """
+        说明:
+            下载图片、视频、文件，等待文件写入完成
+
+        参数:
+            * `msgid`: 消息id
+
+        返回:
+            * `str`: 成功返回文件路径，失败返回空字符串
+        """
+        path = await self.run(self.api._GetMsgCDN, msgid)
+        if path != "":
+            await file_watcher.wait_for([Path(path)])
+        return path
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """
+        说明:
+            获取每个com方法的调用统计
+
+        返回:
+            * `dict`: 方法名 -> 统计，时间单位为毫秒
+        """
+        return {name: stats.dict() for name, stats in self._stats.items()}
+
+    def register_metrics(self) -> None:
+        """注册com调用指标"""
+        metrics.collector(
+            "wechat_com_calls_total",
+            "com方法的调用、出错与超时次数",
+            ("method", "result"),
+            lambda: [
+                ((name, key), getattr(stats, key))
+                for name, stats in list(self._stats.items())
+                for key in ("count", "errors", "timeouts")
+            ],
+            type="counter",
+        )
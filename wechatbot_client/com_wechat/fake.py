@@ -0,0 +1,132 @@
+"""
+模拟的com robot，用于在没有微信与com组件的环境(如linux)中运行与压测
+"""
+import json
+import os
+import time
+from typing import Any, Callable
+
+FAKE_SELF_ID = "wxid_fakebot"
+"""模拟的自身wxid"""
+
+
+class FakeRobot:
+    """
+    模拟`WeChatRobot.CWeChatRobot`，每次调用前等待`latency`秒来模拟com往返延迟。
+    未单独实现的方法返回0(成功)
+    """
+
+    latency: float
+    """模拟的单次调用延迟，单位秒"""
+    contact_count: int
+    """模拟通讯录的联系人数量"""
+    group_size: int
+    """模拟群聊的成员数量"""
+
+    def __init__(
+        self, latency: float = 0, contact_count: int = 100, group_size: int = 50
+    ) -> None:
+        self.latency = latency
+        self.contact_count = contact_count
+        self.group_size = group_size
+        self.calls: dict[str, int] = {}
+
+    def _wait(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def __getattr__(self, name: str) -> Callable[..., int]:
+        if not name.startswith("C"):
+            raise AttributeError(name)
+
+        def call(*args: Any) -> int:
+            self._wait(name)
+            return 0
+
+        return call
+
+    def CStopRobotService(self, pid: int) -> None:
+        # 没有独立的com进程，返回None使关闭时不会去结束进程
+        self._wait("CStopRobotService")
+        return None
+
+    def CStartWeChat(self) -> int:
+        self._wait("CStartWeChat")
+        return os.getpid()
+
+    def CIsWxLogin(self, pid: int) -> int:
+        self._wait("CIsWxLogin")
+        return 1
+
+    def CGetSelfInfo(self, pid: int) -> str:
+        self._wait("CGetSelfInfo")
+        return json.dumps(
+            {
+                "wxId": FAKE_SELF_ID,
+                "wxNumber": "fakebot",
+                "wxNickName": "fakebot",
+                "Sex": "0",
+                "wxBigAvatar": "",
+                "wxFilePath": os.path.abspath("./data/fake/WeChat Files/"),
+            }
+        )
+
+    def CGetWxUserInfo(self, pid: int, wxid: str) -> str:
+        self._wait("CGetWxUserInfo")
+        return json.dumps(
+            {
+                "wxId": wxid,
+                "wxNumber": wxid,
+                "wxNickName": f"nick_{wxid}",
+                "wxRemark": "null",
+                "wxBigAvatar": "",
+                "wxSmallAvatar": "",
+                "wxNation": "",
+                "wxProvince": "",
+                "wxCity": "",
+            }
+        )
+
+    def CGetFriendList(self, pid: int) -> list[tuple]:
+        self._wait("CGetFriendList")
+        contacts = []
+        for index in range(self.contact_count):
+            is_group = index % 10 == 0
+            wxid = f"{index}@chatroom" if is_group else f"wxid_{index}"
+            contacts.append(
+                (
+                    ("wxid", wxid),
+                    ("wxNumber", wxid),
+                    ("wxNickName", f"nick_{wxid}"),
+                    ("wxRemark", ""),
+                    ("wxType", 2 if is_group else 3),
+                    ("wxVerifyFlag", 0),
+                )
+            )
+        return contacts
+
+    def CGetChatRoomMembers(self, pid: int, group_id: str) -> tuple:
+        self._wait("CGetChatRoomMembers")
+        members = "^G".join(f"wxid_{index}" for index in range(self.group_size))
+        return (("chatroomid", group_id), ("members", members))
+
+    def CGetChatRoomMemberNickname(self, pid: int, group_id: str, wxid: str) -> str:
+        self._wait("CGetChatRoomMemberNickname")
+        return f"nick_{wxid}"
+
+    def CGetWeChatVer(self) -> str:
+        self._wait("CGetWeChatVer")
+        return "3.7.0.30"
+
+    def CExecuteSQL(self, pid: int, handle: int, sql: str) -> list:
+        self._wait("CExecuteSQL")
+        return []
+
+    def CGetDbHandles(self, pid: int) -> list:
+        self._wait("CGetDbHandles")
+        return []
+
+    def CGetMsgCDN(self, pid: int, msgid: int) -> str:
+        self._wait("CGetMsgCDN")
+        return ""
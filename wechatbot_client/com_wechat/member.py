@@ -0,0 +1,156 @@
+"""
+群成员缓存，按`群id -> 成员wxid`保存成员信息与群昵称，带有效期与LRU淘汰
+"""
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from wechatbot_client.metrics import metrics
+
+from .type import WxType
+
+MEMBER_SYSMSG_TEMPLATE = "sysmsgtemplate"
+"""群系统消息中成员变动(邀请、移出)使用的模板标记"""
+
+
+def is_member_notice(msg_type: WxType, content: str) -> bool:
+    """
+    说明:
+        判断群系统消息是否可能改变群成员或群昵称
+
+    参数:
+        * `msg_type`: 消息类型
+        * `content`: 消息内容
+    """
+    if msg_type == WxType.SYSTEM_NOTICE:
+        # 加入、退出、被移出、改名提示都是10000类型的文本
+        return True
+    return msg_type == WxType.SYSTEM_MSG and MEMBER_SYSMSG_TEMPLATE in content
+
+
+class GroupMembers:
+    """
+    单个群的成员缓存
+    """
+
+    __slots__ = ("group_info", "member_ids", "infos", "nicknames", "loaded_at")
+
+    group_info: Optional[dict]
+    """群信息"""
+    member_ids: Optional[tuple[str, ...]]
+    """成员wxid列表，未加载为None"""
+    infos: dict[str, dict]
+    """成员wxid -> 成员信息"""
+    nicknames: dict[str, str]
+    """成员wxid -> 群昵称"""
+    loaded_at: float
+    """创建时间(monotonic)"""
+
+    def __init__(self) -> None:
+        self.group_info = None
+        self.member_ids = None
+        self.infos = {}
+        self.nicknames = {}
+        self.loaded_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        """缓存的条目数量"""
+        return max(len(self.member_ids or ()), len(self.infos), len(self.nicknames))
+
+
+class GroupMemberCache:
+    """
+    群成员缓存，整个群的条目一起过期与淘汰。
+    只在com线程中使用，其他线程只读取`groups`、`members`等计数
+    """
+
+    ttl: float
+    """有效期，单位秒，为0则不过期"""
+    max_members: int
+    """所有群缓存成员总数上限，超出时淘汰最久未使用的群"""
+    groups: int
+    """缓存的群数量"""
+    members: int
+    """缓存的成员数量，在淘汰检查时更新"""
+    hits: int
+    """命中次数"""
+    misses: int
+    """未命中次数"""
+
+    def __init__(self, ttl: float = 300, max_members: int = 20000) -> None:
+        self.ttl = ttl
+        self.max_members = max_members
+        self._groups: OrderedDict[str, GroupMembers] = OrderedDict()
+        self.groups = 0
+        self.members = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def _expired(self, entry: GroupMembers) -> bool:
+        return self.ttl > 0 and time.monotonic() - entry.loaded_at >= self.ttl
+
+    def group(self, group_id: str) -> GroupMembers:
+        """
+        说明:
+            获取群缓存，不存在或已过期时新建，并标记为最近使用
+
+        参数:
+            * `group_id`: 群id
+        """
+        entry = self._groups.get(group_id)
+        if entry is None or self._expired(entry):
+            entry = GroupMembers()
+            self._groups[group_id] = entry
+            self.groups = len(self._groups)
+        self._groups.move_to_end(group_id)
+        return entry
+
+    def shrink(self) -> None:
+        """淘汰最久未使用的群，直到总数不超过上限，至少保留最近使用的群"""
+        total = sum(entry.size for entry in self._groups.values())
+        while total > self.max_members and len(self._groups) > 1:
+            _, entry = self._groups.popitem(last=False)
+            total -= entry.size
+        self.groups = len(self._groups)
+        self.members = total
+
+    def invalidate(self, group_id: str) -> None:
+        """
+        说明:
+            使一个群的缓存失效
+
+        参数:
+            * `group_id`: 群id
+        """
+        entry = self._groups.pop(group_id, None)
+        if entry is not None:
+            self.groups = len(self._groups)
+            self.members = max(self.members - entry.size, 0)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._groups.clear()
+        self.groups = 0
+        self.members = 0
+
+    def stats(self) -> dict[str, int]:
+        """获取缓存计数，只读取计数，可以在任意线程中调用"""
+        return {
+            "groups": self.groups,
+            "members": self.members,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def register_metrics(self) -> None:
+        """注册缓存大小指标"""
+        metrics.collector(
+            "wechat_group_member_cache",
+            "群成员缓存中的群与成员数量",
+            ("kind",),
+            lambda: [(("groups",), self.groups), (("members",), self.members)],
+        )
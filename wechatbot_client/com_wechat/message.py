@@ -4,11 +4,9 @@
 import re
 from inspect import iscoroutinefunction
 from pathlib import Path
-from typing import Callable, Generic, Optional, ParamSpec, TypeVar
+from typing import Callable, Generic, Optional, ParamSpec, TypeVar, Union
 from urllib.parse import unquote
 from uuid import uuid4
-from xml.etree import ElementTree as ET
-from xml.etree.ElementTree import Element
 
 from wechatbot_client.file_manager import FileManager
 from wechatbot_client.onebot12 import Message, MessageSegment
@@ -27,15 +25,17 @@ from wechatbot_client.onebot12.event import (
     GetPrivatePokeNotice,
     GetPrivateRedBagNotice,
     GroupMessageDeleteEvent,
-    GroupMessageEvent,
+    LiteEvent,
+    LiteGroupMessageEvent,
+    LitePrivateMessageEvent,
     PrivateMessageDeleteEvent,
-    PrivateMessageEvent,
 )
 
 from .model import Message as WechatMessage
 from .type import AppType, SysmsgType, WxType
+from .xml_fields import XmlFields, XmlPaths, XmlScanner
 
-E = TypeVar("E", bound=Event)
+E = TypeVar("E", bound=Union[Event, LiteEvent])
 P = ParamSpec("P")
 
 HANDLE_DICT: dict[int, Callable[P, E]] = {}
@@ -46,6 +46,43 @@ SYS_MSG_HANDLERS: dict[str, Callable[P, Optional[E]]] = {}
 """系统消息处理函数字典"""
 SYS_NOTICE_HANDLERS: list[Callable[P, Optional[E]]] = []
 """系统通知处理函数列表"""
+APP_FIELDS: dict[int, XmlFields] = {}
+"""app消息处理函数声明的字段"""
+APP_PATHS = XmlPaths("appmsg/type")
+"""所有app消息处理函数声明的路径，分发前经过的字段也会被记录"""
+SYS_MSG_FIELDS: dict[str, XmlFields] = {}
+"""系统消息处理函数声明的字段"""
+SYS_MSG_PATHS = XmlPaths("@type")
+"""所有系统消息处理函数声明的路径"""
+
+TEXT_FIELDS = XmlFields(at_list="atuserlist")
+"""文本消息extrainfo中的字段"""
+FRIEND_REQUEST_FIELDS = XmlFields(
+    user_id="@fromusername",
+    v3="@encryptusername",
+    v4="@ticket",
+    nickname="@fromnickname",
+    content="@content",
+    country="@country",
+    province="@province",
+    city="@city",
+)
+"""好友请求的字段"""
+CARD_FIELDS = XmlFields(
+    v3="@username",
+    v4="@antispamticket",
+    head_url="@bigheadimgurl",
+    province="@province",
+    city="@city",
+    sex="@sex",
+)
+"""名片消息的字段"""
+EMOJI_FIELDS = XmlFields(cdnurl="emoji@cdnurl")
+"""表情消息的字段"""
+LOCATION_FIELDS = XmlFields(
+    latitude="@x", longitude="@y", title="@label", content="@poiname"
+)
+"""位置消息的字段"""
 
 
 def add_handler(_tpye: int) -> Callable[P, E]:
@@ -61,25 +98,29 @@ def add_handler(_tpye: int) -> Callable[P, E]:
     return _handle
 
 
-def add_app_handler(_tpye: int) -> Callable[P, Optional[E]]:
+def add_app_handler(_tpye: int, **fields: str) -> Callable[P, Optional[E]]:
     """
-    添加app_handler
+    添加app_handler，`fields`为处理函数需要的字段名与路径
     """
 
     def _handle(func: Callable[P, Optional[E]]) -> Callable[P, Optional[E]]:
         global APP_HANDLERS
         APP_HANDLERS[_tpye] = func
+        APP_FIELDS[_tpye] = XmlFields(**fields)
+        APP_PATHS.add(*fields.values())
         return func
 
     return _handle
 
 
-def add_sys_msg_handler(_tpye: str) -> Callable[P, Optional[E]]:
-    """添加系统消息处理器"""
+def add_sys_msg_handler(_tpye: str, **fields: str) -> Callable[P, Optional[E]]:
+    """添加系统消息处理器，`fields`为处理函数需要的字段名与路径"""
 
     def _handle(func: Callable[P, Optional[E]]) -> Callable[P, Optional[E]]:
         global SYS_MSG_HANDLERS
         SYS_MSG_HANDLERS[_tpye] = func
+        SYS_MSG_FIELDS[_tpye] = XmlFields(**fields)
+        SYS_MSG_PATHS.add(*fields.values())
         return func
 
     return _handle
@@ -137,31 +178,32 @@ class MessageHandler(Generic[E]):
         """
         处理文本
         """
-        # 获取at
+        # 获取at，大部分消息没有at，不需要解析
         raw_xml = msg.extrainfo
-        xml_obj = ET.fromstring(raw_xml)
-        at_xml = xml_obj.find("./atuserlist")
+        at_text = None
+        if "<atuserlist" in raw_xml:
+            at_text = TEXT_FIELDS.extract(raw_xml)["at_list"]
         event_id = str(uuid4())
-        if at_xml is None:
+        if at_text is None:
             # 没有at
             # 获取message
             message = Message(MessageSegment.text(msg.message))
             # 判断群聊还是私聊
             if "@chatroom" in msg.sender:
-                return GroupMessageEvent(
+                return LiteGroupMessageEvent(
                     id=event_id,
                     time=msg.timestamp,
-                    self=BotSelf(user_id=msg.self),
+                    self_id=msg.self,
                     message_id=str(msg.msgid),
                     message=message,
                     alt_message=str(message),
                     user_id=msg.wxid,
                     group_id=msg.sender,
                 )
-            return PrivateMessageEvent(
+            return LitePrivateMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
@@ -169,7 +211,7 @@ class MessageHandler(Generic[E]):
             )
 
         # 获取at
-        at_list = at_xml.text.split(",")
+        at_list = at_text.split(",")
         if at_list[0] == "":
             # pc微信发消息at时，会多一个','
             at_list.pop(0)
@@ -195,10 +237,10 @@ class MessageHandler(Generic[E]):
                     new_msg.append(MessageSegment.mention_all())
                 else:
                     new_msg.append(MessageSegment.mention(at_one))
-        return GroupMessageEvent(
+        return LiteGroupMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=new_msg,
             alt_message=str(new_msg),
@@ -225,20 +267,20 @@ class MessageHandler(Generic[E]):
         message = Message(MessageSegment.image(file_id=file_id))
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -263,20 +305,20 @@ class MessageHandler(Generic[E]):
         message = Message(MessageSegment.image(file_id=file_id))
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -289,21 +331,12 @@ class MessageHandler(Generic[E]):
         处理好友请求
         """
         event_id = str(uuid4())
-        raw_xml = msg.message
-        xml_obj = ET.fromstring(raw_xml)
-        attrib = xml_obj.attrib
+        fields = FRIEND_REQUEST_FIELDS.extract(msg.message)
         return FriendRequestEvent(
             id=event_id,
             time=msg.timestamp,
             self=BotSelf(user_id=msg.self),
-            user_id=attrib["fromusername"],
-            v3=attrib["encryptusername"],
-            v4=attrib["ticket"],
-            nickname=attrib["fromnickname"],
-            content=attrib["content"],
-            country=attrib["country"],
-            province=attrib["province"],
-            city=attrib["city"],
+            **fields,
         )
 
     @add_handler(WxType.CARD_MSG)
@@ -312,9 +345,7 @@ class MessageHandler(Generic[E]):
         处理名片消息
         """
         event_id = str(uuid4())
-        raw_xml = msg.message
-        xml_obj = ET.fromstring(raw_xml)
-        attrib = xml_obj.attrib
+        fields = CARD_FIELDS.extract(msg.message)
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
             return GetGroupCardNotice(
@@ -323,24 +354,14 @@ class MessageHandler(Generic[E]):
                 self=BotSelf(user_id=msg.self),
                 user_id=msg.wxid,
                 group_id=msg.sender,
-                v3=attrib["username"],
-                v4=attrib["antispamticket"],
-                head_url=attrib["bigheadimgurl"],
-                province=attrib["province"],
-                city=attrib["city"],
-                sex=attrib["sex"],
+                **fields,
             )
         return GetPrivateCardNotice(
             id=event_id,
             time=msg.timestamp,
             self=BotSelf(user_id=msg.self),
             user_id=msg.wxid,
-            v3=attrib["username"],
-            v4=attrib["antispamticket"],
-            head_url=attrib["bigheadimgurl"],
-            province=attrib["province"],
-            city=attrib["city"],
-            sex=attrib["sex"],
+            **fields,
         )
 
     @add_handler(WxType.VIDEO_MSG)
@@ -363,20 +384,20 @@ class MessageHandler(Generic[E]):
         message = Message(MessageSegment.video(file_id=file_id))
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -390,9 +411,7 @@ class MessageHandler(Generic[E]):
         """
         event_id = str(uuid4())
         # 获取文件名
-        raw_xml = msg.message
-        xml_obj = ET.fromstring(raw_xml)
-        emoji_url = xml_obj.find("./emoji").attrib.get("cdnurl")
+        emoji_url = EMOJI_FIELDS.extract(msg.message)["cdnurl"]
         emoji = unquote(emoji_url)
         file_id = await self.file_manager.cache_file_id_from_url(
             emoji, f"{msg.msgid}.gif"
@@ -400,20 +419,20 @@ class MessageHandler(Generic[E]):
         message = Message(MessageSegment.emoji(file_id=file_id))
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -426,33 +445,25 @@ class MessageHandler(Generic[E]):
         处理位置信息
         """
         event_id = str(uuid4())
-        raw_xml = msg.message
-        xml_obj = ET.fromstring(raw_xml)
-        attrib = xml_obj.attrib
         message = Message(
-            MessageSegment.location(
-                latitude=attrib["x"],
-                longitude=attrib["y"],
-                title=attrib["label"],
-                content=attrib["poiname"],
-            )
+            MessageSegment.location(**LOCATION_FIELDS.extract(msg.message))
         )
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -464,18 +475,19 @@ class MessageHandler(Generic[E]):
         """
         处理app消息
         """
-        raw_xml = msg.message
-        xml_obj = ET.fromstring(raw_xml)
-        app = xml_obj.find("./appmsg")
-        _type = int(app.find("./type").text)
-        result = None
-        handler = APP_HANDLERS.get(_type)
+        # 先只解析到type，没有对应处理函数的消息(如转发的聊天记录)不再继续解析
+        scanner = XmlScanner(msg.message, APP_PATHS)
+        _type = scanner.get("appmsg/type")
+        handler = APP_HANDLERS.get(int(_type)) if _type else None
         if handler is None:
+            scanner.close()
             return None
+        fields = scanner.extract(APP_FIELDS[int(_type)])
+        scanner.close()
         if iscoroutinefunction(handler):
-            result = await handler(AppMessageHandler, self, msg, app)
+            result = await handler(AppMessageHandler, self, msg, fields)
         else:
-            result = handler(AppMessageHandler, self, msg, app)
+            result = handler(AppMessageHandler, self, msg, fields)
         return result
 
     @add_handler(WxType.SYSTEM_NOTICE)
@@ -495,15 +507,15 @@ class MessageHandler(Generic[E]):
         """
         处理系统消息
         """
-        result = None
-        raw_xml = msg.message
-        xml_obj = ET.fromstring(raw_xml)
-        notice_type = xml_obj.attrib["type"]
+        scanner = XmlScanner(msg.message, SYS_MSG_PATHS)
+        notice_type = scanner.get("@type")
         handler = SYS_MSG_HANDLERS.get(notice_type)
         if handler is None:
+            scanner.close()
             return None
-        result = handler(SysMsgHandler, msg, xml_obj)
-        return result
+        fields = scanner.extract(SYS_MSG_FIELDS[notice_type])
+        scanner.close()
+        return handler(SysMsgHandler, msg, fields)
 
 
 class AppMessageHandler(Generic[E]):
@@ -512,17 +524,22 @@ class AppMessageHandler(Generic[E]):
     """
 
     @classmethod
-    @add_app_handler(AppType.APP_LINK)
+    @add_app_handler(
+        AppType.APP_LINK, title="appmsg/title", des="appmsg/des", url="appmsg/url"
+    )
     async def handle_app_link(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """
         处理其他应用分享的链接
         """
         event_id = str(uuid4())
-        title = app.find("./title").text
-        des = app.find("./des").text
-        url = app.find("./url").text.replace(" ", "")
+        title = fields["title"]
+        des = fields["des"]
+        url = fields["url"].replace(" ", "")
         image_path = msg.thumb_path
         file_id = None
         if image_path != "":
@@ -538,20 +555,20 @@ class AppMessageHandler(Generic[E]):
         )
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -559,17 +576,22 @@ class AppMessageHandler(Generic[E]):
         )
 
     @classmethod
-    @add_app_handler(AppType.LINK_MSG)
+    @add_app_handler(
+        AppType.LINK_MSG, title="appmsg/title", des="appmsg/des", url="appmsg/url"
+    )
     async def handle_link(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """
         处理链接
         """
         event_id = str(uuid4())
-        title = app.find("./title").text
-        des = app.find("./des").text
-        url = app.find("./url").text.replace(" ", "")
+        title = fields["title"]
+        des = fields["des"]
+        url = fields["url"].replace(" ", "")
         image_path = msg.filepath
         file_id = None
         if image_path != "":
@@ -585,20 +607,20 @@ class AppMessageHandler(Generic[E]):
         )
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -606,21 +628,28 @@ class AppMessageHandler(Generic[E]):
         )
 
     @classmethod
-    @add_app_handler(AppType.FILE_NOTICE)
+    @add_app_handler(
+        AppType.FILE_NOTICE,
+        file_name="appmsg/title",
+        md5="appmsg/md5",
+        file_length="appmsg/appattach/totallen",
+        overwrite_newmsgid="appmsg/appattach/overwrite_newmsgid",
+    )
     async def handle_file(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """
         处理文件消息
         """
         event_id = str(uuid4())
-        file_name = app.find("./title").text
-        md5 = app.find("./md5").text
-        appattach = app.find("./appattach")
-        file_length = int(appattach.find("./totallen").text)
+        file_name = fields["file_name"]
+        md5 = fields["md5"]
+        file_length = int(fields["file_length"])
         # 判断是否为通知还是下载完成
-        overwrite_newmsgid = appattach.find("./overwrite_newmsgid")
-        if overwrite_newmsgid is None:
+        if fields["overwrite_newmsgid"] is None:
             # 通知事件
             # 检测是否为群聊
             if "@chatroom" in msg.sender:
@@ -657,20 +686,20 @@ class AppMessageHandler(Generic[E]):
         message = Message(MessageSegment.file(file_id=file_id))
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -678,36 +707,44 @@ class AppMessageHandler(Generic[E]):
         )
 
     @classmethod
-    @add_app_handler(AppType.QUOTE)
+    @add_app_handler(
+        AppType.QUOTE,
+        text="appmsg/title",
+        from_msgid="appmsg/refermsg/svrid",
+        from_user="appmsg/refermsg/fromusr",
+    )
     def handle_quote(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """
         处理引用
         """
         event_id = str(uuid4())
-        text = app.find("./title").text
-        from_msgid = app.find("./refermsg/svrid").text
-        from_user = app.find("./refermsg/fromusr").text
+        text = fields["text"]
+        from_msgid = fields["from_msgid"]
+        from_user = fields["from_user"]
         message = MessageSegment.reply(
             message_id=from_msgid, user_id=from_user
         ) + MessageSegment.text(text)
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -715,34 +752,42 @@ class AppMessageHandler(Generic[E]):
         )
 
     @classmethod
-    @add_app_handler(AppType.APP)
+    @add_app_handler(
+        AppType.APP,
+        title="appmsg/title",
+        url="appmsg/url",
+        app_id="appmsg/weappinfo/username",
+    )
     def handle_app(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """
         处理app消息
         """
         event_id = str(uuid4())
-        title = app.find("./title").text
-        url = app.find("./url").text
-        app_id = app.find("./weappinfo/username").text
+        title = fields["title"]
+        url = fields["url"]
+        app_id = fields["app_id"]
         message = Message(MessageSegment.app(app_id, title, url))
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
-            return GroupMessageEvent(
+            return LiteGroupMessageEvent(
                 id=event_id,
                 time=msg.timestamp,
-                self=BotSelf(user_id=msg.self),
+                self_id=msg.self,
                 message_id=str(msg.msgid),
                 message=message,
                 alt_message=str(message),
                 user_id=msg.wxid,
                 group_id=msg.sender,
             )
-        return PrivateMessageEvent(
+        return LitePrivateMessageEvent(
             id=event_id,
             time=msg.timestamp,
-            self=BotSelf(user_id=msg.self),
+            self_id=msg.self,
             message_id=str(msg.msgid),
             message=message,
             alt_message=str(message),
@@ -750,13 +795,16 @@ class AppMessageHandler(Generic[E]):
         )
 
     @classmethod
-    @add_app_handler(AppType.GROUP_ANNOUNCEMENT)
+    @add_app_handler(AppType.GROUP_ANNOUNCEMENT, text="appmsg/textannouncement")
     def handle_announcement(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """处理群公告"""
         event_id = str(uuid4())
-        text = app.find("textannouncement").text
+        text = fields["text"]
         return GetGroupAnnouncementNotice(
             id=event_id,
             time=msg.timestamp,
@@ -769,7 +817,10 @@ class AppMessageHandler(Generic[E]):
     @classmethod
     @add_app_handler(AppType.TRANSFER)
     def handle_transfer(
-        cls, msg_handler: MessageHandler, msg: WechatMessage, app: Element
+        cls,
+        msg_handler: MessageHandler,
+        msg: WechatMessage,
+        fields: dict[str, Optional[str]],
     ) -> E:
         """
         处理转账消息
@@ -784,12 +835,13 @@ class SysMsgHandler(Generic[E]):
     """
 
     @classmethod
-    @add_sys_msg_handler(SysmsgType.REVOKE)
-    def revoke(cls, msg: WechatMessage, xml_obj: Element) -> Optional[E]:
+    @add_sys_msg_handler(SysmsgType.REVOKE, message_id="revokemsg/newmsgid")
+    def revoke(
+        cls, msg: WechatMessage, fields: dict[str, Optional[str]]
+    ) -> Optional[E]:
         """撤回消息事件"""
-        msg_obj = xml_obj.find("./revokemsg/newmsgid")
         event_id = str(uuid4())
-        message_id = msg_obj.text
+        message_id = fields["message_id"]
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
             return GroupMessageDeleteEvent(
@@ -810,37 +862,48 @@ class SysMsgHandler(Generic[E]):
         )
 
     @classmethod
-    @add_sys_msg_handler(SysmsgType.ROOMTOOL)
-    def room_tools_tips(cls, msg: WechatMessage, xml_obj: Element) -> Optional[E]:
+    @add_sys_msg_handler(
+        SysmsgType.ROOMTOOL, todo="todo", title="todo/title", creator="todo/creator"
+    )
+    def room_tools_tips(
+        cls, msg: WechatMessage, fields: dict[str, Optional[str]]
+    ) -> Optional[E]:
         """
         群提示
         """
-        todo = xml_obj.find("./todo")
-        if todo is None:
+        if fields["todo"] is None:
             return None
-        title = todo.find("./title").text
-        creator = todo.find("./creator").text
+        title = fields["title"]
+        creator = fields["creator"]
         # TODO: 未完成
         return None
 
     @classmethod
     @add_sys_msg_handler(SysmsgType.FUNCTIONMSG)
-    def function_msg(cls, msg: WechatMessage, xml_obj: Element) -> Optional[E]:
+    def function_msg(
+        cls, msg: WechatMessage, fields: dict[str, Optional[str]]
+    ) -> Optional[E]:
         """
         函数消息
         """
         return None
 
     @classmethod
-    @add_sys_msg_handler(SysmsgType.PAT)
-    def pat(cls, msg: WechatMessage, xml_obj: Element) -> Optional[E]:
+    @add_sys_msg_handler(
+        SysmsgType.PAT,
+        from_user="pat/fromusername",
+        to_user="pat/pattedusername",
+        chatroom="pat/chatusername",
+    )
+    def pat(
+        cls, msg: WechatMessage, fields: dict[str, Optional[str]]
+    ) -> Optional[E]:
         """
         拍一拍
         """
-        pat = xml_obj.find("./pat")
-        from_user = pat.find("./fromusername").text
-        to_user = pat.find("./pattedusername").text
-        chatroom = pat.find("./chatusername").text
+        from_user = fields["from_user"]
+        to_user = fields["to_user"]
+        chatroom = fields["chatroom"]
         event_id = str(uuid4())
         # 检测是否为群聊
         if "@chatroom" in msg.sender:
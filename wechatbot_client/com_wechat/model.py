@@ -1,5 +1,7 @@
+import json
+import re
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional, Union
 
 from pydantic import BaseModel
 
@@ -39,3 +41,154 @@ class Message(BaseModel):
     """消息类型"""
     wxid: str
     """wxid"""
+
+
+WX_TYPES: dict[int, WxType] = {one.value: one for one in WxType}
+"""消息type值 -> WxType"""
+TIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+"""快速解析接受的时间格式，其他格式交给pydantic验证"""
+STR_FIELDS = ("extrainfo", "message", "self", "sender", "sign", "thumb_path", "wxid")
+"""必须为字符串的字段"""
+INT_FIELDS = ("msgid", "pid", "timestamp")
+"""必须为整数的字段"""
+
+
+class MessageRecord:
+    """
+    接收的消息，由`parse_message`快速解析生成，字段与`Message`相同
+    """
+
+    __slots__ = (
+        "extrainfo",
+        "filepath",
+        "isSendByPhone",
+        "isSendMsg",
+        "message",
+        "msgid",
+        "pid",
+        "self",
+        "sender",
+        "sign",
+        "thumb_path",
+        "time",
+        "timestamp",
+        "type",
+        "wxid",
+    )
+
+    extrainfo: str
+    """额外信息"""
+    filepath: Optional[str]
+    """文件路径"""
+    isSendByPhone: Optional[bool]
+    """是否为手机发送，自己手动操作机器人发送时有效"""
+    isSendMsg: bool
+    """是否为自身发送"""
+    message: str
+    """消息内容"""
+    msgid: int
+    """消息id"""
+    pid: int
+    """进程pid"""
+    self: str
+    """自身id"""
+    sender: str
+    """发送方id"""
+    sign: str
+    """sign值"""
+    thumb_path: str
+    """缩略图位置"""
+    time: datetime
+    """发送时间"""
+    timestamp: int
+    """时间戳"""
+    type: WxType
+    """消息类型"""
+    wxid: str
+    """wxid"""
+
+    def __init__(
+        self, data: dict[str, Any], msg_type: WxType, time: datetime
+    ) -> None:
+        self.extrainfo = data["extrainfo"]
+        self.filepath = data.get("filepath")
+        self.isSendByPhone = data.get("isSendByPhone")
+        self.isSendMsg = data["isSendMsg"]
+        self.message = data["message"]
+        self.msgid = data["msgid"]
+        self.pid = data["pid"]
+        self.self = data["self"]
+        self.sender = data["sender"]
+        self.sign = data["sign"]
+        self.thumb_path = data["thumb_path"]
+        self.timestamp = data["timestamp"]
+        self.type = msg_type
+        self.time = time
+        self.wxid = data["wxid"]
+
+    def dict(self) -> dict[str, Any]:
+        """转换为字典，与`Message.dict()`相同"""
+        return {name: getattr(self, name) for name in Message.__fields__}
+
+    def __repr__(self) -> str:
+        return (
+            f"MessageRecord(type={self.type!r}, msgid={self.msgid}, "
+            f"sender={self.sender!r}, wxid={self.wxid!r})"
+        )
+
+
+def _fast_record(data: Any) -> Optional[MessageRecord]:
+    """字段类型完全符合时直接生成`MessageRecord`，否则返回None"""
+    if type(data) is not dict:
+        return None
+    msg_type = data.get("type")
+    if type(msg_type) is not int or msg_type not in WX_TYPES:
+        return None
+    for name in STR_FIELDS:
+        if type(data.get(name)) is not str:
+            return None
+    for name in INT_FIELDS:
+        if type(data.get(name)) is not int:
+            return None
+    if type(data.get("isSendMsg")) is not bool:
+        return None
+    filepath = data.get("filepath")
+    if filepath is not None and type(filepath) is not str:
+        return None
+    by_phone = data.get("isSendByPhone")
+    if by_phone is not None and type(by_phone) is not bool:
+        return None
+    time = data.get("time")
+    if type(time) is not str or TIME_PATTERN.fullmatch(time) is None:
+        return None
+    try:
+        # 格式符合但日期无效(如13月)时交给pydantic，抛出相同的验证错误
+        parsed = datetime.fromisoformat(time)
+    except ValueError:
+        return None
+    return MessageRecord(data, WX_TYPES[msg_type], parsed)
+
+
+def parse_message(raw: str) -> Union[Message, MessageRecord]:
+    """
+    说明:
+        解析原始消息。字段类型完全符合时跳过pydantic，直接生成`MessageRecord`，
+        否则(需要类型转换、缺少字段、未知消息类型等)交给`Message`验证
+
+    参数:
+        * `raw`: 原始消息json
+
+    返回:
+        * `Union[Message, MessageRecord]`: 消息，两者字段相同
+
+    错误:
+        * `ValidationError`: 与`Message.parse_raw`相同
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return Message.parse_raw(raw)
+    record = _fast_record(data)
+    if record is None:
+        return Message.parse_obj(data)
+    return record
@@ -0,0 +1,210 @@
+"""
+消息接收模块，com事件在独立线程中泵送，再交给事件循环:
+    com事件线程 -> MessageReporter -> MessagePipeline
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Coroutine, Iterable, Optional, Tuple
+
+from wechatbot_client.consts import COM_PUMP_INTERVAL
+from wechatbot_client.metrics import COM_MESSAGES, metrics
+from wechatbot_client.trace import Trace, tracer
+from wechatbot_client.utils import escape_tag, logger_wrapper
+
+log = logger_wrapper("Com WeChat")
+
+
+class MessageReporter:
+    """
+    消息接收器，`OnGetMessageEvent`由事件线程调用，消息交给事件循环中的消息处理器
+    """
+
+    func: Callable[[str, Optional[Trace]], Coroutine] = None
+    """消息处理器，接收原始消息与追踪，处理器阻塞时也会阻塞事件线程"""
+    loop: Optional[asyncio.AbstractEventLoop]
+    """事件循环"""
+
+    def __init__(self) -> None:
+        self.loop = None
+
+    def OnGetMessageEvent(self, message: Tuple[str, None]):
+        self.report(message[0])
+
+    def report(self, msg: str) -> None:
+        """
+        说明:
+            上报一条消息，在事件线程中调用，等待消息处理器接收
+
+        参数:
+            * `msg`: 原始消息
+        """
+        log("DEBUG", lambda: f"<g>接收到wechat消息</g> - {escape_tag(msg)}")
+        if metrics.enabled:
+            COM_MESSAGES.inc()
+        if self.loop is None or self.func is None:
+            return
+        trace = tracer.start() if tracer.enabled else None
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.func(msg, trace), self.loop)
+        except RuntimeError:
+            # 事件循环已关闭
+            return
+        future.result()
+
+    def register_message_handler(
+        self, func: Callable[[str, Optional[Trace]], Coroutine]
+    ) -> None:
+        """注册一个消息处理器"""
+        self.func = func
+
+    def start(self) -> None:
+        """开始上报消息，需要在事件循环中调用"""
+        self.loop = asyncio.get_running_loop()
+
+    def stop(self) -> None:
+        """停止上报消息"""
+        self.loop = None
+
+
+class EventPump(threading.Thread):
+    """
+    事件泵线程基类，子类实现`setup`、`pump`与`teardown`
+    """
+
+    reporter: MessageReporter
+    """消息接收器"""
+    interval: float
+    """单次泵送的最长等待时间，单位秒"""
+
+    def __init__(
+        self, reporter: MessageReporter, interval: float = COM_PUMP_INTERVAL
+    ) -> None:
+        super().__init__(name=self.__class__.__name__, daemon=True)
+        self.reporter = reporter
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    @property
+    def stopped(self) -> bool:
+        """是否已请求停止"""
+        return self._stop_event.is_set()
+
+    def setup(self) -> None:
+        """在事件线程中初始化"""
+        pass
+
+    def pump(self) -> None:
+        """泵送一次事件，最长阻塞`interval`秒"""
+        raise NotImplementedError
+
+    def teardown(self) -> None:
+        """在事件线程中清理"""
+        pass
+
+    def run(self) -> None:
+        try:
+            self.setup()
+        except Exception as e:
+            log("ERROR", f"<r>事件线程初始化失败: {e}</r>")
+            return
+        try:
+            while not self.stopped:
+                self.pump()
+        except Exception as e:
+            log("ERROR", f"<r>事件线程出错: {e}</r>")
+        finally:
+            self.teardown()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止事件线程，并等待其退出"""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class ComEventPump(EventPump):
+    """
+    com事件泵，在线程内创建事件对象并注册连接点，
+    com回调只会在注册它的线程(STA)中分发
+    """
+
+    wechat_pid: int
+    """微信pid"""
+
+    def __init__(
+        self,
+        reporter: MessageReporter,
+        wechat_pid: int,
+        interval: float = COM_PUMP_INTERVAL,
+    ) -> None:
+        super().__init__(reporter, interval)
+        self.wechat_pid = wechat_pid
+        self.event = None
+        self.connection_point = None
+
+    def setup(self) -> None:
+        from comtypes import CoInitialize
+        from comtypes.client import CreateObject, GetEvents
+
+        CoInitialize()
+        self.event = CreateObject("WeChatRobot.RobotEvent")
+        self.connection_point = GetEvents(self.event, self.reporter)
+        self.event.CRegisterWxPidWithCookie(
+            self.wechat_pid, self.connection_point.cookie
+        )
+
+    def pump(self) -> None:
+        from comtypes.client import PumpEvents
+
+        # PumpEvents内部等待句柄，空闲时不占用cpu
+        PumpEvents(self.interval)
+
+    def teardown(self) -> None:
+        from comtypes import CoUninitialize
+
+        self.connection_point = None
+        self.event = None
+        CoUninitialize()
+
+
+class FakeEventPump(EventPump):
+    """
+    模拟事件泵，按固定速率重放原始消息，用于在无com环境下测量延迟与空闲占用
+    """
+
+    messages: list[str]
+    """要重放的原始消息"""
+    rate: float
+    """每秒上报数量，为0时不上报，仅空转"""
+    repeat: bool
+    """是否循环重放"""
+
+    def __init__(
+        self,
+        reporter: MessageReporter,
+        messages: Iterable[str] = (),
+        rate: float = 0,
+        repeat: bool = False,
+        interval: float = COM_PUMP_INTERVAL,
+    ) -> None:
+        super().__init__(reporter, interval)
+        self.messages = list(messages)
+        self.rate = rate
+        self.repeat = repeat
+        self._index = 0
+        self._next_time = 0.0
+
+    def pump(self) -> None:
+        if self.rate <= 0 or self._index >= len(self.messages):
+            self._stop_event.wait(self.interval)
+            return
+        now = time.perf_counter()
+        if now < self._next_time:
+            self._stop_event.wait(min(self._next_time - now, self.interval))
+            return
+        self.reporter.report(self.messages[self._index])
+        self._index += 1
+        if self.repeat and self._index >= len(self.messages):
+            self._index = 0
+        self._next_time = max(now, self._next_time) + 1 / self.rate
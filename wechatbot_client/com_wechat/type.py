@@ -69,3 +69,14 @@ class SysmsgType(str, Enum):
     """函数消息"""
     PAT = "pat"
     """拍一拍消息"""
+
+
+class ContactType(IntEnum):
+    """
+    通讯录联系人类型
+    """
+
+    GROUP = 2
+    """群聊"""
+    FRIEND = 3
+    """好友与公众号"""
@@ -0,0 +1,242 @@
+"""
+消息xml字段提取，每个消息处理函数声明自己需要的字段，按需增量解析:
+    原始xml -> XmlScanner(expat分段解析) -> 只记录声明的路径 -> 找到后停止解析
+
+较短的xml完整解析(ElementTree由c实现)反而更快，超过`XML_SCAN_THRESHOLD`时才增量解析
+
+路径相对于根元素，`/`分隔子元素，`@`表示属性:
+ - `appmsg/title`: 根元素下`appmsg`的子元素`title`的文本
+ - `emoji@cdnurl`: 根元素下`emoji`元素的`cdnurl`属性
+ - `@type`: 根元素的`type`属性
+
+转发的聊天记录、小程序等app消息很大，分发只需要`appmsg/type`，
+处理函数需要的字段通常也在前面，找到后不再解析剩余内容，也不会生成元素树
+"""
+from functools import lru_cache
+from typing import Optional
+from xml.etree import ElementTree as ET
+from xml.etree.ElementTree import Element
+from xml.parsers import expat
+
+XML_SCAN_THRESHOLD = 4096
+"""超过该长度(字符数)的xml才增量解析"""
+XML_CHUNK_SIZE = 1024
+"""首次送入解析器的字符数，之后每次翻倍"""
+
+
+@lru_cache(maxsize=None)
+def compile_path(path: str) -> tuple[str, Optional[str]]:
+    """
+    说明:
+        编译路径，结果会被缓存
+
+    参数:
+        * `path`: 字段路径
+
+    返回:
+        * `str`: 元素路径，根元素为空字符串
+        * `Optional[str]`: 属性名，为None时取元素文本
+    """
+    element, _, attr = path.partition("@")
+    return element.strip("/"), attr or None
+
+
+class XmlPaths:
+    """
+    一组需要记录的路径，按元素路径索引
+    """
+
+    texts: dict[str, str]
+    """元素路径 -> 取文本的字段路径"""
+    attrs: dict[str, list[tuple[str, str]]]
+    """元素路径 -> (属性名, 字段路径)"""
+    prefixes: set[str]
+    """所有元素路径及其上级路径，不在其中的子树直接跳过"""
+
+    def __init__(self, *paths: str) -> None:
+        self.texts = {}
+        self.attrs = {}
+        self.prefixes = {""}
+        self.add(*paths)
+
+    def add(self, *paths: str) -> None:
+        """添加路径"""
+        for path in paths:
+            element, attr = compile_path(path)
+            if attr is None:
+                self.texts[element] = path
+            elif (attr, path) not in self.attrs.get(element, ()):
+                self.attrs.setdefault(element, []).append((attr, path))
+            parts = element.split("/")
+            for index in range(1, len(parts) + 1):
+                self.prefixes.add("/".join(parts[:index]))
+
+
+class XmlScanner:
+    """
+    增量解析一段xml，只记录声明的路径，需要的字段找到后就不再继续解析
+    """
+
+    paths: XmlPaths
+    """需要记录的路径"""
+    values: dict[str, str]
+    """已经找到的字段，元素存在但没有文本时为空字符串"""
+
+    def __init__(self, raw: str, paths: XmlPaths) -> None:
+        self.paths = paths
+        self.values = {}
+        self._root: Optional[Element] = None
+        self._parser: Optional[expat.XMLParserType] = None
+        if len(raw) <= XML_SCAN_THRESHOLD:
+            self._root = ET.fromstring(raw)
+            return
+        self._raw = raw
+        self._pos = 0
+        self._chunk = XML_CHUNK_SIZE
+        self._stack: list[Optional[str]] = []
+        self._text: list[str] = []
+        self._capture: Optional[str] = None
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        self._parser = parser
+
+    def _start(self, tag: str, attrib: dict[str, str]) -> None:
+        stack = self._stack
+        if not stack:
+            path = ""
+        else:
+            parent = stack[-1]
+            if parent is None:
+                # 不需要的子树
+                stack.append(None)
+                return
+            path = f"{parent}/{tag}" if parent else tag
+            if path not in self.paths.prefixes:
+                path = None
+        stack.append(path)
+        if self._capture is not None:
+            # 与ElementTree一致，文本只取第一个子元素之前的部分
+            self._store_text()
+        if path is None:
+            return
+        values = self.values
+        for attr, field in self.paths.attrs.get(path, ()):
+            value = attrib.get(attr)
+            if value is not None and field not in values:
+                values[field] = value
+        field = self.paths.texts.get(path)
+        if field is not None and field not in values:
+            self._capture = path
+            self._text = []
+            self._parser.CharacterDataHandler = self._text.append
+
+    def _end(self, tag: str) -> None:
+        path = self._stack.pop()
+        if path is not None and path == self._capture:
+            self._store_text()
+
+    def _store_text(self) -> None:
+        """记录正在读取的文本"""
+        self.values.setdefault(self.paths.texts[self._capture], "".join(self._text))
+        self._capture = None
+        self._parser.CharacterDataHandler = None
+
+    def _advance(self) -> bool:
+        """解析下一段，返回是否还有剩余内容"""
+        parser = self._parser
+        if parser is None:
+            return False
+        chunk = self._raw[self._pos : self._pos + self._chunk]
+        self._pos += self._chunk
+        self._chunk *= 2
+        final = self._pos >= len(self._raw)
+        try:
+            parser.Parse(chunk, final)
+        finally:
+            if final:
+                self._parser = None
+        return not final
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        说明:
+            获取字段，未找到时继续解析
+
+        参数:
+            * `path`: 字段路径，需要在`paths`中声明
+
+        返回:
+            * `Optional[str]`: 文本或属性值，不存在时为None
+        """
+        values = self.values
+        if self._root is not None:
+            if path not in values:
+                values[path] = self._find(path)
+            return values[path]
+        while path not in values and self._advance():
+            pass
+        return values.get(path)
+
+    def _find(self, path: str) -> Optional[str]:
+        """在完整解析的元素树中查找"""
+        element, attr = compile_path(path)
+        elem = self._root.find(element) if element else self._root
+        if elem is None:
+            return None
+        if attr is not None:
+            return elem.get(attr)
+        return elem.text or ""
+
+    def extract(self, fields: "XmlFields") -> dict[str, Optional[str]]:
+        """
+        说明:
+            获取一组字段
+
+        返回:
+            * `dict[str, Optional[str]]`: 字段名 -> 值
+        """
+        return {name: self.get(path) for name, path in fields.fields.items()}
+
+    def close(self) -> None:
+        """不再需要更多字段，丢弃解析器(解析器与扫描器互相引用)"""
+        self._parser = None
+        self._root = None
+
+
+class XmlFields:
+    """
+    消息处理函数声明的字段
+    """
+
+    __slots__ = ("fields", "paths")
+
+    fields: dict[str, str]
+    """字段名 -> 路径"""
+    paths: XmlPaths
+    """编译后的路径"""
+
+    def __init__(self, **fields: str) -> None:
+        self.fields = fields
+        self.paths = XmlPaths(*fields.values())
+
+    def extract(self, raw: str) -> dict[str, Optional[str]]:
+        """
+        说明:
+            从xml中提取声明的字段
+
+        参数:
+            * `raw`: 原始xml
+
+        返回:
+            * `dict[str, Optional[str]]`: 字段名 -> 值，不存在时为None
+
+        错误:
+            * `xml.etree.ElementTree.ParseError`: xml格式错误
+            * `xml.parsers.expat.ExpatError`: 增量解析时，找到所有字段之前xml格式错误
+        """
+        scanner = XmlScanner(raw, self.paths)
+        values = scanner.extract(self)
+        scanner.close()
+        return values
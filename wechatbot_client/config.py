@@ -156,6 +156,59 @@ class WebsocketType(str, Enum):
     """反向ws"""
 
 
+class WebsocketEncoding(str, Enum):
+    """websocket发送编码枚举"""
+
+    Auto = "auto"
+    """跟随对端最近一次发送的帧类型"""
+    Json = "json"
+    """总是使用json文本帧"""
+    Msgpack = "msgpack"
+    """总是使用msgpack二进制帧"""
+
+
+class OverflowPolicy(str, Enum):
+    """消息队列溢出策略枚举"""
+
+    Block = "block"
+    """阻塞事件线程，直到队列有空位"""
+    DropOldest = "drop_oldest"
+    """丢弃最旧的消息"""
+    Spill = "spill"
+    """溢出的消息暂存到磁盘"""
+
+
+class WsOverflowPolicy(str, Enum):
+    """websocket发送队列溢出策略枚举"""
+
+    Drop = "drop"
+    """丢弃最旧的事件"""
+    Disconnect = "disconnect"
+    """断开连接，由应用端重连"""
+    Coalesce = "coalesce"
+    """合并队列中重复的元事件，仍然溢出时丢弃最旧的事件"""
+
+
+class TraceExportType(str, Enum):
+    """消息追踪导出格式枚举"""
+
+    Disabled = "none"
+    """不导出，只保存最近的追踪"""
+    JsonLines = "jsonl"
+    """每条追踪一行json"""
+    Otlp = "otlp"
+    """每条追踪一行OTLP json(ExportTraceServiceRequest)"""
+
+
+class ComBackendType(str, Enum):
+    """com后端枚举"""
+
+    Comtypes = "comtypes"
+    """真实的com组件"""
+    Fake = "fake"
+    """模拟的com组件，用于压测"""
+
+
 class WSUrl(AnyUrl):
     """ws或wss url"""
 
@@ -180,7 +233,7 @@ class Config(BaseConfig):
     """是否开启http api"""
     event_enabled: bool = False
     """是否启用 get_latest_events 元动作"""
-    event_buffer_size: int = 0
+    event_buffer_size: int = Field(default=1024, ge=0)
     """事件缓冲区大小，超过该大小将会丢弃最旧的事件，0 表示不限大小"""
     enable_http_webhook: bool = False
     """是否启用http webhook"""
@@ -188,20 +241,104 @@ class Config(BaseConfig):
     """webhook 上报地址"""
     webhook_timeout: int = 5000
     """上报请求超时时间，单位：毫秒，0 表示不超时"""
+    webhook_queue_size: int = Field(default=1024, ge=1)
+    """每个 webhook 地址的上报队列大小"""
+    webhook_max_in_flight: int = Field(default=4, ge=1)
+    """每个 webhook 地址同时进行的请求数量上限"""
+    webhook_batch_size: int = Field(default=1, ge=1)
+    """单次 webhook 请求合并的事件数量上限，1 表示不合并"""
+    webhook_flush_interval: int = Field(default=50, ge=0)
+    """合并事件时等待后续事件的最长时间，单位：毫秒"""
+    webhook_retries: int = Field(default=3, ge=0)
+    """webhook 请求失败后的重试次数"""
+    webhook_retry_backoff: int = Field(default=500, ge=1)
+    """webhook 首次重试间隔，单位：毫秒，之后每次翻倍"""
+    webhook_breaker_threshold: int = Field(default=5, ge=0)
+    """webhook 连续失败多少次后熔断，0 表示不熔断"""
+    webhook_breaker_cooldown: int = Field(default=30, ge=1)
+    """webhook 熔断冷却时间，单位：秒"""
+    http_max_connections: int = Field(default=100, ge=1)
+    """http客户端最大连接数"""
+    http_max_keepalive: int = Field(default=20, ge=0)
+    """http客户端最大保持连接数"""
+    http_max_per_host: int = Field(default=10, ge=1)
+    """http客户端对单个host的最大并发请求数"""
     websocekt_type: WebsocketType = WebsocketType.Backward
     """websocket连接方式"""
     websocket_url: set[WSUrl] = Field(default_factory=set)
     """反向 WebSocket 连接地址"""
     websocket_buffer_size: int = 4
     """反向 WebSocket 的缓冲区大小，单位(Mb)"""
+    websocket_encoding: WebsocketEncoding = WebsocketEncoding.Auto
+    """WebSocket 发送事件与响应的编码方式"""
+    websocket_send_queue_size: int = Field(default=1024, ge=1)
+    """每个 WebSocket 连接的事件发送队列大小"""
+    websocket_overflow_policy: WsOverflowPolicy = WsOverflowPolicy.Drop
+    """WebSocket 发送队列溢出策略"""
     reconnect_interval: int = 5000
     """反向 WebSocket 重连间隔"""
+    event_journal_enabled: bool = False
+    """是否启用事件日志，反向ws与webhook断开时保留事件，恢复后补发"""
+    event_journal_segment_size: int = Field(default=16, ge=1)
+    """事件日志单个分段的大小，单位MB"""
+    event_journal_retention: int = Field(default=24, ge=0)
+    """事件日志的保留时间，单位小时，0 表示不清理"""
+    event_journal_batch_size: int = Field(default=100, ge=1)
+    """补发事件时单次读取的事件数量"""
+    event_journal_fsync_interval: float = Field(default=0, ge=0)
+    """事件日志同步到磁盘的间隔，单位秒，0 表示不主动同步"""
     log_level: Union[int, str] = "INFO"
     """默认日志等级"""
     log_days: int = 10
     """日志保存天数"""
+    log_queue_size: int = Field(default=10000, ge=0)
+    """每个日志写入线程的队列大小，0 表示同步写入"""
+    metrics_enabled: bool = False
+    """是否开启指标统计，开启后在 /metrics 输出"""
+    trace_sample_rate: float = Field(default=0, ge=0, le=1)
+    """消息追踪采样率，0 表示关闭，1 表示追踪所有消息"""
+    trace_buffer_size: int = Field(default=1000, ge=1)
+    """保存最近追踪的数量，wx.get_slow_traces 从中查找"""
+    trace_export: TraceExportType = TraceExportType.Disabled
+    """消息追踪导出格式，导出到日志目录的 trace 下"""
     cache_days: int = 3
     """文件缓存天数"""
+    msg_queue_size: int = Field(default=1024, ge=1)
+    """接收消息队列大小"""
+    msg_workers: int = Field(default=4, ge=1)
+    """消息处理worker数量，同一会话的消息总是由同一个worker按序处理"""
+    msg_overflow_policy: OverflowPolicy = OverflowPolicy.Block
+    """接收消息队列溢出策略"""
+    contact_refresh_interval: int = Field(default=600, ge=0)
+    """通讯录后台刷新间隔，单位秒，为0则不刷新"""
+    group_member_cache_ttl: int = Field(default=300, ge=0)
+    """群成员缓存有效期，单位秒，为0则不过期"""
+    group_member_cache_size: int = Field(default=20000, ge=1)
+    """群成员缓存的成员总数上限"""
+    batch_max_size: int = Field(default=1000, ge=1)
+    """批量action单次请求的action数量上限"""
+    batch_max_concurrency: int = Field(default=16, ge=1)
+    """批量action的并发数量上限"""
+    send_rate: float = Field(default=0, ge=0)
+    """全局每秒发送的消息数量，0 表示不限速"""
+    send_burst: int = Field(default=10, ge=1)
+    """全局允许的突发消息数量"""
+    send_chat_rate: float = Field(default=0, ge=0)
+    """单个会话每秒发送的消息数量，0 表示不限速"""
+    send_chat_burst: int = Field(default=3, ge=1)
+    """单个会话允许的突发消息数量"""
+    send_queue_size: int = Field(default=1024, ge=1)
+    """每个优先级发送队列的长度上限"""
+    com_call_timeout: float = Field(default=30, ge=0)
+    """单次com调用超时时间，单位秒，为0则不超时"""
+    com_backend: ComBackendType = ComBackendType.Comtypes
+    """com后端"""
+    fake_msg_file: Optional[str] = None
+    """模拟后端重放的消息文件，每行一条消息json"""
+    fake_msg_rate: float = Field(default=0, ge=0)
+    """模拟后端每秒重放的消息数量"""
+    fake_com_latency: float = Field(default=0, ge=0)
+    """模拟后端单次com调用的延迟，单位毫秒"""
 
     class Config:
         extra = "allow"
@@ -24,3 +24,9 @@ DATABASE_PATH = "data"
 """数据库存放目录"""
 DOWNLOAD_TIMEOUT = 10
 """下载超时时间"""
+COM_PUMP_INTERVAL = 1.0
+"""com事件线程单次泵送的最长等待时间，单位秒"""
+MSG_SPILL_FILE = "msg_spill.jsonl"
+"""消息队列溢出时的暂存文件，位于数据库目录下"""
+EVENT_JOURNAL_PATH = "journal"
+"""事件日志目录，位于数据库目录下"""
@@ -1,9 +1,11 @@
 """
 后端驱动driver
 """
+import asyncio
 import contextlib
 import logging
 import sys
+from http.cookiejar import Cookie, CookieJar
 from typing import Any, AsyncGenerator, Callable, Optional, Tuple, Union
 
 import httpx
@@ -24,6 +26,15 @@ from .model import Response as BaseResponse
 from .model import WebSocketServerSetup
 
 
+class NullCookieJar(CookieJar):
+    """
+    不保存cookie的cookie jar，共享的http客户端不会在请求之间携带响应设置的cookie
+    """
+
+    def set_cookie(self, cookie: Cookie) -> None:
+        pass
+
+
 class Config(BaseSettings):
     """FastAPI 驱动框架设置，详情参考 FastAPI 文档"""
 
@@ -58,12 +69,18 @@ class Driver:
     connects: dict[int, Union[FastAPIWebSocket, BackwardWebSocket]]
     """维护的连接字典"""
     _seq: int
+    _http_clients: dict[tuple[Optional[str], bool], httpx.AsyncClient]
+    """共享的http客户端，按代理与是否使用http2区分"""
+    _host_limits: dict[str, asyncio.Semaphore]
+    """每个host的并发请求限制"""
 
     def __init__(self, config: BaseConfig) -> None:
         self._seq = 0
         self.connects = {}
         self.config = config
         self.fastapi_config: Config = Config(**config.dict())
+        self._http_clients = {}
+        self._host_limits = {}
 
         self._server_app = FastAPI(
             openapi_url=self.fastapi_config.fastapi_openapi_url,
@@ -71,6 +88,7 @@ class Driver:
             redoc_url=self.fastapi_config.fastapi_redoc_url,
             **self.fastapi_config.fastapi_extra,
         )
+        self.on_shutdown(self.close_http_client)
 
     def get_seq(self) -> int:
         """获取一个seq，用来维护ws连接"""
@@ -226,16 +244,55 @@ class Driver:
 
         await setup.handle_func(ws)
 
+    def get_http_client(
+        self, proxy: Optional[str] = None, http2: bool = False
+    ) -> httpx.AsyncClient:
+        """
+        说明:
+            获取共享的http客户端，连接会被复用，客户端不保存响应设置的cookie
+
+        参数:
+            * `proxy`: 代理地址，不同代理使用不同的客户端
+            * `http2`: 是否使用http2，需要安装`h2`
+        """
+        key = (proxy, http2)
+        client = self._http_clients.get(key)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.config.http_max_connections,
+                max_keepalive_connections=self.config.http_max_keepalive,
+            )
+            client = httpx.AsyncClient(
+                cookies=NullCookieJar(),
+                http2=http2,
+                proxies=proxy,
+                limits=limits,
+                follow_redirects=True,
+            )
+            self._http_clients[key] = client
+        return client
+
+    def _get_host_limit(self, host: str) -> asyncio.Semaphore:
+        """获取host的并发请求限制"""
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = asyncio.Semaphore(self.config.http_max_per_host)
+            self._host_limits[host] = limit
+        return limit
+
+    async def close_http_client(self) -> None:
+        """关闭所有http客户端"""
+        clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        for client in clients:
+            await client.aclose()
+
     async def request(self, setup: BaseRequest) -> BaseResponse:
         """
         发起一个http请求
         """
-        async with httpx.AsyncClient(
-            cookies=setup.cookies.jar,
-            http2=setup.version == HTTPVersion.H2,
-            proxies=setup.proxy,
-            follow_redirects=True,
-        ) as client:
+        client = self.get_http_client(setup.proxy, setup.version == HTTPVersion.H2)
+        async with self._get_host_limit(setup.url.host or ""):
             response = await client.request(
                 setup.method,
                 str(setup.url),
@@ -244,14 +301,15 @@ class Driver:
                 json=setup.json,
                 files=setup.files,
                 headers=tuple(setup.headers.items()),
+                cookies=setup.cookies.jar,
                 timeout=setup.timeout,
             )
-            return Response(
-                response.status_code,
-                headers=response.headers.multi_items(),
-                content=response.content,
-                request=setup,
-            )
+        return BaseResponse(
+            response.status_code,
+            headers=response.headers.multi_items(),
+            content=response.content,
+            request=setup,
+        )
 
     @contextlib.asynccontextmanager
     async def start_websocket(
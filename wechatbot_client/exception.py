@@ -45,6 +45,20 @@ class FileNotFound(MessageException):
         return f"未找到文件:{self.file_id}"
 
 
+class ComCallTimeout(BaseException):
+    """com调用超时"""
+
+    method: str
+    timeout: float
+
+    def __init__(self, method: str, timeout: float) -> None:
+        self.method = method
+        self.timeout = timeout
+
+    def __repr__(self) -> str:
+        return f"com调用超时({self.timeout}s):{self.method}"
+
+
 class WebSocketClosed(BaseException):
     """WebSocket 连接已关闭"""
 
@@ -58,3 +72,29 @@ class WebSocketClosed(BaseException):
             + (f", reason={self.reason!r}" if self.reason else "")
             + ")"
         )
+
+
+class WebhookFailed(BaseException):
+    """webhook上报失败"""
+
+    url: str
+    status_code: int
+
+    def __init__(self, url: str, status_code: int) -> None:
+        self.url = url
+        self.status_code = status_code
+
+    def __repr__(self) -> str:
+        return f"webhook上报失败(状态码 {self.status_code}):{self.url}"
+
+
+class SendQueueFull(BaseException):
+    """发送队列已满"""
+
+    chat_id: str
+
+    def __init__(self, chat_id: str) -> None:
+        self.chat_id = chat_id
+
+    def __repr__(self) -> str:
+        return f"发送队列已满:{self.chat_id}"
@@ -1,19 +1,34 @@
-import asyncio
+import time
 from pathlib import Path
 from shutil import copyfile
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 from uuid import uuid4
 
 from httpx import URL, AsyncClient
 
 from wechatbot_client.consts import DOWNLOAD_TIMEOUT, FILE_CACHE
+from wechatbot_client.metrics import MEDIA_WAIT_SECONDS, metrics
+from wechatbot_client.trace import current_trace, tracer
 from wechatbot_client.utils import logger_wrapper, run_sync
 
 from .model import FileCache
+from .watcher import file_watcher
+
+IMAGE_SUFFIXES = (".jpg", ".png", ".gif")
+"""hook图片可能的后缀"""
 
 log = logger_wrapper("File Manager")
 
 
+def record_media_wait(media: str, begin: float, file: Optional[Path]) -> None:
+    """记录等待媒体文件的时间，处理被追踪的消息时同时记录到追踪中"""
+    result = "timeout" if file is None else "ok"
+    if metrics.enabled:
+        MEDIA_WAIT_SECONDS.observe(time.monotonic() - begin, media, result)
+    if tracer.enabled and (trace := current_trace.get()) is not None:
+        trace.add_span("media.wait", begin, media=media, status=result)
+
+
 class FileManager:
     """
     文件管理模块
@@ -21,8 +36,11 @@ class FileManager:
 
     file_path: Path
     """文件缓存地址"""
+    get_http_client: Callable[[], AsyncClient]
+    """获取共享的http客户端"""
 
-    def __init__(self) -> None:
+    def __init__(self, get_http_client: Callable[[], AsyncClient]) -> None:
+        self.get_http_client = get_http_client
         self.file_path = Path(f"./{FILE_CACHE}/temp")
         self.file_path.mkdir(parents=True, exist_ok=True)
 
@@ -63,18 +81,18 @@ class FileManager:
         file_url = URL(url)
         if headers is None:
             headers = {}
-        async with AsyncClient(headers=headers) as client:
-            try:
-                res = await client.get(file_url)
-                data = res.content
-                file_id = str(uuid4())
-                file_path = self.file_path / name
-                file_path = self.get_file_name(file_path)
-                with open(file_path, mode="wb") as f:
-                    f.write(data)
-            except Exception as e:
-                log("ERROR", f"文件下载失败:{e}")
-                return None
+        client = self.get_http_client()
+        try:
+            res = await client.get(file_url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+            data = res.content
+            file_id = str(uuid4())
+            file_path = self.file_path / name
+            file_path = self.get_file_name(file_path)
+            with open(file_path, mode="wb") as f:
+                f.write(data)
+        except Exception as e:
+            log("ERROR", f"文件下载失败:{e}")
+            return None
 
         await FileCache.create_file_cache(
             file_id=file_id, file_path=str(file_path.absolute()), file_name=name
@@ -180,67 +198,30 @@ class FileManager:
             file.unlink()
         log("SUCCESS", "重置文件缓存...")
 
-    async def wait_image_task(self, image_path: str, future: asyncio.Future) -> None:
-        """
-        等待图片任务
-        """
-        jpg = Path(f"{image_path}.jpg")
-        png = Path(f"{image_path}.png")
-        gif = Path(f"{image_path}.gif")
-        while True:
-            if future.cancelled():
-                return
-            if jpg.exists():
-                future.set_result(jpg)
-                return
-            if png.exists():
-                future.set_result(png)
-                return
-            if gif.exists():
-                future.set_result(gif)
-                return
-            await asyncio.sleep(0.5)
-
     async def wait_for_image(self, image_path: str) -> Optional[Path]:
         """
         说明:
             等待图片下载成功
-        """
-        loop = asyncio.get_event_loop()
-        future = loop.create_future()
-        loop.create_task(self.wait_image_task(image_path, future))
-        try:
-            await asyncio.wait_for(future, DOWNLOAD_TIMEOUT)
-        except asyncio.TimeoutError:
-            log("ERROR", "图片下载超时...")
-            future.cancel()
-            return None
-        return future.result()
 
-    async def wait_file_task(self, file: Path, future: asyncio.Future) -> None:
-        """
-        等待文件任务
+        参数:
+            * `image_path`: 不带后缀的图片路径
         """
-        while True:
-            if future.cancelled():
-                return
-            if file.exists():
-                future.set_result(file)
-                return
-            await asyncio.sleep(0.5)
+        candidates = [Path(f"{image_path}{suffix}") for suffix in IMAGE_SUFFIXES]
+        begin = time.monotonic()
+        file = await file_watcher.wait_for(candidates, DOWNLOAD_TIMEOUT)
+        record_media_wait("image", begin, file)
+        if file is None:
+            log("ERROR", "图片下载超时...")
+        return file
 
     async def wait_for_file(self, file: Path) -> Optional[Path]:
         """
         说明:
             等待文件下载成功
         """
-        loop = asyncio.get_event_loop()
-        future = loop.create_future()
-        loop.create_task(self.wait_file_task(file, future))
-        try:
-            await asyncio.wait_for(future, DOWNLOAD_TIMEOUT)
-        except asyncio.TimeoutError:
+        begin = time.monotonic()
+        file = await file_watcher.wait_for([file], DOWNLOAD_TIMEOUT)
+        record_media_wait("file", begin, file)
+        if file is None:
             log("ERROR", "文件下载超时...")
-            future.cancel()
-            return None
-        return future.result()
+        return file
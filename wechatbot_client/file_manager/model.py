@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Tuple
@@ -7,6 +8,7 @@ from tortoise.models import Model
 
 from wechatbot_client.consts import DATABASE_PATH
 from wechatbot_client.log import logger
+from wechatbot_client.trace import current_trace, tracer
 
 
 class FileCache(Model):
@@ -45,14 +47,16 @@ class FileCache(Model):
         返回:
             * `bool`: 缓存是否成功
         """
-        time = datetime.now()
+        begin = time.monotonic()
         await cls.create(
             file_id=file_id,
             file_path=file_path,
             file_name=file_name,
-            create_time=time,
+            create_time=datetime.now(),
             file_temp=file_temp,
         )
+        if tracer.enabled and (trace := current_trace.get()) is not None:
+            trace.add_span("file_cache", begin)
         return True
 
     @classmethod
@@ -0,0 +1,270 @@
+"""
+文件就绪监听服务，所有等待文件的任务共享:
+ - 支持inotify的平台直接监听目录事件，文件写完即唤醒
+ - 其他情况使用一个共享的轮询任务，轮询间隔随空闲自适应退避
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Optional
+
+from wechatbot_client.utils import logger_wrapper
+
+log = logger_wrapper("File Watcher")
+
+IN_CLOSE_WRITE = 0x00000008
+"""写入的文件被关闭"""
+IN_MOVED_TO = 0x00000080
+"""文件被移入目录"""
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+"""inotify_event结构体头部: wd, mask, cookie, len"""
+
+POLL_MIN_INTERVAL = 0.05
+"""最小轮询间隔，单位秒"""
+POLL_MAX_INTERVAL = 0.5
+"""最大轮询间隔，单位秒"""
+POLL_BACKOFF = 1.5
+"""轮询间隔退避系数"""
+
+
+class Waiter:
+    """一个等待中的任务"""
+
+    __slots__ = ("candidates", "future", "watched")
+
+    candidates: tuple[Path, ...]
+    """候选文件，任一出现即完成"""
+    future: asyncio.Future
+    """等待的future"""
+    watched: bool
+    """所在目录是否已被inotify监听"""
+
+    def __init__(self, candidates: tuple[Path, ...], future: asyncio.Future) -> None:
+        self.candidates = candidates
+        self.future = future
+        self.watched = False
+
+    def check(self) -> bool:
+        """检查候选文件，存在则完成future"""
+        for file in self.candidates:
+            if file.exists():
+                self.resolve(file)
+                return True
+        return False
+
+    def resolve(self, file: Path) -> None:
+        """完成等待"""
+        if not self.future.done():
+            self.future.set_result(file)
+
+
+class Inotify:
+    """inotify的ctypes封装，仅在linux可用"""
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, directory: Path) -> int:
+        """监听一个目录，返回wd"""
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """取消监听"""
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> list[tuple[int, str]]:
+        """读取事件，返回(wd, 文件名)列表"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """
+    文件就绪监听服务，等待任务按`目录 -> 文件stem`索引
+    """
+
+    def __init__(self) -> None:
+        self._waiters: dict[Path, dict[str, list[Waiter]]] = {}
+        self._inotify: Optional[Inotify] = None
+        self._inotify_checked = False
+        self._watches: dict[Path, int] = {}
+        self._wd_dirs: dict[int, Path] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+        self._poll_wakeup: Optional[asyncio.Event] = None
+
+    def _get_inotify(self) -> Optional[Inotify]:
+        """获取inotify，不可用时返回None"""
+        if self._inotify_checked:
+            return self._inotify
+        self._inotify_checked = True
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            self._inotify = Inotify()
+            asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+            log("DEBUG", "使用inotify监听文件")
+        except (OSError, AttributeError, NotImplementedError) as e:
+            log("DEBUG", f"inotify不可用，使用轮询监听文件: {e}")
+            self._inotify = None
+        return self._inotify
+
+    async def wait_for(
+        self, candidates: list[Path], timeout: Optional[float] = None
+    ) -> Optional[Path]:
+        """
+        说明:
+            等待候选文件中任意一个出现，候选文件需在同一目录下
+
+        参数:
+            * `candidates`: 候选文件列表
+            * `timeout`: 超时时间，单位秒，None为不超时
+
+        返回:
+            * `Path | None`: 出现的文件，超时返回None
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiter = Waiter(tuple(candidates), future)
+        if waiter.check():
+            return future.result()
+
+        self._add(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._remove(waiter)
+
+    def _add(self, waiter: Waiter) -> None:
+        """注册等待任务"""
+        directory = waiter.candidates[0].parent
+        stem = waiter.candidates[0].stem
+        self._waiters.setdefault(directory, {}).setdefault(stem, []).append(waiter)
+
+        inotify = self._get_inotify()
+        if inotify is not None and directory.is_dir():
+            try:
+                if directory not in self._watches:
+                    wd = inotify.add_watch(directory)
+                    self._watches[directory] = wd
+                    self._wd_dirs[wd] = directory
+                waiter.watched = True
+            except OSError as e:
+                log("DEBUG", f"监听目录失败，改为轮询: {e}")
+            # 监听建立前文件可能已经写完
+            if waiter.watched and waiter.check():
+                return
+        if not waiter.watched:
+            self._ensure_poller()
+
+    def _remove(self, waiter: Waiter) -> None:
+        """移除等待任务，目录无人等待时取消监听"""
+        directory = waiter.candidates[0].parent
+        stem = waiter.candidates[0].stem
+        stems = self._waiters.get(directory)
+        if stems is None:
+            return
+        waiters = stems.get(stem, [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            stems.pop(stem, None)
+        if not stems:
+            del self._waiters[directory]
+            wd = self._watches.pop(directory, None)
+            if wd is not None:
+                self._wd_dirs.pop(wd, None)
+                self._inotify.rm_watch(wd)
+
+    def _on_inotify(self) -> None:
+        """inotify事件回调"""
+        for wd, name in self._inotify.read():
+            directory = self._wd_dirs.get(wd)
+            if directory is None:
+                continue
+            file = directory / name
+            for waiter in self._waiters.get(directory, {}).get(file.stem, []):
+                if file in waiter.candidates:
+                    waiter.resolve(file)
+
+    def _ensure_poller(self) -> None:
+        """开启共享轮询任务，新任务加入时重置轮询间隔"""
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_wakeup = asyncio.Event()
+            self._poll_task = asyncio.create_task(self._poll())
+        else:
+            self._poll_wakeup.set()
+
+    async def _poll(self) -> None:
+        """共享轮询任务，没有等待任务时退出"""
+        interval = POLL_MIN_INTERVAL
+        while True:
+            waiters = [
+                waiter
+                for stems in self._waiters.values()
+                for waiters in stems.values()
+                for waiter in waiters
+                if not waiter.watched and not waiter.future.done()
+            ]
+            if not waiters:
+                return
+            resolved = False
+            for waiter in waiters:
+                resolved = waiter.check() or resolved
+            interval = (
+                POLL_MIN_INTERVAL
+                if resolved
+                else min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+            )
+            self._poll_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._poll_wakeup.wait(), interval)
+                interval = POLL_MIN_INTERVAL
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self) -> None:
+        """关闭监听服务"""
+        if self._poll_task is not None and not self._poll_task.done():
+            self._poll_task.cancel()
+        if self._inotify is not None:
+            loop = asyncio.get_event_loop()
+            loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._inotify_checked = False
+        self._watches.clear()
+        self._wd_dirs.clear()
+
+
+file_watcher = FileWatcher()
+"""全局文件监听服务"""
@@ -1,14 +1,24 @@
 """
 日志模块
+
+开启日志队列时，日志的写入在后台线程中进行:
+    logger -> 格式化(每种格式一次) -> 按等级分发 -> 有界队列 -> 写入线程(批量写入后flush)
 """
+import atexit
 import logging
+import os
 import sys
+import threading
+import time
+from collections import deque
+from datetime import date
 from pathlib import Path
-from typing import Union
+from typing import IO, Any, Optional, Union
 
 from loguru._logger import Core, Logger
 
 from wechatbot_client.consts import LOG_PATH
+from wechatbot_client.metrics import metrics
 
 logger = Logger(
     core=Core(),
@@ -26,22 +36,43 @@ logger = Logger(
 
 
 class Filter:
-    """过滤器类"""
+    """过滤器类，过滤等级的数值会被缓存"""
 
     def __init__(self) -> None:
-        self.level: Union[int, str] = "INFO"
+        self._levels: dict[str, int] = {}
+        self.level = "INFO"
+
+    @property
+    def level(self) -> Union[int, str]:
+        """过滤等级"""
+        return self._level
+
+    @level.setter
+    def level(self, value: Union[int, str]) -> None:
+        self._level = value
+        self.levelno = self.get_levelno(value)
+
+    def get_levelno(self, level: Union[int, str]) -> int:
+        """获取日志等级的数值"""
+        if not isinstance(level, str):
+            return level
+        levelno = self._levels.get(level)
+        if levelno is None:
+            levelno = self._levels[level] = logger.level(level).no
+        return levelno
+
+    def enabled(self, level: Union[int, str]) -> bool:
+        """该等级的日志是否会被输出，用于在格式化之前跳过日志"""
+        return self.get_levelno(level) >= self.levelno
 
     def __call__(self, record):
         module_name: str = record["name"]
         record["name"] = module_name.split(".")[0]
-        levelno = (
-            logger.level(self.level).no if isinstance(self.level, str) else self.level
-        )
-        return record["level"].no >= levelno
+        return record["level"].no >= self.levelno
 
 
 default_format: str = (
-    "<g>{time:MM-DD HH:mm:ss}</g> "
+    "<g>{time:%m-%d %H:%M:%S}</g> "
     "[<lvl>{level:^7}</lvl>] "
     "<c><u>{name:16}</u></c> | "
     # "<c>{function}:{line}</c>| "
@@ -67,6 +98,229 @@ class LoguruHandler(logging.Handler):  # pragma: no cover
         )
 
 
+LOG_BATCH_SIZE = 256
+"""写入线程单次写入的日志数量上限，写入后flush一次"""
+LOG_STOP_TIMEOUT = 5
+"""停止时等待写入线程写完的最长时间，单位秒"""
+
+
+class DailyFile:
+    """
+    按日期切分的带缓冲文件，文件名为`YYYY-MM-DD{suffix}`，由写入线程在每批日志之后flush。
+    切换日期时删除修改时间超过保存天数的文件
+    """
+
+    path: Path
+    """文件目录"""
+    suffix: str
+    """文件名后缀"""
+    days: int
+    """保存天数"""
+
+    def __init__(
+        self, path: Path, suffix: str, days: int, buffering: int = 1 << 16
+    ) -> None:
+        self.path = path
+        self.suffix = suffix
+        self.days = days
+        self._buffering = buffering
+        self._file: Optional[IO[str]] = None
+        self._day: Optional[date] = None
+
+    def _open(self, today: date) -> None:
+        """打开当天的文件，并清理过期文件"""
+        if self._file is not None:
+            self._file.close()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._file = open(
+            self.path / f"{today:%Y-%m-%d}{self.suffix}",
+            mode="a",
+            encoding="utf-8",
+            buffering=self._buffering,
+        )
+        self._day = today
+        self._cleanup()
+
+    def _cleanup(self) -> None:
+        expire = time.time() - self.days * 86400
+        for one in self.path.glob(f"????-??-??{self.suffix}"):
+            try:
+                if one.stat().st_mtime < expire:
+                    one.unlink()
+            except OSError:
+                pass
+
+    def write(self, message: str) -> None:
+        today = date.today()
+        if today != self._day or self._file is None:
+            self._open(today)
+        self._file.write(message)
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def stop(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LogWriter:
+    """
+    日志写入器，由loguru作为stream调用`write`，日志放入有界队列后由后台线程批量写入，
+    队列已满时丢弃新的日志并计数
+    """
+
+    name: str
+    """名称"""
+    target: Any
+    """实际写入的对象，需要有`write`方法，可以有`flush`与`stop`方法"""
+    queue_size: int
+    """队列长度上限"""
+    written: int
+    """已写入的日志数量"""
+    dropped: int
+    """队列已满被丢弃的日志数量"""
+
+    def __init__(self, name: str, target: Any, queue_size: int) -> None:
+        self.name = name
+        self.target = target
+        self.queue_size = queue_size
+        self.written = 0
+        self.dropped = 0
+        self._reported = 0
+        self._queue: deque[str] = deque()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"log-writer-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        """放入队列，在记录日志的线程中调用，不加锁(deque的append是线程安全的)"""
+        if self._closed:
+            # 已停止，直接写入
+            self._write_batch([message])
+            return
+        queue = self._queue
+        if len(queue) >= self.queue_size:
+            self.dropped += 1
+            return
+        queue.append(message)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _take(self) -> Optional[list[str]]:
+        """取出一批日志，停止且队列为空时返回None"""
+        queue = self._queue
+        while not queue:
+            if self._closed:
+                return None
+            self._wakeup.wait()
+            # 先清除再读取队列，之后放入的日志会重新设置
+            self._wakeup.clear()
+        count = min(len(queue), LOG_BATCH_SIZE)
+        return [queue.popleft() for _ in range(count)]
+
+    def _write_batch(self, batch: list[str]) -> None:
+        try:
+            for message in batch:
+                self.target.write(message)
+            flush = getattr(self.target, "flush", None)
+            if flush is not None:
+                flush()
+        except Exception as e:
+            sys.stderr.write(f"日志写入失败[{self.name}]: {e!r}\n")
+        self.written += len(batch)
+
+    def _run(self) -> None:
+        while (batch := self._take()) is not None:
+            self._write_batch(batch)
+            dropped = self.dropped - self._reported
+            if dropped:
+                self._reported += dropped
+                logger.warning(f"日志队列[{self.name}]已满，丢弃了 {dropped} 条日志")
+
+    def stop(self) -> None:
+        """写完队列中的日志后停止，由loguru在移除handler时调用"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(LOG_STOP_TIMEOUT)
+        stop = getattr(self.target, "stop", None)
+        if stop is not None:
+            stop()
+
+    def stats(self) -> dict[str, int]:
+        """队列统计"""
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+class LevelFanout:
+    """
+    把同一格式的日志按等级分发给多个写入器，每条日志只格式化一次
+    """
+
+    writers: list[tuple[int, LogWriter]]
+    """(最低等级数值, 写入器)"""
+
+    def __init__(self, *writers: tuple[str, LogWriter]) -> None:
+        self.writers = [(logger.level(level).no, writer) for level, writer in writers]
+
+    def write(self, message: Any) -> None:
+        levelno = message.record["level"].no
+        for min_levelno, writer in self.writers:
+            if levelno >= min_levelno:
+                writer.write(message)
+
+    def stop(self) -> None:
+        for _, writer in self.writers:
+            writer.stop()
+
+
+log_writers: list[LogWriter] = []
+"""所有日志写入器"""
+
+
+def log_stats() -> dict[str, dict[str, int]]:
+    """
+    说明:
+        获取日志队列统计
+
+    返回:
+        * `dict`: 写入器名称 -> 队列中、已写入、已丢弃的日志数量
+    """
+    return {writer.name: writer.stats() for writer in log_writers}
+
+
+def register_log_metrics() -> None:
+    """注册日志写入器指标"""
+    metrics.collector(
+        "wechat_log_records_total",
+        "日志写入器写入与丢弃的日志数量",
+        ("sink", "result"),
+        lambda: [
+            ((writer.name, key), getattr(writer, key))
+            for writer in log_writers
+            for key in ("written", "dropped")
+        ],
+        type="counter",
+    )
+
+
+@atexit.register
+def stop_log_writers() -> None:
+    """退出时写完队列中的日志"""
+    for writer in log_writers:
+        writer.stop()
+
+
 default_filter = Filter()
 logger_id = logger.add(
     sys.stdout,
@@ -77,8 +331,38 @@ logger_id = logger.add(
 )
 
 
-def log_init(log_days: int) -> None:
-    """日志初始化"""
+def console_stream() -> tuple[Any, bool]:
+    """
+    说明:
+        获取写入控制台的stream，以及是否输出颜色
+
+    返回:
+        * `Any`: stream，windows上使用colorama转换颜色代码
+        * `bool`: 是否输出颜色，只在终端中输出
+    """
+    stream = sys.stdout
+    isatty = getattr(stream, "isatty", None)
+    if isatty is None or not isatty():
+        return stream, False
+    if os.name == "nt":
+        try:
+            import colorama
+        except ImportError:
+            return stream, False
+        stream = colorama.AnsiToWin32(stream).stream
+    return stream, True
+
+
+def log_init(log_days: int, queue_size: int = 0) -> None:
+    """
+    说明:
+        日志初始化
+
+    参数:
+        * `log_days`: 日志保存天数
+        * `queue_size`: 每个日志写入器的队列长度，0 表示在记录日志的线程中同步写入
+    """
+    global logger_id
     cwd = Path(".") / LOG_PATH
     info_path = cwd / "info"
     debug_path = cwd / "debug"
@@ -88,7 +372,7 @@ def log_init(log_days: int) -> None:
     error_path.mkdir(parents=True, exist_ok=True)
     # 日志文件记录格式
     file_format = (
-        "<g>{time:MM-DD HH:mm:ss}</g> "
+        "<g>{time:%m-%d %H:%M:%S}</g> "
         "[<lvl>{level}</lvl>] "
         "<c><u>{name}</u></c> | "
         "{message}"
@@ -96,36 +380,69 @@ def log_init(log_days: int) -> None:
 
     # 错误日志文件记录格式
     error_format = (
-        "<g>{time:MM-DD HH:mm:ss}</g> "
+        "<g>{time:%m-%d %H:%M:%S}</g> "
         "[<lvl>{level}</lvl>] "
         "[<c><u>{name}</u></c>] | "
         "<c>{function}:{line}</c>| "
         "{message}"
     )
-    logger.add(
-        f"./{LOG_PATH}/info/" + "{time:YYYY-MM-DD}.log",
-        rotation="00:00",
-        retention=f"{log_days} days",
-        level="INFO",
-        format=file_format,
+    file_options = {
+        "rotation": "00:00",
+        "retention": f"{log_days} days",
+        "encoding": "utf-8",
+    }
+    info_file = f"./{LOG_PATH}/info/" + "{time:YYYY-MM-DD}.log"
+    debug_file = f"./{LOG_PATH}/debug/" + "{time:YYYY-MM-DD}.log"
+    error_file = f"./{LOG_PATH}/error/" + "{time:YYYY-MM-DD}.log"
+    if queue_size <= 0:
+        for path, level, log_format in (
+            (info_file, "INFO", file_format),
+            (debug_file, "DEBUG", file_format),
+            (error_file, "ERROR", error_format),
+        ):
+            logger.add(
+                path,
+                level=level,
+                format=log_format,
+                filter=default_filter,
+                **file_options,
+            )
+        return
+
+    def add_writer(name: str, target: Any) -> LogWriter:
+        writer = LogWriter(name, target, queue_size)
+        log_writers.append(writer)
+        return writer
+
+    # 控制台
+    stdout, colorize = console_stream()
+    logger.remove(logger_id)
+    logger_id = logger.add(
+        add_writer("stdout", stdout),
+        level=0,
+        diagnose=False,
         filter=default_filter,
-        encoding="utf-8",
+        format=default_format,
+        colorize=colorize,
     )
+    # info与debug日志格式相同，只格式化一次
+    info_sink = DailyFile(info_path, ".log", log_days)
+    debug_sink = DailyFile(debug_path, ".log", log_days)
+    error_sink = DailyFile(error_path, ".log", log_days)
     logger.add(
-        f"./{LOG_PATH}/debug/" + "{time:YYYY-MM-DD}.log",
-        rotation="00:00",
-        retention=f"{log_days} days",
+        LevelFanout(
+            ("INFO", add_writer("info", info_sink)),
+            ("DEBUG", add_writer("debug", debug_sink)),
+        ),
         level="DEBUG",
         format=file_format,
         filter=default_filter,
-        encoding="utf-8",
+        colorize=False,
     )
     logger.add(
-        f"./{LOG_PATH}/error/" + "{time:YYYY-MM-DD}.log",
-        rotation="00:00",
-        retention=f"{log_days} days",
+        add_writer("error", error_sink),
         level="ERROR",
         format=error_format,
         filter=default_filter,
-        encoding="utf-8",
+        colorize=False,
     )
@@ -0,0 +1,294 @@
+"""
+指标统计，开启后在`/metrics`路由以Prometheus文本格式输出
+
+统计点只在`metrics.enabled`为真时记录，关闭时每处只多一次属性判断:
+    if metrics.enabled:
+        COM_MESSAGES.inc()
+
+计数器与直方图只在事件循环与事件线程中更新，不加锁；
+队列长度等现有统计在输出时由收集函数读取
+"""
+from bisect import bisect_left
+from typing import Callable, Iterable, Union
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+"""直方图默认分桶，单位秒"""
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Prometheus文本格式"""
+
+Labels = tuple[str, ...]
+"""标签值，与标签名一一对应"""
+
+
+def escape_label(value: str) -> str:
+    """转义标签值"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple[str, ...], values: Labels, extra: str = "") -> str:
+    """生成`{name="value",...}`，`extra`为额外的已格式化标签"""
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    """格式化数值，整数不带小数点"""
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Counter:
+    """
+    计数器，只增不减
+    """
+
+    __slots__ = ("name", "documentation", "labelnames", "values")
+
+    name: str
+    """指标名"""
+    documentation: str
+    """说明"""
+    labelnames: tuple[str, ...]
+    """标签名"""
+    values: dict[Labels, float]
+    """标签值 -> 计数"""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """增加计数，`labels`与`labelnames`一一对应"""
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in list(self.values.items()):
+            lines.append(
+                f"{self.name}{format_labels(self.labelnames, labels)} "
+                f"{format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    """
+    直方图，记录每个分桶的数量、总和与总数
+    """
+
+    __slots__ = ("name", "documentation", "labelnames", "buckets", "values")
+
+    name: str
+    """指标名"""
+    documentation: str
+    """说明"""
+    labelnames: tuple[str, ...]
+    """标签名"""
+    buckets: tuple[float, ...]
+    """分桶上限，升序"""
+    values: dict[Labels, list[float]]
+    """标签值 -> 每个分桶的数量(不累计，最后一个为+Inf)与总和"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """记录一个值，`labels`与`labelnames`一一对应"""
+        data = self.values.get(labels)
+        if data is None:
+            data = self.values[labels] = [0] * (len(self.buckets) + 2)
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def render(self) -> list[str]:
+        name = self.name
+        lines = [
+            f"# HELP {name} {self.documentation}",
+            f"# TYPE {name} histogram",
+        ]
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, data in list(self.values.items()):
+            total = 0
+            for bound, count in zip(bounds, data):
+                total += count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{name}_bucket{format_labels(self.labelnames, labels, le)} {total}"
+                )
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f"{name}_sum{label_text} {format_value(data[-1])}")
+            lines.append(f"{name}_count{label_text} {total}")
+        return lines
+
+
+class Collector:
+    """
+    输出时读取的指标，用于队列长度、缓存大小等已有的统计
+    """
+
+    __slots__ = ("name", "documentation", "labelnames", "type", "collect")
+
+    name: str
+    """指标名"""
+    documentation: str
+    """说明"""
+    labelnames: tuple[str, ...]
+    """标签名"""
+    type: str
+    """指标类型: gauge或counter"""
+    collect: Callable[[], Iterable[tuple[Labels, float]]]
+    """收集函数，返回(标签值, 数值)"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...],
+        type: str,
+        collect: Callable[[], Iterable[tuple[Labels, float]]],
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.type = type
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for labels, value in self.collect():
+            lines.append(
+                f"{self.name}{format_labels(self.labelnames, labels)} "
+                f"{format_value(value)}"
+            )
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    """
+
+    enabled: bool
+    """是否开启统计"""
+    metrics: dict[str, Union[Counter, Histogram, Collector]]
+    """指标名 -> 指标"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.metrics = {}
+
+    def counter(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Counter:
+        """注册计数器"""
+        metric = self.metrics[name] = Counter(name, documentation, labelnames)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """注册直方图"""
+        metric = self.metrics[name] = Histogram(
+            name, documentation, labelnames, buckets
+        )
+        return metric
+
+    def collector(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...],
+        collect: Callable[[], Iterable[tuple[Labels, float]]],
+        type: str = "gauge",
+    ) -> Collector:
+        """注册收集函数，同名的收集函数会被替换"""
+        metric = self.metrics[name] = Collector(
+            name, documentation, labelnames, type, collect
+        )
+        return metric
+
+    def render(self) -> str:
+        """
+        说明:
+            生成Prometheus文本格式
+
+        返回:
+            * `str`: 所有指标
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+"""全局指标注册表"""
+
+COM_MESSAGES = metrics.counter("wechat_com_messages_total", "com组件上报的原始消息数量")
+"""com组件上报的原始消息"""
+PARSE_FAILURES = metrics.counter("wechat_parse_failures_total", "解析失败的原始消息数量")
+"""解析失败的原始消息"""
+MESSAGES = metrics.counter("wechat_messages_total", "处理的微信消息数量", ("type",))
+"""处理的微信消息，按消息类型"""
+EVENTS = metrics.counter(
+    "wechat_events_total", "生成的事件数量", ("type", "detail_type")
+)
+"""生成的事件，按事件类型"""
+DELIVERY_SECONDS = metrics.histogram(
+    "wechat_event_delivery_seconds", "事件从生成到发送完成的时间", ("sink",)
+)
+"""事件从生成到发送完成的时间，按上报端"""
+ACTIONS = metrics.counter("wechat_actions_total", "action调用数量", ("action", "status"))
+"""action调用，按action与结果"""
+ACTION_SECONDS = metrics.histogram(
+    "wechat_action_duration_seconds", "action调用耗时", ("action",)
+)
+"""action调用耗时"""
+MEDIA_WAIT_SECONDS = metrics.histogram(
+    "wechat_media_wait_seconds", "等待媒体文件下载的时间", ("media", "result")
+)
+"""等待媒体文件下载的时间，按媒体类型与结果(ok、timeout)"""
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Prometheus指标
+    """
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -11,6 +11,9 @@ __all__ = [
     "Event",
     "PrivateMessageEvent",
     "GroupMessageEvent",
+    "LiteEvent",
+    "LitePrivateMessageEvent",
+    "LiteGroupMessageEvent",
     "FriendIncreaseEvent",
     "FriendDecreaseEvent",
     "PrivateMessageDeleteEvent",
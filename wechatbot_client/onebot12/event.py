@@ -1,4 +1,5 @@
-from typing import Literal
+import json
+from typing import Any, Literal, Optional
 
 from pydantic import BaseModel, Extra
 
@@ -380,3 +381,148 @@ class StatusUpdateEvent(MetaEvent):
 
     detail_type: Literal["status_update"] = "status_update"
     status: Status
+
+
+class LiteEvent:
+    """
+    轻量事件，不经过pydantic验证，编码结果与对应的pydantic事件相同。
+    用于每条消息都会生成的事件，提供事件上报需要的`type`、`detail_type`、`dict`与`json`
+    """
+
+    __slots__ = ()
+
+    type: str
+    """类型"""
+    detail_type: str
+    """细节类型"""
+
+    def __repr_name__(self) -> str:
+        return self.__class__.__name__
+
+    def dict(self, *, by_alias: bool = False) -> dict[str, Any]:
+        """转换为字典，字段顺序与pydantic事件相同，消息段已转换为字典"""
+        raise NotImplementedError
+
+    def json(self, *, by_alias: bool = False, **dumps_kwargs: Any) -> str:
+        """编码为json文本，`dumps_kwargs`传给`json.dumps`"""
+        return json.dumps(self.dict(), **dumps_kwargs)
+
+    def __repr__(self) -> str:
+        return f"{self.__repr_name__()}({self.dict()!r})"
+
+
+class LiteMessageEvent(LiteEvent):
+    """
+    轻量消息事件，字段与`MessageEvent`相同，`self`只保存机器人id
+    """
+
+    __slots__ = (
+        "id",
+        "time",
+        "sub_type",
+        "self_id",
+        "message_id",
+        "message",
+        "alt_message",
+        "user_id",
+    )
+
+    type = "message"
+    """事件类型"""
+
+    id: str
+    """事件id"""
+    time: float
+    """时间"""
+    sub_type: str
+    """子类型"""
+    self_id: str
+    """机器人用户 ID"""
+    message_id: str
+    """消息id"""
+    message: Message
+    """消息"""
+    alt_message: str
+    """消息替代表示"""
+    user_id: str
+    """用户id"""
+
+    def __init__(
+        self,
+        id: str,
+        time: float,
+        self_id: str,
+        message_id: str,
+        message: Message,
+        user_id: str,
+        alt_message: Optional[str] = None,
+        sub_type: str = "",
+    ) -> None:
+        self.id = id
+        self.time = float(time)
+        self.sub_type = sub_type
+        self.self_id = self_id
+        self.message_id = message_id
+        self.message = message
+        self.alt_message = str(message) if alt_message is None else alt_message
+        self.user_id = user_id
+
+    @property
+    def self(self) -> BotSelf:
+        """自身标识"""
+        return BotSelf(user_id=self.self_id)
+
+    def dict(self, *, by_alias: bool = False) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "time": self.time,
+            "type": self.type,
+            "detail_type": self.detail_type,
+            "sub_type": self.sub_type,
+            "self": {"platform": PLATFORM, "user_id": self.self_id},
+            "message_id": self.message_id,
+            "message": [{"type": seg.type, "data": seg.data} for seg in self.message],
+            "alt_message": self.alt_message,
+            "user_id": self.user_id,
+        }
+
+
+class LitePrivateMessageEvent(LiteMessageEvent):
+    """轻量私聊消息，编码结果与`PrivateMessageEvent`相同"""
+
+    __slots__ = ()
+
+    detail_type = "private"
+
+
+class LiteGroupMessageEvent(LiteMessageEvent):
+    """轻量群消息，编码结果与`GroupMessageEvent`相同"""
+
+    __slots__ = ("group_id",)
+
+    detail_type = "group"
+
+    group_id: str
+    """群聊id"""
+
+    def __init__(
+        self,
+        id: str,
+        time: float,
+        self_id: str,
+        message_id: str,
+        message: Message,
+        user_id: str,
+        group_id: str,
+        alt_message: Optional[str] = None,
+        sub_type: str = "",
+    ) -> None:
+        super().__init__(
+            id, time, self_id, message_id, message, user_id, alt_message, sub_type
+        )
+        self.group_id = group_id
+
+    def dict(self, *, by_alias: bool = False) -> dict[str, Any]:
+        result = super().dict()
+        result["group_id"] = self.group_id
+        return result
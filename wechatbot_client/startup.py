@@ -1,27 +1,23 @@
 """
 启动行为管理，将各类业务剥离开
 """
-import asyncio
 import time
 from functools import partial
-from signal import SIGINT, raise_signal
 from uuid import uuid4
 
-from comtypes.client import PumpEvents
-
 from wechatbot_client import get_driver, get_wechat
 from wechatbot_client.action_manager import router
 from wechatbot_client.config import Config, WebsocketType
 from wechatbot_client.consts import FILE_CACHE
 from wechatbot_client.driver import URL, HTTPServerSetup, WebSocketServerSetup
-from wechatbot_client.file_manager import database_close, database_init
+from wechatbot_client.file_manager import database_close, database_init, file_watcher
 from wechatbot_client.log import logger
+from wechatbot_client.metrics import router as metrics_router
 from wechatbot_client.onebot12 import HeartbeatMetaEvent
 from wechatbot_client.scheduler import scheduler, scheduler_init, scheduler_shutdown
 
 driver = get_driver()
 wechat = get_wechat()
-pump_event_task: asyncio.Task = None
 
 
 @driver.on_startup
@@ -29,7 +25,6 @@ async def start_up() -> None:
     """
     启动行为管理
     """
-    global pump_event_task
     config: Config = wechat.config
     # 开启定时器
     scheduler_init()
@@ -51,12 +46,21 @@ async def start_up() -> None:
             minute=0,
             second=0,
         )
+    # 开启通讯录后台刷新
+    if config.contact_refresh_interval > 0:
+        logger.debug(f"开启通讯录刷新，间隔 {config.contact_refresh_interval} 秒")
+        scheduler.add_job(
+            func=wechat.refresh_contacts,
+            trigger="interval",
+            seconds=config.contact_refresh_interval,
+        )
     # 开启数据库
     await database_init()
-    # 注册消息事件
+    # 开启webhook上报与事件日志，需在接收消息之前开启
+    await wechat.start_webhook()
+    await wechat.start_journal()
+    # 注册消息事件，开启事件线程
     wechat.open_recv_msg(f"./{FILE_CACHE}")
-    # 开始监听event
-    pump_event_task = asyncio.create_task(pump_event())
     # 开启http路由
     if config.enable_http_api:
         wechat.setup_http_server(
@@ -73,6 +77,9 @@ async def start_up() -> None:
         await wechat.start_backward()
     # 添加get_file路由
     driver.server_app.include_router(router)
+    # 添加指标路由
+    if config.metrics_enabled:
+        driver.server_app.include_router(metrics_router)
 
 
 @driver.on_shutdown
@@ -84,24 +91,14 @@ async def shutdown() -> None:
     scheduler_shutdown()
     # 关闭数据库
     await database_close()
-    if pump_event_task:
-        if not pump_event_task.done():
-            pump_event_task.cancel()
+    # 关闭文件监听
+    file_watcher.close()
     await wechat.stop_backward()
+    await wechat.stop_journal()
+    await wechat.stop_webhook()
     wechat.close()
 
 
-async def pump_event() -> None:
-    """接收event循环"""
-    while True:
-        try:
-            await asyncio.sleep(0)
-            PumpEvents(0.01)
-        except KeyboardInterrupt:
-            raise_signal(SIGINT)
-            return
-
-
 async def heartbeat_event(interval: int) -> None:
     """
     心跳事件
@@ -0,0 +1,368 @@
+"""
+消息追踪，按采样率追踪接收的消息，记录从com回调到各上报端发送完成的每个阶段:
+    com.report -> pipeline.queue -> parse -> worker.queue -> handle -> websocket/webhook
+
+`handle`期间还会记录`message_to_event`、`media.wait`与`file_cache`。
+追踪随原始消息、解析后的消息与事件编码传递，`handle`期间同时保存在`current_trace`中。
+每个上报端持有一次追踪，全部发送完成或丢弃后追踪结束，
+保存在最近追踪中，并可以在后台线程中导出为json lines或OTLP json文件
+"""
+import json
+import os
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Optional, Union
+from uuid import uuid4
+
+from wechatbot_client.config import TraceExportType
+from wechatbot_client.consts import IMPL, LOG_PATH, VERSION
+from wechatbot_client.log import DailyFile, LogWriter
+
+TRACE_QUEUE_SIZE = 10000
+"""导出队列长度上限，超过时丢弃追踪"""
+
+AttrValue = Union[str, int, float, bool]
+"""属性值"""
+
+
+class Span:
+    """
+    追踪中的一个阶段，时间为`time.monotonic`
+    """
+
+    __slots__ = ("name", "start", "end", "attributes")
+
+    name: str
+    """阶段名"""
+    start: float
+    """开始时间"""
+    end: float
+    """结束时间"""
+    attributes: dict[str, AttrValue]
+    """属性"""
+
+    def __init__(
+        self, name: str, start: float, end: float, attributes: dict[str, AttrValue]
+    ) -> None:
+        self.name = name
+        self.start = start
+        self.end = end
+        self.attributes = attributes
+
+
+class Trace:
+    """
+    一条消息的追踪，每个持有者(流水线、上报端)结束时调用`release`
+    """
+
+    __slots__ = (
+        "tracer",
+        "trace_id",
+        "started",
+        "wall_time",
+        "mark",
+        "ended",
+        "pending",
+        "spans",
+        "attributes",
+    )
+
+    tracer: "Tracer"
+    """所属的追踪器"""
+    trace_id: str
+    """追踪id，32位十六进制"""
+    started: float
+    """开始时间(`time.monotonic`)"""
+    wall_time: float
+    """开始时间(unix时间戳)"""
+    mark: float
+    """上一个连续阶段的结束时间"""
+    ended: Optional[float]
+    """结束时间，未结束时为None"""
+    pending: int
+    """尚未结束的持有者数量"""
+    spans: list[Span]
+    """已记录的阶段"""
+    attributes: dict[str, AttrValue]
+    """追踪的属性，如消息类型与会话id"""
+
+    def __init__(self, tracer: "Tracer") -> None:
+        self.tracer = tracer
+        self.trace_id = uuid4().hex
+        self.started = self.mark = time.monotonic()
+        self.wall_time = time.time()
+        self.ended = None
+        self.pending = 1
+        self.spans = []
+        self.attributes = {}
+
+    @property
+    def duration(self) -> float:
+        """总耗时，未结束时为到现在的耗时，单位秒"""
+        return (self.ended or time.monotonic()) - self.started
+
+    def add_span(
+        self, name: str, start: float, end: Optional[float] = None, **attributes: Any
+    ) -> None:
+        """记录一个阶段，`end`默认为现在"""
+        if self.ended is not None:
+            return
+        if end is None:
+            end = time.monotonic()
+        self.spans.append(Span(name, start, end, attributes))
+
+    def lap(self, name: str, **attributes: Any) -> None:
+        """记录从上一个连续阶段结束到现在的阶段"""
+        now = time.monotonic()
+        self.add_span(name, self.mark, now, **attributes)
+        self.mark = now
+
+    def hold(self) -> None:
+        """增加一个持有者"""
+        self.pending += 1
+
+    def release(self) -> None:
+        """持有者结束，全部结束时追踪结束"""
+        self.pending -= 1
+        if self.pending <= 0 and self.ended is None:
+            self.ended = time.monotonic()
+            self.tracer.finish(self)
+
+    def otlp(self) -> dict[str, Any]:
+        """
+        说明:
+            转换为OTLP json格式的`ExportTraceServiceRequest`，
+            整条消息为根span，每个阶段为根span的子span
+        """
+
+        def unix_nano(value: float) -> str:
+            return str(int((self.wall_time + value - self.started) * 1e9))
+
+        root_id = os.urandom(8).hex()
+        spans = [
+            otlp_span(
+                self.trace_id,
+                root_id,
+                None,
+                "message",
+                unix_nano(self.started),
+                unix_nano(self.ended or time.monotonic()),
+                self.attributes,
+            )
+        ]
+        spans.extend(
+            otlp_span(
+                self.trace_id,
+                os.urandom(8).hex(),
+                root_id,
+                span.name,
+                unix_nano(span.start),
+                unix_nano(span.end),
+                span.attributes,
+            )
+            for span in self.spans
+        )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": otlp_attributes({"service.name": IMPL})
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "wechatbot_client", "version": VERSION},
+                            "spans": spans,
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def dict(self) -> dict[str, Any]:
+        """
+        说明:
+            转换为字典，时间单位为毫秒，阶段的`start`为相对追踪开始的时间
+        """
+        started = self.started
+        return {
+            "trace_id": self.trace_id,
+            "time": self.wall_time,
+            "duration": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "spans": [
+                {
+                    "name": span.name,
+                    "start": round((span.start - started) * 1000, 3),
+                    "duration": round((span.end - span.start) * 1000, 3),
+                    "attributes": span.attributes,
+                }
+                for span in sorted(self.spans, key=lambda span: span.start)
+            ],
+        }
+
+
+def otlp_attributes(attributes: dict[str, AttrValue]) -> list[dict[str, Any]]:
+    """转换为OTLP的`KeyValue`列表"""
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            any_value = {"boolValue": value}
+        elif isinstance(value, int):
+            any_value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            any_value = {"doubleValue": value}
+        else:
+            any_value = {"stringValue": str(value)}
+        result.append({"key": key, "value": any_value})
+    return result
+
+
+def otlp_span(
+    trace_id: str,
+    span_id: str,
+    parent_id: Optional[str],
+    name: str,
+    start: str,
+    end: str,
+    attributes: dict[str, AttrValue],
+) -> dict[str, Any]:
+    """生成一个OTLP span，`status`属性不为ok时标记为错误"""
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": start,
+        "endTimeUnixNano": end,
+        "attributes": otlp_attributes(attributes),
+    }
+    if parent_id is not None:
+        span["parentSpanId"] = parent_id
+    status = attributes.get("status")
+    if status is not None and status != "ok":
+        span["status"] = {"code": 2, "message": str(status)}
+    return span
+
+
+class TraceFile:
+    """
+    追踪导出文件，由写入线程调用，每条追踪序列化为一行
+    """
+
+    export: TraceExportType
+    """导出格式"""
+
+    def __init__(self, export: TraceExportType, log_days: int) -> None:
+        self.export = export
+        suffix = ".otlp.json" if export == TraceExportType.Otlp else ".jsonl"
+        self.sink = DailyFile(Path(".") / LOG_PATH / "trace", suffix, log_days)
+
+    def write(self, trace: Trace) -> None:
+        data = trace.otlp() if self.export == TraceExportType.Otlp else trace.dict()
+        self.sink.write(
+            json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n"
+        )
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+    def stop(self) -> None:
+        self.sink.stop()
+
+
+class Tracer:
+    """
+    追踪器，按采样率开始追踪，保存最近结束的追踪
+    """
+
+    sample_rate: float
+    """采样率，0 表示关闭"""
+    recent: deque[Trace]
+    """最近结束的追踪"""
+    writer: Optional[LogWriter]
+    """导出写入器，不导出时为None"""
+    started: int
+    """开始的追踪数量"""
+    finished: int
+    """结束的追踪数量"""
+
+    def __init__(self) -> None:
+        self.sample_rate = 0
+        self.recent = deque(maxlen=1000)
+        self.writer = None
+        self.started = 0
+        self.finished = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否开启追踪"""
+        return self.sample_rate > 0
+
+    def configure(
+        self,
+        sample_rate: float,
+        buffer_size: int,
+        export: TraceExportType,
+        log_days: int,
+    ) -> None:
+        """
+        说明:
+            设置追踪器
+
+        参数:
+            * `sample_rate`: 采样率，0 表示关闭
+            * `buffer_size`: 保存最近追踪的数量
+            * `export`: 导出格式
+            * `log_days`: 导出文件保存天数
+        """
+        self.stop()
+        self.sample_rate = sample_rate
+        self.recent = deque(maxlen=buffer_size)
+        if sample_rate > 0 and export != TraceExportType.Disabled:
+            self.writer = LogWriter(
+                "trace", TraceFile(export, log_days), TRACE_QUEUE_SIZE
+            )
+
+    def start(self) -> Optional[Trace]:
+        """按采样率开始一条追踪，未采样时返回None"""
+        if random.random() >= self.sample_rate:
+            return None
+        self.started += 1
+        return Trace(self)
+
+    def finish(self, trace: Trace) -> None:
+        """追踪结束，由`Trace.release`调用"""
+        self.finished += 1
+        self.recent.append(trace)
+        if self.writer is not None:
+            self.writer.write(trace)
+
+    def slowest(self, limit: int) -> list[Trace]:
+        """
+        说明:
+            获取最近追踪中耗时最长的追踪
+
+        参数:
+            * `limit`: 数量
+
+        返回:
+            * `list[Trace]`: 按耗时从长到短排序
+        """
+        traces = sorted(self.recent, key=lambda trace: trace.duration, reverse=True)
+        return traces[:limit]
+
+    def stop(self) -> None:
+        """写完导出队列中的追踪后停止导出"""
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+
+
+tracer = Tracer()
+"""全局追踪器"""
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+"""当前处理中的消息的追踪，在消息处理期间设置"""
@@ -8,11 +8,20 @@ import json
 import re
 from base64 import b64encode
 from functools import partial, wraps
-from typing import Any, Callable, Coroutine, ForwardRef, Optional, ParamSpec, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    ForwardRef,
+    Optional,
+    ParamSpec,
+    TypeVar,
+    Union,
+)
 
 from pydantic.typing import evaluate_forwardref
 
-from wechatbot_client.log import logger
+from wechatbot_client.log import default_filter, logger
 from wechatbot_client.typing import overrides
 
 P = ParamSpec("P")
@@ -88,18 +97,36 @@ def logger_wrapper(logger_name: str):
         日志记录函数
 
             - level: 日志等级
-            - message: 日志信息
+            - message: 日志信息，也可以是返回日志信息的函数，只在该等级会被输出时调用
             - exception: 异常信息
     """
-
-    def log(level: str, message: str, exception: Optional[Exception] = None):
-        logger.opt(colors=True, exception=exception).log(
-            level, f"<m>{escape_tag(logger_name)}</m> | {message}"
-        )
+    prefix = f"<m>{escape_tag(logger_name)}</m> | "
+    colored = logger.opt(colors=True)
+
+    def log(
+        level: str,
+        message: Union[str, Callable[[], str]],
+        exception: Optional[Exception] = None,
+    ):
+        if not default_filter.enabled(level):
+            return
+        if callable(message):
+            message = message()
+        if exception is None:
+            colored.log(level, prefix + message)
+        else:
+            logger.opt(colors=True, exception=exception).log(level, prefix + message)
 
     return log
 
 
+def truncate(text: str, length: int = 200) -> str:
+    """截断过长的日志内容"""
+    if len(text) > length:
+        return text[:length] + "..."
+    return text
+
+
 class DataclassEncoder(json.JSONEncoder):
     """在JSON序列化 `Message` (List[Dataclass]) 时使用的 `JSONEncoder`"""
 
@@ -110,3 +137,10 @@ class DataclassEncoder(json.JSONEncoder):
         if dataclasses.is_dataclass(o):
             return {f.name: getattr(o, f.name) for f in dataclasses.fields(o)}
         return super().default(o)
+
+
+def msgpack_default(o: Any) -> Any:
+    """在msgpack序列化 `Message` (List[Dataclass]) 时使用的 `default`"""
+    if dataclasses.is_dataclass(o):
+        return {f.name: getattr(o, f.name) for f in dataclasses.fields(o)}
+    raise TypeError(f"Object of type {o.__class__.__name__} is not msgpack serializable")
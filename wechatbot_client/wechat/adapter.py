@@ -6,6 +6,8 @@ import contextlib
 import json
 import time
 from abc import abstractmethod
+from functools import partial
+from pathlib import Path
 from typing import Any, AsyncGenerator, Optional, Union, cast
 from uuid import uuid4
 
@@ -18,8 +20,15 @@ from wechatbot_client.action_manager import (
     WsActionRequest,
     WsActionResponse,
 )
-from wechatbot_client.config import Config, WebsocketType
-from wechatbot_client.consts import IMPL, ONEBOT_VERSION, USER_AGENT, VERSION
+from wechatbot_client.config import Config, WebsocketEncoding, WebsocketType
+from wechatbot_client.consts import (
+    DATABASE_PATH,
+    EVENT_JOURNAL_PATH,
+    IMPL,
+    ONEBOT_VERSION,
+    USER_AGENT,
+    VERSION,
+)
 from wechatbot_client.driver import (
     URL,
     BackwardWebSocket,
@@ -32,16 +41,26 @@ from wechatbot_client.driver import (
     WebSocketServerSetup,
 )
 from wechatbot_client.exception import WebSocketClosed
-from wechatbot_client.onebot12 import ConnectEvent, Event, StatusUpdateEvent
-from wechatbot_client.utils import DataclassEncoder, escape_tag, logger_wrapper
+from wechatbot_client.metrics import DELIVERY_SECONDS, EVENTS, metrics
+from wechatbot_client.onebot12 import ConnectEvent, Event, LiteEvent, StatusUpdateEvent
+from wechatbot_client.trace import current_trace, tracer
+from wechatbot_client.utils import (
+    DataclassEncoder,
+    escape_tag,
+    logger_wrapper,
+    msgpack_default,
+    truncate,
+)
 
+from .event_store import DEFAULT_CONSUMER, EventStore
+from .journal import EventJournal, JournalSink
+from .payload import EventPayload, Payload, events_response
+from .webhook import WebhookEndpoint, register_webhook_metrics
+from .ws_writer import WebSocketWriter, register_ws_metrics
 from .utils import get_auth_bearer
 
 log = logger_wrapper("OneBot V12")
 
-HTTP_EVENT_LIST: list[Event] = []
-"""get_latest_events的event储存"""
-
 
 def get_connet_event() -> ConnectEvent:
     """
@@ -69,11 +88,29 @@ class Adapter:
     """反向连接ws任务列表"""
     driver: Driver
     """后端驱动"""
+    msgpack_connects: set[int]
+    """使用msgpack编码发送的ws连接编号"""
+    ws_writers: dict[int, WebSocketWriter]
+    """每个ws连接的事件发送队列"""
+    event_store: EventStore
+    """get_latest_events的事件存储"""
+    journal: Optional[EventJournal]
+    """事件日志，未启用时为None"""
+    journal_sinks: dict[str, JournalSink]
+    """事件日志上报端"""
+    webhooks: dict[str, WebhookEndpoint]
+    """webhook上报地址"""
 
     def __init__(self, config: Config) -> None:
         self.config = config
         self.driver = Driver(config)
         self.tasks = []
+        self.msgpack_connects = set()
+        self.ws_writers = {}
+        self.event_store = EventStore(config.event_buffer_size)
+        self.journal = None
+        self.journal_sinks = {}
+        self.webhooks = {}
 
     def setup_http_server(self, setup: HTTPServerSetup) -> None:
         """设置一个 HTTP 服务器路由配置"""
@@ -111,6 +148,63 @@ class Adapter:
             log("WARNING", msg)
             return Response(403, content=msg)
 
+    def _ws_connect(self, websocket: WebSocket) -> int:
+        """登记ws连接，返回编号"""
+        seq = self.driver.ws_connect(websocket)
+        if self.config.websocket_encoding == WebsocketEncoding.Msgpack:
+            self.msgpack_connects.add(seq)
+        writer = WebSocketWriter(
+            seq,
+            websocket,
+            partial(self._ws_encode_event, seq),
+            self.config.websocket_send_queue_size,
+            self.config.websocket_overflow_policy,
+        )
+        writer.start()
+        self.ws_writers[seq] = writer
+        return seq
+
+    def _ws_disconnect(self, seq: int) -> None:
+        """移除ws连接"""
+        self.driver.ws_disconnect(seq)
+        self.msgpack_connects.discard(seq)
+        writer = self.ws_writers.pop(seq, None)
+        if writer is not None:
+            writer.stop()
+
+    def register_metrics(self) -> None:
+        """注册websocket与webhook上报指标"""
+        register_ws_metrics(self.ws_writers.values)
+        register_webhook_metrics(self.webhooks.values)
+
+    def ws_stats(self) -> list[dict[str, Union[int, float]]]:
+        """每个ws连接的发送队列统计"""
+        return [writer.stats() for writer in self.ws_writers.values()]
+
+    def _ws_decode(self, seq: int, data: Union[str, bytes]) -> Any:
+        """解码收到的ws帧，编码方式为auto时记录对端的帧类型"""
+        is_binary = isinstance(data, bytes)
+        if self.config.websocket_encoding == WebsocketEncoding.Auto:
+            if is_binary:
+                self.msgpack_connects.add(seq)
+            else:
+                self.msgpack_connects.discard(seq)
+        return msgpack.unpackb(data) if is_binary else json.loads(data)
+
+    def _ws_encode_response(
+        self, seq: int, response: WsActionResponse
+    ) -> Union[str, bytes]:
+        """按连接的编码方式编码响应，msgpack下bytes不再base64编码"""
+        if seq in self.msgpack_connects:
+            return msgpack.packb(response.dict(), default=msgpack_default)
+        return response.json(ensure_ascii=False, cls=DataclassEncoder)
+
+    def _ws_encode_event(self, seq: int, payload: Payload) -> Union[str, bytes]:
+        """按连接的编码方式取出事件编码"""
+        if seq in self.msgpack_connects:
+            return payload.msgpack
+        return payload.json
+
     async def handle_ws(self, websocket: WebSocket) -> None:
         """
         当有新的ws连接时的任务
@@ -125,31 +219,27 @@ class Adapter:
 
         # 后续处理代码
         await websocket.accept()
-        seq = self.driver.ws_connect(websocket)
+        seq = self._ws_connect(websocket)
         log("SUCCESS", f"新的websocket连接，编号为: {seq}...")
         # 发送元事件
-        event = get_connet_event()
+        payload = EventPayload(get_connet_event())
         try:
-            await websocket.send(event.json(ensure_ascii=False))
+            await websocket.send(self._ws_encode_event(seq, payload))
         except Exception as e:
             log("ERROR", f"发送connect事件失败:{e}")
         # 发送update事件
-        event = self.get_status_update_event()
+        payload = EventPayload(self.get_status_update_event())
         try:
-            await websocket.send(event.json(ensure_ascii=False, cls=DataclassEncoder))
+            await websocket.send(self._ws_encode_event(seq, payload))
         except Exception as e:
             log("ERROR", f"发送status_update事件失败:{e}")
         try:
             while True:
                 data = await websocket.receive()
-                raw_data = (
-                    json.loads(data) if isinstance(data, str) else msgpack.unpackb(data)
-                )
+                raw_data = self._ws_decode(seq, data)
                 if action := self.json_to_ws_action(raw_data):
-                    response = await self.action_ws_request(action)
-                    await websocket.send(
-                        response.json(ensure_ascii=False, cls=DataclassEncoder)
-                    )
+                    async for response in self.action_ws_responses(action):
+                        await websocket.send(self._ws_encode_response(seq, response))
         except WebSocketClosed:
             log(
                 "WARNING",
@@ -165,7 +255,7 @@ class Adapter:
         finally:
             with contextlib.suppress(Exception):
                 await websocket.close()
-            self.driver.ws_disconnect(seq)
+            self._ws_disconnect(seq)
 
     async def handle_http(self, request: Request) -> Response:
         """处理http任务"""
@@ -188,12 +278,14 @@ class Adapter:
                             data=None,
                             message="未开启该action",
                         )
+                        content = response.json(by_alias=True, ensure_ascii=False)
                     else:
-                        data = HTTP_EVENT_LIST.copy()
-                        HTTP_EVENT_LIST.clear()
-                        response = ActionResponse(status="ok", retcode=0, data=data)
+                        content = await self._get_latest_events(action.params)
                 else:
                     response = await self.action_request(action)
+                    content = response.json(
+                        by_alias=True, ensure_ascii=False, cls=DataclassEncoder
+                    )
                 headers = {
                     "Content-Type": "application/json",
                     "User-Agent": USER_AGENT,
@@ -202,15 +294,41 @@ class Adapter:
                 }
                 if self.config.access_token != "":
                     headers["Authorization"] = f"Bearer {self.config.access_token}"
-                return Response(
-                    200,
-                    headers=headers,
-                    content=response.json(
-                        by_alias=True, ensure_ascii=False, cls=DataclassEncoder
-                    ),
-                )
+                return Response(200, headers=headers, content=content)
         return Response(204)
 
+    async def _get_latest_events(self, params: dict[str, Any]) -> str:
+        """
+        说明:
+            处理get_latest_events，按消费者游标读取事件。
+            `timeout`大于0且没有新事件时，挂起请求直到有新事件或超时
+
+        参数:
+            * `params`: action参数，支持`limit`、`timeout`与拓展参数`wx.consumer_id`
+
+        返回:
+            * `str`: 响应文本
+        """
+        limit = params.get("limit", 0)
+        timeout = params.get("timeout", 0)
+        consumer = params.get("wx.consumer_id", DEFAULT_CONSUMER)
+        if (
+            not isinstance(limit, int)
+            or isinstance(limit, bool)
+            or limit < 0
+            or not isinstance(timeout, (int, float))
+            or isinstance(timeout, bool)
+            or timeout < 0
+            or not isinstance(consumer, str)
+        ):
+            response = ActionResponse(
+                status="failed", retcode=10003, data=None, message="参数错误"
+            )
+            return response.json(by_alias=True, ensure_ascii=False)
+        await self.event_store.wait(consumer, timeout)
+        # 事件已编码，直接拼接
+        return events_response(self.event_store.read(consumer, limit))
+
     async def start_backward(self) -> None:
         """
         开启反向ws连接应用端
@@ -245,39 +363,35 @@ class Adapter:
                         "SUCCESS",
                         f"WebSocket Connection to {escape_tag(str(url))} established",
                     )
-                    seq = self.driver.ws_connect(websocket)
+                    seq = self._ws_connect(websocket)
                     log("SUCCESS", f"<y>新的websocket连接，编号为: {seq}...</y>")
                     # 发送connect事件
-                    event = get_connet_event()
+                    payload = EventPayload(get_connet_event())
                     try:
-                        await websocket.send(
-                            event.json(ensure_ascii=False, cls=DataclassEncoder)
-                        )
+                        await websocket.send(self._ws_encode_event(seq, payload))
                     except Exception as e:
                         log("ERROR", f"发送connect事件失败:{e}")
                     # 发送update事件
-                    event = self.get_status_update_event()
+                    payload = EventPayload(self.get_status_update_event())
                     try:
-                        await websocket.send(
-                            event.json(ensure_ascii=False, cls=DataclassEncoder)
-                        )
+                        await websocket.send(self._ws_encode_event(seq, payload))
                     except Exception as e:
                         log("ERROR", f"发送status_update事件失败:{e}")
+                    # 从确认位置开始补发并继续发送事件
+                    sink = self.journal_sinks.get(f"websocket:{url}")
+                    if sink is not None:
+                        sink.attach(partial(self._send_ws_batch, seq, websocket))
                     try:
                         while True:
                             data = await websocket.receive()
-                            raw_data = (
-                                json.loads(data)
-                                if isinstance(data, str)
-                                else msgpack.unpackb(data)
-                            )
+                            raw_data = self._ws_decode(seq, data)
                             if action := self.json_to_ws_action(raw_data):
-                                response = await self.action_ws_request(action)
-                                await websocket.send(
-                                    response.json(
-                                        ensure_ascii=False, cls=DataclassEncoder
+                                async for response in self.action_ws_responses(
+                                    action
+                                ):
+                                    await websocket.send(
+                                        self._ws_encode_response(seq, response)
                                     )
-                                )
                     except WebSocketClosed as e:
                         log(
                             "ERROR",
@@ -290,7 +404,9 @@ class Adapter:
                             f"{escape_tag(str(url))} 正在尝试重连...</bg #f8bbd0></r>",
                         )
                     finally:
-                        self.driver.ws_disconnect(seq)
+                        if sink is not None:
+                            sink.detach()
+                        self._ws_disconnect(seq)
 
             except Exception as e:
                 log(
@@ -307,6 +423,52 @@ class Adapter:
             if not task.done():
                 task.cancel()
 
+    async def start_journal(self) -> None:
+        """
+        开启事件日志，为每个反向ws地址与webhook地址创建上报端
+        """
+        if not self.config.event_journal_enabled:
+            return
+        self.journal = EventJournal(
+            Path(f"./{DATABASE_PATH}") / EVENT_JOURNAL_PATH,
+            segment_size=self.config.event_journal_segment_size * 2**20,
+            retention=self.config.event_journal_retention * 3600,
+            fsync_interval=self.config.event_journal_fsync_interval,
+        )
+        self.journal.open()
+        retry_interval = self.config.reconnect_interval / 1000
+        for url, endpoint in self.webhooks.items():
+            sink = JournalSink(
+                f"webhook:{url}",
+                self.journal,
+                self.config.event_journal_batch_size,
+                retry_interval,
+            )
+            sink.attach(endpoint.send, self.config.webhook_batch_size)
+            self.journal_sinks[sink.name] = sink
+        if self.config.websocekt_type == WebsocketType.Backward:
+            for url in self.config.websocket_url:
+                # 与反向ws任务中的url保持一致
+                name = f"websocket:{URL(url)}"
+                self.journal_sinks[name] = JournalSink(
+                    name,
+                    self.journal,
+                    self.config.event_journal_batch_size,
+                    retry_interval,
+                )
+        for sink in self.journal_sinks.values():
+            sink.start()
+        log("SUCCESS", f"<g>事件日志已开启，上报端数量: {len(self.journal_sinks)}</g>")
+
+    async def stop_journal(self) -> None:
+        """关闭事件日志"""
+        for sink in self.journal_sinks.values():
+            await sink.stop()
+        self.journal_sinks.clear()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
     @classmethod
     def json_to_action(cls, json_data: Any) -> Optional[ActionRequest]:
         """
@@ -319,10 +481,7 @@ class Adapter:
         except ValidationError:
             log("ERROR", f"<r>action请求错误: </r>{json_data}")
             return None
-        logstring = str(action.dict())
-        if len(logstring) > 200:
-            logstring = logstring[:200] + "..."
-        log("SUCCESS", f"<y>收到action请求: </y>{logstring}")
+        log("SUCCESS", lambda: f"<y>收到action请求: </y>{truncate(str(action.dict()))}")
         return action
 
     @classmethod
@@ -360,26 +519,63 @@ class Adapter:
         """
         raise NotImplementedError
 
-    async def http_event(self, event: Event) -> None:
+    async def action_ws_responses(
+        self, request: WsActionRequest
+    ) -> AsyncGenerator[WsActionResponse, None]:
+        """
+        处理wsaction，产出一个或多个响应帧，默认只有一个
+        """
+        yield await self.action_ws_request(request)
+
+    async def http_event(self, payload: EventPayload) -> None:
         """
         http处理event
         """
-        global HTTP_EVENT_LIST
         if self.config.event_enabled:
             # 开启 get_latest_events
-            if (
-                self.config.event_buffer_size != 0
-                and len(HTTP_EVENT_LIST) == self.config.event_buffer_size
-            ):
-                HTTP_EVENT_LIST.pop(0)
-            HTTP_EVENT_LIST.append(event)
+            await self.event_store.publish(payload)
+
+    async def start_webhook(self) -> None:
+        """
+        为每个webhook地址开启上报worker，需在事件日志之前开启
+        """
+        if not self.config.enable_http_webhook:
+            return
+        for url in self.config.webhook_url:
+            endpoint = WebhookEndpoint(
+                url,
+                self._request_webhook,
+                queue_size=self.config.webhook_queue_size,
+                max_in_flight=self.config.webhook_max_in_flight,
+                batch_size=self.config.webhook_batch_size,
+                flush_interval=self.config.webhook_flush_interval / 1000,
+                retries=self.config.webhook_retries,
+                backoff=self.config.webhook_retry_backoff / 1000,
+                breaker_threshold=self.config.webhook_breaker_threshold,
+                breaker_cooldown=self.config.webhook_breaker_cooldown,
+            )
+            endpoint.start()
+            self.webhooks[url] = endpoint
+
+    async def stop_webhook(self) -> None:
+        """停止webhook上报"""
+        for endpoint in self.webhooks.values():
+            await endpoint.stop()
+        self.webhooks.clear()
+
+    def webhook_stats(self) -> list[dict]:
+        """每个webhook地址的上报统计"""
+        return [endpoint.stats() for endpoint in self.webhooks.values()]
 
-    async def webhook_event(self, event: Event) -> None:
+    async def webhook_event(self, payload: EventPayload) -> None:
         """
-        处理webhook
+        处理webhook，事件加入每个地址各自的上报队列
         """
-        log("DEBUG", "发送webhook...")
+        for endpoint in self.webhooks.values():
+            endpoint.put(payload)
 
+    def _webhook_headers(self) -> dict[str, str]:
+        """webhook请求头"""
         headers = {
             "User-Agent": USER_AGENT,
             "Content-Type": "application/json",
@@ -388,49 +584,74 @@ class Adapter:
         }
         if self.config.access_token != "":
             headers["Authorization"] = f"Bearer {self.config.access_token}"
-        for url in self.config.webhook_url:
-            try:
-                post_url = URL(url)
-                setup = Request(
-                    method="POST",
-                    url=post_url,
-                    headers=headers,
-                    json=event.json(
-                        by_alias=True, ensure_ascii=False, cls=DataclassEncoder
-                    ),
-                    timeout=self.config.webhook_timeout / 1000,
-                )
-                await self.driver.request(setup)
-            except Exception as e:
-                log("ERROR", f"发送webhook出现错误:{e}")
+        return headers
+
+    async def _request_webhook(self, url: str, content: str) -> Response:
+        """
+        发送一个webhook请求
+        """
+        timeout = self.config.webhook_timeout
+        setup = Request(
+            method="POST",
+            url=URL(url),
+            headers=self._webhook_headers(),
+            content=content,
+            timeout=timeout / 1000 if timeout > 0 else None,
+        )
+        return await self.driver.request(setup)
 
     async def _send_ws(
-        self, ws: Union[FastAPIWebSocket, BackwardWebSocket], event: Event
+        self,
+        seq: int,
+        ws: Union[FastAPIWebSocket, BackwardWebSocket],
+        payload: Payload,
     ) -> None:
         """
         发送ws消息
         """
-        await ws.send(
-            event.json(by_alias=True, ensure_ascii=False, cls=DataclassEncoder)
-        )
+        await ws.send(self._ws_encode_event(seq, payload))
+        if metrics.enabled:
+            DELIVERY_SECONDS.observe(time.monotonic() - payload.created, "websocket")
+
+    async def _send_ws_batch(
+        self,
+        seq: int,
+        ws: Union[FastAPIWebSocket, BackwardWebSocket],
+        payloads: list[Payload],
+    ) -> None:
+        """
+        按顺序发送多个ws消息
+        """
+        for payload in payloads:
+            await self._send_ws(seq, ws, payload)
 
-    async def websocket_event(self, event: Event) -> None:
+    async def websocket_event(self, payload: EventPayload) -> None:
         """
-        处理websocket发送事件
+        处理websocket发送事件，事件加入每个连接各自的发送队列
         """
-        task = [self._send_ws(one, event) for one in self.driver.connects.values()]
-        try:
-            asyncio.gather(*task)
-        except Exception as e:
-            log("ERROR", f"发送ws消息出错:{e}")
+        for writer in self.ws_writers.values():
+            writer.put(payload)
 
-    async def handle_event(self, event: Event) -> None:
+    async def handle_event(self, event: Union[Event, LiteEvent]) -> None:
         """
-        处理event
+        处理event，事件只编码一次，由所有上报端共享。
+        处理消息时生成的事件会带上消息的追踪
         """
+        payload = EventPayload(event, current_trace.get() if tracer.enabled else None)
+        if metrics.enabled:
+            EVENTS.inc(event.type, event.detail_type)
         if self.config.enable_http_api:
-            asyncio.create_task(self.http_event(event))
-        if self.config.enable_http_webhook:
-            asyncio.create_task(self.webhook_event(event))
-        if self.config.websocekt_type != WebsocketType.Unable:
-            asyncio.create_task(self.websocket_event(event))
+            asyncio.create_task(self.http_event(payload))
+        # 启用事件日志时，反向ws与webhook由日志上报端发送，元事件不写入日志
+        journaled = self.journal is not None and event.type != "meta"
+        if journaled:
+            begin = time.monotonic()
+            self.journal.append(payload)
+            if payload.trace is not None:
+                payload.trace.add_span("journal.append", begin)
+        if self.config.enable_http_webhook and not journaled:
+            await self.webhook_event(payload)
+        if self.config.websocekt_type == WebsocketType.Forward or (
+            self.config.websocekt_type == WebsocketType.Backward and not journaled
+        ):
+            await self.websocket_event(payload)
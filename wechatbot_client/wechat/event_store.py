@@ -0,0 +1,187 @@
+"""
+get_latest_events的事件存储
+"""
+import asyncio
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Optional
+
+from wechatbot_client.utils import logger_wrapper
+
+from .payload import EventPayload
+
+log = logger_wrapper("Event Store")
+
+DEFAULT_CONSUMER = ""
+"""未指定`wx.consumer_id`时使用的消费者"""
+
+
+class EventStore:
+    """
+    固定容量的环形缓冲区，保存编码后的事件。
+
+    每个事件有单调递增的序号，每个消费者保存自己的读取游标，
+    读取不会清空缓冲区，多个http消费者之间互不影响。
+
+    容量为0时不限大小，事件保留到所有消费者都读取之后。
+    """
+
+    capacity: int
+    """缓冲区容量，0 表示不限大小"""
+    max_consumers: int
+    """保存游标的消费者数量上限，超出时淘汰最久未读取的消费者"""
+    _buffer: list[Optional[EventPayload]]
+    """环形缓冲区"""
+    _events: deque[EventPayload]
+    """不限大小时保存的事件"""
+    _first_seq: int
+    """不限大小时最旧事件的序号"""
+    _next_seq: int
+    """下一个事件的序号"""
+    _cursors: OrderedDict[str, int]
+    """消费者游标，值为下一次读取的序号"""
+    _condition: Optional[asyncio.Condition]
+    """新事件通知，长轮询的请求在此等待，在事件循环中首次使用时创建"""
+
+    def __init__(self, capacity: int, max_consumers: int = 64) -> None:
+        self.capacity = capacity
+        self.max_consumers = max_consumers
+        self._buffer = [None] * capacity
+        self._events = deque()
+        self._first_seq = 0
+        self._next_seq = 0
+        self._cursors = OrderedDict()
+        self._condition = None
+
+    def __len__(self) -> int:
+        return self._next_seq - self.first_seq
+
+    @property
+    def first_seq(self) -> int:
+        """缓冲区中最旧事件的序号"""
+        if not self.capacity:
+            return self._first_seq
+        return max(0, self._next_seq - self.capacity)
+
+    @property
+    def last_seq(self) -> int:
+        """下一个事件的序号"""
+        return self._next_seq
+
+    def append(self, payload: EventPayload) -> int:
+        """
+        说明:
+            写入事件，缓冲区满时覆盖最旧的事件
+
+        参数:
+            * `payload`: 编码后的事件
+
+        返回:
+            * `int`: 事件序号
+        """
+        seq = self._next_seq
+        if self.capacity:
+            self._buffer[seq % self.capacity] = payload
+        else:
+            self._events.append(payload)
+        self._next_seq = seq + 1
+        return seq
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        """新事件通知"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def publish(self, payload: EventPayload) -> int:
+        """
+        说明:
+            写入事件，并唤醒正在等待的长轮询请求
+
+        参数:
+            * `payload`: 编码后的事件
+
+        返回:
+            * `int`: 事件序号
+        """
+        seq = self.append(payload)
+        async with self.condition:
+            self.condition.notify_all()
+        return seq
+
+    async def wait(self, consumer: str = DEFAULT_CONSUMER, timeout: float = 0) -> bool:
+        """
+        说明:
+            等待消费者有未读取的事件
+
+        参数:
+            * `consumer`: 消费者id
+            * `timeout`: 最长等待时间，单位：秒，0 表示不等待
+
+        返回:
+            * `bool`: 是否有未读取的事件
+        """
+        if self.pending(consumer) or timeout <= 0:
+            return self.pending(consumer) > 0
+        async with self.condition:
+            try:
+                await asyncio.wait_for(
+                    self.condition.wait_for(lambda: self.pending(consumer) > 0),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def pending(self, consumer: str = DEFAULT_CONSUMER) -> int:
+        """消费者未读取的事件数量"""
+        cursor = self._cursors.get(consumer, self.first_seq)
+        return self._next_seq - max(cursor, self.first_seq)
+
+    def read(
+        self, consumer: str = DEFAULT_CONSUMER, limit: int = 0
+    ) -> list[EventPayload]:
+        """
+        说明:
+            读取消费者游标之后的事件，并移动游标。
+            新的消费者从缓冲区中最旧的事件开始读取。
+
+        参数:
+            * `consumer`: 消费者id
+            * `limit`: 读取数量上限，0 表示不限制
+
+        返回:
+            * `list[EventPayload]`: 事件列表，从旧到新
+        """
+        first = self.first_seq
+        cursor = self._cursors.pop(consumer, first)
+        if cursor < first:
+            log(
+                "WARNING",
+                f"消费者 {consumer or '默认'} 读取过慢，丢失了 {first - cursor} 个事件",
+            )
+            cursor = first
+        end = self._next_seq
+        if limit > 0:
+            end = min(end, cursor + limit)
+        capacity = self.capacity
+        if capacity:
+            buffer = self._buffer
+            events = [buffer[seq % capacity] for seq in range(cursor, end)]
+        else:
+            events = list(islice(self._events, cursor - first, end - first))
+        self._cursors[consumer] = end
+        if len(self._cursors) > self.max_consumers:
+            self._cursors.popitem(last=False)
+        if not capacity:
+            self._trim()
+        return events  # type: ignore
+
+    def _trim(self) -> None:
+        """不限大小时，丢弃所有消费者都已读取的事件"""
+        low = min(self._cursors.values(), default=self._first_seq)
+        events = self._events
+        for _ in range(low - self._first_seq):
+            events.popleft()
+        self._first_seq = max(low, self._first_seq)
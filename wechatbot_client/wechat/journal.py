@@ -0,0 +1,418 @@
+"""
+上报事件日志:
+    handle_event -> 追加写入分段日志 -> 每个上报端(反向ws、webhook)按各自的确认位置发送
+
+事件按行保存编码后的json，每个事件有单调递增的序号(offset)，
+日志按大小切分为多个分段文件，文件名为分段中第一个事件的序号。
+上报端断开或失败时事件保留在日志中，恢复后从确认位置开始分批补发。
+
+每个事件写入后立即交给操作系统，本程序崩溃不会丢失已写入的事件；
+设置`fsync_interval`后会定期同步到磁盘，系统断电时最多丢失一个间隔内的事件。
+"""
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_right
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from wechatbot_client.utils import logger_wrapper, run_sync
+
+from .payload import EventPayload, Payload, ReplayPayload
+
+log = logger_wrapper("Event Journal")
+
+SEGMENT_SUFFIX = ".log"
+"""分段文件后缀"""
+ACK_FILE = "acks.json"
+"""确认位置文件"""
+ACK_SAVE_INTERVAL = 1.0
+"""确认位置的最短保存间隔，单位秒"""
+
+
+class EventJournal:
+    """
+    追加写入的分段事件日志，记录每个上报端的确认位置
+    """
+
+    path: Path
+    """日志目录"""
+    segment_size: int
+    """单个分段的大小上限，单位字节"""
+    retention: float
+    """已写满分段的保留时间，单位秒，0 表示不清理"""
+    fsync_interval: float
+    """同步到磁盘的间隔，单位秒，0 表示只交给操作系统，不主动同步"""
+    next_offset: int
+    """下一个事件的序号"""
+    acks: dict[str, int]
+    """上报端确认位置，值为下一个要发送的事件序号"""
+
+    def __init__(
+        self,
+        path: Path,
+        segment_size: int,
+        retention: float,
+        fsync_interval: float = 0,
+        tail_size: int = 1024,
+    ) -> None:
+        self.path = path
+        self.segment_size = segment_size
+        self.retention = retention
+        self.fsync_interval = fsync_interval
+        self.next_offset = 0
+        self.acks = {}
+        self._segments: list[int] = []
+        self._file = None
+        self._file_size = 0
+        self._tail: deque[tuple[int, Payload]] = deque(maxlen=tail_size)
+        self._positions: dict[int, tuple[int, int]] = {}
+        self._waiters: list[asyncio.Event] = []
+        self._acks_dirty = False
+        self._acks_saved_at = 0.0
+        self._synced = True
+        self._sync_task: Optional[asyncio.Task] = None
+
+    def _segment_path(self, base: int) -> Path:
+        return self.path / f"{base:020d}{SEGMENT_SUFFIX}"
+
+    def open(self) -> None:
+        """
+        说明:
+            打开日志，恢复序号与确认位置，截断写入到一半的事件
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._segments = sorted(
+            int(one.stem)
+            for one in self.path.glob(f"*{SEGMENT_SUFFIX}")
+            if one.stem.isdigit()
+        )
+        if self._segments:
+            base = self._segments[-1]
+            segment = self._segment_path(base)
+            data = segment.read_bytes()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                log("WARNING", f"日志分段 {segment.name} 末尾的事件不完整，已截断")
+                with open(segment, mode="r+b") as f:
+                    f.truncate(end)
+            self.next_offset = base + data.count(b"\n", 0, end)
+            self._file_size = end
+        else:
+            self._segments.append(0)
+            self._file_size = 0
+        self._file = open(self._segment_path(self._segments[-1]), mode="ab")
+        ack_file = self.path / ACK_FILE
+        if ack_file.exists():
+            try:
+                self.acks = json.loads(ack_file.read_text(encoding="utf-8"))
+            except ValueError:
+                log("ERROR", "<r>确认位置文件损坏，所有上报端将从最新事件开始发送</r>")
+                self.acks = {}
+        self._cleanup()
+        if self.fsync_interval > 0:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+        log(
+            "DEBUG",
+            f"事件日志已打开，分段数量: {len(self._segments)}，"
+            f"下一个序号: {self.next_offset}",
+        )
+
+    def close(self) -> None:
+        """关闭日志，保存确认位置"""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+        self.save_acks(force=True)
+
+    def subscribe(self) -> asyncio.Event:
+        """
+        说明:
+            获取一个新事件通知，每次写入事件时都会被设置
+        """
+        event = asyncio.Event()
+        self._waiters.append(event)
+        return event
+
+    def append(self, payload: EventPayload) -> int:
+        """
+        说明:
+            写入事件
+
+        参数:
+            * `payload`: 编码后的事件
+
+        返回:
+            * `int`: 事件序号
+        """
+        data = payload.json.encode("utf-8") + b"\n"
+        if self._file_size > 0 and self._file_size + len(data) > self.segment_size:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._synced = False
+        self._file_size += len(data)
+        offset = self.next_offset
+        self.next_offset = offset + 1
+        self._tail.append((offset, payload))
+        for waiter in self._waiters:
+            waiter.set()
+        return offset
+
+    def _rotate(self) -> None:
+        """开启新的分段，并清理过期分段"""
+        self._sync()
+        self._file.close()
+        self._segments.append(self.next_offset)
+        self._file = open(self._segment_path(self.next_offset), mode="ab")
+        self._file_size = 0
+        self._cleanup()
+
+    def _sync(self) -> None:
+        """开启定期同步时，将当前分段同步到磁盘"""
+        if self.fsync_interval > 0 and not self._synced:
+            os.fsync(self._file.fileno())
+            self._synced = True
+
+    async def _sync_loop(self) -> None:
+        """定期在线程中同步当前分段，不阻塞事件循环"""
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            if self._synced or self._file is None:
+                continue
+            self._synced = True
+            # 复制文件描述符，同步期间分段切换关闭原文件也不受影响
+            fd = os.dup(self._file.fileno())
+            try:
+                await run_sync(os.fsync)(fd)
+            except OSError as e:
+                self._synced = False
+                log("ERROR", f"<r>事件日志同步到磁盘失败: {e}</r>")
+            finally:
+                os.close(fd)
+
+    def _cleanup(self) -> None:
+        """删除超过保留时间的已写满分段"""
+        if self.retention <= 0:
+            return
+        expire = time.time() - self.retention
+        while len(self._segments) > 1:
+            segment = self._segment_path(self._segments[0])
+            try:
+                if segment.stat().st_mtime >= expire:
+                    break
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+            log("DEBUG", f"删除过期日志分段: {segment.name}")
+            self._segments.pop(0)
+        self._positions.clear()
+
+    @property
+    def first_offset(self) -> int:
+        """日志中最旧事件的序号"""
+        return self._segments[0] if self._segments else self.next_offset
+
+    def read(self, offset: int, limit: int) -> list[tuple[int, Payload]]:
+        """
+        说明:
+            从指定序号开始读取事件，较新的事件直接从内存读取，否则读取分段文件
+
+        参数:
+            * `offset`: 起始序号
+            * `limit`: 读取数量上限
+
+        返回:
+            * `list[tuple[int, Payload]]`: 序号与事件，序号可能大于`offset`(事件已被清理)
+        """
+        if offset >= self.next_offset:
+            return []
+        tail = self._tail
+        if tail and offset >= tail[0][0]:
+            start = offset - tail[0][0]
+            return [tail[index] for index in range(start, min(len(tail), start + limit))]
+        return self._read_segments(max(offset, self.first_offset), limit)
+
+    def _read_segments(self, offset: int, limit: int) -> list[tuple[int, Payload]]:
+        """从分段文件读取事件"""
+        events: list[tuple[int, Payload]] = []
+        index = bisect_right(self._segments, offset) - 1
+        while index < len(self._segments) and len(events) < limit:
+            base = self._segments[index]
+            seq, position = self._positions.pop(offset, (base, 0))
+            if seq != base:
+                seq, position = base, 0
+            with open(self._segment_path(base), mode="rb") as f:
+                f.seek(position)
+                current = offset if position else base
+                while len(events) < limit and current < self.next_offset:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if current >= offset:
+                        events.append((current, ReplayPayload(line[:-1].decode("utf-8"))))
+                    current += 1
+                position = f.tell()
+            offset = current
+            if len(events) >= limit:
+                # 记录读取位置，下一批次直接从此处继续
+                if len(self._positions) >= 64:
+                    self._positions.clear()
+                self._positions[offset] = (base, position)
+            index += 1
+        return events
+
+    def get_ack(self, sink: str) -> int:
+        """
+        说明:
+            获取上报端的确认位置，新的上报端从最新事件开始
+
+        参数:
+            * `sink`: 上报端名称
+        """
+        if sink not in self.acks:
+            self.acks[sink] = self.next_offset
+            self._acks_dirty = True
+        return self.acks[sink]
+
+    def ack(self, sink: str, offset: int) -> None:
+        """
+        说明:
+            更新上报端的确认位置
+
+        参数:
+            * `sink`: 上报端名称
+            * `offset`: 下一个要发送的事件序号
+        """
+        self.acks[sink] = offset
+        self._acks_dirty = True
+        if time.monotonic() - self._acks_saved_at >= ACK_SAVE_INTERVAL:
+            self.save_acks()
+
+    def save_acks(self, force: bool = False) -> None:
+        """
+        说明:
+            保存确认位置，先写入临时文件再替换
+
+        参数:
+            * `force`: 没有变化时也保存
+        """
+        if not self._acks_dirty and not force:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        temp = self.path / f"{ACK_FILE}.tmp"
+        temp.write_text(json.dumps(self.acks), encoding="utf-8")
+        os.replace(temp, self.path / ACK_FILE)
+        self._acks_dirty = False
+        self._acks_saved_at = time.monotonic()
+
+
+class JournalSink:
+    """
+    日志上报端，按顺序发送日志中的事件，发送成功后更新确认位置
+    """
+
+    name: str
+    """上报端名称，也是确认位置的键"""
+    journal: EventJournal
+    """事件日志"""
+    batch_size: int
+    """单次读取的事件数量"""
+    retry_interval: float
+    """发送失败后的重试间隔，单位秒"""
+
+    def __init__(
+        self,
+        name: str,
+        journal: EventJournal,
+        batch_size: int,
+        retry_interval: float,
+    ) -> None:
+        self.name = name
+        self.journal = journal
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._send: Optional[Callable[[list[Payload]], Awaitable]] = None
+        self._send_batch = 1
+        self._attached = asyncio.Event()
+        self._wakeup = journal.subscribe()
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(
+        self, send: Callable[[list[Payload]], Awaitable], send_batch: int = 1
+    ) -> None:
+        """
+        说明:
+            上报端可用，开始(或继续)发送事件
+
+        参数:
+            * `send`: 发送函数，每次发送一批事件，失败时抛出异常
+            * `send_batch`: 每次发送的事件数量上限
+        """
+        self._send = send
+        self._send_batch = send_batch
+        self._attached.set()
+
+    def detach(self) -> None:
+        """上报端不可用，暂停发送，事件继续保留在日志中"""
+        self._send = None
+        self._attached.clear()
+
+    def start(self) -> None:
+        """开启发送任务"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止发送任务"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        journal = self.journal
+        cursor = journal.get_ack(self.name)
+        if cursor < journal.next_offset:
+            log(
+                "INFO",
+                f"上报端 {self.name} 有 {journal.next_offset - cursor} 个未发送的事件",
+            )
+        while True:
+            await self._attached.wait()
+            self._wakeup.clear()
+            events = journal.read(cursor, self.batch_size)
+            if not events:
+                journal.save_acks()
+                if journal.next_offset <= cursor:
+                    await self._wakeup.wait()
+                continue
+            if events[0][0] > cursor:
+                log(
+                    "WARNING",
+                    f"上报端 {self.name} 的 {events[0][0] - cursor} 个事件已被清理，无法补发",
+                )
+            send = self._send
+            step = self._send_batch
+            try:
+                for index in range(0, len(events), step):
+                    if send is None:
+                        break
+                    chunk = events[index : index + step]
+                    await send([payload for _, payload in chunk])
+                    cursor = chunk[-1][0] + 1
+                    journal.ack(self.name, cursor)
+            except Exception as e:
+                log(
+                    "ERROR",
+                    f"<r>上报端 {self.name} 发送事件失败: {e}，"
+                    f"{self.retry_interval} 秒后重试...</r>",
+                )
+                await asyncio.sleep(self.retry_interval)
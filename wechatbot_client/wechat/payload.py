@@ -0,0 +1,91 @@
+"""
+事件的编码结果，每个事件只编码一次，所有上报端共享
+"""
+import json
+import time
+from typing import Optional, Union
+
+import msgpack
+
+from wechatbot_client.onebot12 import Event, LiteEvent
+from wechatbot_client.trace import Trace
+from wechatbot_client.utils import DataclassEncoder, msgpack_default
+
+
+class EventPayload:
+    """
+    编码后的事件，json文本在创建时生成，msgpack在首次使用时生成
+    """
+
+    __slots__ = ("event", "json", "created", "trace", "_msgpack")
+
+    event: Union[Event, LiteEvent]
+    """原始事件"""
+    json: str
+    """json文本"""
+    created: float
+    """创建时间(`time.monotonic`)，用于统计上报延迟"""
+    trace: Optional[Trace]
+    """生成事件的消息的追踪，每个上报端加入队列时持有一次"""
+
+    def __init__(
+        self, event: Union[Event, LiteEvent], trace: Optional[Trace] = None
+    ) -> None:
+        self.event = event
+        self.created = time.monotonic()
+        self.trace = trace
+        self.json = event.json(by_alias=True, ensure_ascii=False, cls=DataclassEncoder)
+        self._msgpack: Optional[bytes] = None
+
+    @property
+    def msgpack(self) -> bytes:
+        """msgpack编码"""
+        if self._msgpack is None:
+            self._msgpack = msgpack.packb(
+                self.event.dict(by_alias=True), default=msgpack_default
+            )
+        return self._msgpack
+
+
+class ReplayPayload:
+    """
+    从事件日志中读出的事件，只有json文本，msgpack在首次使用时由json转换
+    """
+
+    __slots__ = ("json", "created", "trace", "_msgpack")
+
+    json: str
+    """json文本"""
+    created: float
+    """从日志中读出的时间(`time.monotonic`)"""
+    trace: None
+    """补发的事件不追踪"""
+
+    def __init__(self, json_text: str) -> None:
+        self.json = json_text
+        self.created = time.monotonic()
+        self.trace = None
+        self._msgpack: Optional[bytes] = None
+
+    @property
+    def msgpack(self) -> bytes:
+        """msgpack编码"""
+        if self._msgpack is None:
+            self._msgpack = msgpack.packb(json.loads(self.json))
+        return self._msgpack
+
+
+Payload = Union[EventPayload, ReplayPayload]
+"""可以发送给上报端的事件编码"""
+
+
+def events_response(payloads: list[EventPayload]) -> str:
+    """
+    说明:
+        直接拼接已编码的事件，生成`get_latest_events`的响应文本
+
+    参数:
+        * `payloads`: 编码后的事件列表
+    """
+    data = ",".join(payload.json for payload in payloads)
+    return f'{{"status":"ok","retcode":0,"data":[{data}],"message":""}}'
@@ -0,0 +1,330 @@
+"""
+接收消息的处理流水线:
+    MessageReporter -> 有界入口队列 -> 解析分发 -> worker(按会话分区) -> 消息处理器
+
+同一会话(`msg.sender`)的消息总是交给同一个worker，保证事件按接收顺序生成。
+被追踪的消息在队列中与追踪一起传递，worker处理期间设置`current_trace`
+"""
+import asyncio
+import json
+import os
+import shutil
+from collections import deque
+from pathlib import Path
+from typing import Callable, Coroutine, Optional
+
+from wechatbot_client.com_wechat import Message
+from wechatbot_client.config import OverflowPolicy
+from wechatbot_client.metrics import metrics
+from wechatbot_client.trace import Trace, current_trace
+from wechatbot_client.utils import logger_wrapper
+
+log = logger_wrapper("Msg Pipeline")
+
+
+SPILL_COMPACT_SIZE = 16 * 2**20
+"""暂存文件已读取部分超过该大小时压缩文件，单位字节"""
+
+
+class SpillFile:
+    """
+    溢出暂存文件，按行保存原始消息，先进先出。追踪不写入文件，按顺序保存在内存中
+
+    写入与读取各保持一个打开的文件，写入先进入缓冲区，读取到缓冲区中的消息时才写入文件
+    """
+
+    path: Path
+    """文件路径"""
+    pending: int
+    """待读取的消息数量"""
+    traces: deque[Optional[Trace]]
+    """与暂存消息一一对应的追踪"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.pending = 0
+        self.traces = deque()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._open(truncate=True)
+
+    def _open(self, truncate: bool = False) -> None:
+        """打开写入与读取文件"""
+        self._writer = open(self.path, mode="wb" if truncate else "ab")
+        self._reader = open(self.path, mode="rb")
+        self._unflushed = False
+
+    def push(self, msg: str, trace: Optional[Trace] = None) -> None:
+        """写入一条消息"""
+        self._writer.write(json.dumps(msg, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._unflushed = True
+        self.pending += 1
+        self.traces.append(trace)
+
+    def pop(self) -> tuple[str, Optional[Trace]]:
+        """读取最旧的一条消息与追踪，读完后清空文件"""
+        line = self._reader.readline()
+        if not line.endswith(b"\n") and self._unflushed:
+            self._writer.flush()
+            self._unflushed = False
+            line += self._reader.readline()
+        self.pending -= 1
+        if self.pending == 0:
+            self._writer.flush()
+            self._writer.truncate(0)
+            self._writer.seek(0)
+            self._reader.seek(0)
+            self._unflushed = False
+        elif self._reader.tell() >= SPILL_COMPACT_SIZE:
+            self._compact()
+        trace = self.traces.popleft()
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            if trace is not None:
+                trace.lap("pipeline.queue", status="failed")
+                trace.release()
+            raise
+        return msg, trace
+
+    def _compact(self) -> None:
+        """
+        说明:
+            已读取部分不少于未读取部分时，将未读取的消息复制到新文件，
+            保证每次复制的数据量不超过已读取的数据量
+        """
+        offset = self._reader.tell()
+        if offset < self._writer.tell() - offset:
+            return
+        self._writer.flush()
+        temp = self.path.with_name(self.path.name + ".tmp")
+        with open(temp, mode="wb") as f:
+            shutil.copyfileobj(self._reader, f)
+        self.close()
+        os.replace(temp, self.path)
+        self._open()
+
+    def close(self) -> None:
+        """关闭文件"""
+        self._writer.close()
+        self._reader.close()
+
+
+class MessagePipeline:
+    """
+    接收消息流水线
+    """
+
+    parser: Callable[[str], Optional[Message]]
+    """原始消息解析函数"""
+    handler: Callable[[Message], Coroutine]
+    """消息处理函数"""
+    policy: OverflowPolicy
+    """入口队列溢出策略"""
+    worker_count: int
+    """worker数量"""
+    received: int
+    """接收的消息数量"""
+    processed: int
+    """处理完成的消息数量"""
+    dropped: int
+    """丢弃的消息数量"""
+    spilled: int
+    """暂存到磁盘的消息数量"""
+
+    def __init__(
+        self,
+        parser: Callable[[str], Optional[Message]],
+        handler: Callable[[Message], Coroutine],
+        maxsize: int,
+        worker_count: int,
+        policy: OverflowPolicy = OverflowPolicy.Block,
+        spill_path: Optional[Path] = None,
+    ) -> None:
+        self.parser = parser
+        self.handler = handler
+        self.policy = policy
+        self.worker_count = worker_count
+        self.maxsize = maxsize
+        self.spill_path = spill_path
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self._ingress: Optional[asyncio.Queue] = None
+        self._worker_queues: list[asyncio.Queue] = []
+        self._spill: Optional[SpillFile] = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        """流水线是否在运行"""
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        """流水线中待处理的消息数量"""
+        if not self.running:
+            return 0
+        depth = self._ingress.qsize() + sum(q.qsize() for q in self._worker_queues)
+        if self._spill is not None:
+            depth += self._spill.pending
+        return depth
+
+    def stats(self) -> dict[str, int]:
+        """获取流水线计数"""
+        return {
+            "depth": self.depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
+
+    def register_metrics(self) -> None:
+        """注册流水线指标"""
+        metrics.collector(
+            "wechat_pipeline_depth",
+            "接收消息流水线中等待处理的消息数量",
+            (),
+            lambda: [((), self.depth)],
+        )
+        metrics.collector(
+            "wechat_pipeline_messages_total",
+            "接收消息流水线的消息数量",
+            ("result",),
+            lambda: [
+                (("received",), self.received),
+                (("processed",), self.processed),
+                (("dropped",), self.dropped),
+                (("spilled",), self.spilled),
+            ],
+            type="counter",
+        )
+
+    def start(self) -> None:
+        """开启流水线，需要在事件循环中调用"""
+        if self.running:
+            return
+        self._ingress = asyncio.Queue(self.maxsize)
+        self._worker_queues = [
+            asyncio.Queue(self.maxsize) for _ in range(self.worker_count)
+        ]
+        if self.policy == OverflowPolicy.Spill:
+            self._spill = SpillFile(self.spill_path)
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks.extend(
+            asyncio.create_task(self._work(queue)) for queue in self._worker_queues
+        )
+        log("DEBUG", f"消息流水线已开启，worker数量: {self.worker_count}")
+
+    def stop(self) -> None:
+        """关闭流水线"""
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        self._tasks = []
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    async def put(self, msg: str, trace: Optional[Trace] = None) -> None:
+        """
+        说明:
+            放入一条原始消息，队列满时按溢出策略处理
+
+        参数:
+            * `msg`: 原始消息
+            * `trace`: 消息的追踪，未采样时为None
+        """
+        if not self.running:
+            if trace is not None:
+                trace.release()
+            return
+        self.received += 1
+        if trace is not None:
+            trace.lap("com.report")
+        item = (msg, trace)
+        match self.policy:
+            case OverflowPolicy.Block:
+                await self._ingress.put(item)
+            case OverflowPolicy.DropOldest:
+                if self._ingress.full():
+                    _, dropped_trace = self._ingress.get_nowait()
+                    if dropped_trace is not None:
+                        dropped_trace.lap("pipeline.queue", status="dropped")
+                        dropped_trace.release()
+                    self.dropped += 1
+                    # 消息风暴时避免刷屏
+                    if self.dropped % 100 == 1:
+                        log("WARNING", f"消息队列已满，丢弃最旧的消息，共丢弃: {self.dropped}")
+                self._ingress.put_nowait(item)
+            case OverflowPolicy.Spill:
+                # 暂存区有消息时也要写入暂存区，保证顺序
+                if self._ingress.full() or self._spill.pending:
+                    self._spill.push(msg, trace)
+                    self.spilled += 1
+                    if trace is not None:
+                        trace.attributes["spilled"] = True
+                else:
+                    self._ingress.put_nowait(item)
+
+    async def _next_msg(self) -> tuple[str, Optional[Trace]]:
+        """按接收顺序取出下一条原始消息与追踪"""
+        if not self._ingress.empty():
+            return self._ingress.get_nowait()
+        if self._spill is not None and self._spill.pending:
+            return self._spill.pop()
+        return await self._ingress.get()
+
+    async def _dispatch(self) -> None:
+        """解析消息，并按会话分发给worker"""
+        while True:
+            try:
+                msg, trace = await self._next_msg()
+            except Exception as e:
+                # 暂存文件中的消息损坏时跳过该消息，不能让分发任务退出
+                log("ERROR", f"读取暂存的消息出错:{e!r}")
+                continue
+            if trace is not None:
+                trace.lap("pipeline.queue")
+            try:
+                message = self.parser(msg)
+            except Exception as e:
+                log("ERROR", f"解析消息出错:{e!r}")
+                message = None
+            if message is None:
+                if trace is not None:
+                    trace.lap("parse", status="failed")
+                    trace.release()
+                continue
+            if trace is not None:
+                trace.lap("parse")
+                trace.attributes["type"] = message.type.name
+                trace.attributes["sender"] = message.sender
+            index = hash(message.sender) % self.worker_count
+            await self._worker_queues[index].put((message, trace))
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        """worker，按序处理分配的消息"""
+        while True:
+            message, trace = await queue.get()
+            if trace is None:
+                try:
+                    await self.handler(message)
+                except Exception as e:
+                    log("ERROR", f"处理消息出错:{e}")
+                self.processed += 1
+                continue
+            trace.lap("worker.queue")
+            token = current_trace.set(trace)
+            try:
+                await self.handler(message)
+            except Exception as e:
+                trace.lap("handle", status="failed")
+                log("ERROR", f"处理消息出错:{e}")
+            else:
+                trace.lap("handle")
+            finally:
+                current_trace.reset(token)
+                trace.release()
+            self.processed += 1
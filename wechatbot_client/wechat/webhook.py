@@ -0,0 +1,327 @@
+"""
+webhook上报，每个上报地址有独立的有界队列、并发上限、重试与熔断:
+    handle_event -> WebhookEndpoint队列 -> worker(最多`max_in_flight`个) -> 合并批次 -> POST
+
+批次大于1时，请求体为事件的json数组
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+from wechatbot_client.driver import Response
+from wechatbot_client.exception import WebhookFailed
+from wechatbot_client.metrics import DELIVERY_SECONDS, metrics
+from wechatbot_client.utils import logger_wrapper
+
+from .payload import Payload
+
+log = logger_wrapper("Webhook")
+
+MAX_BACKOFF = 30.0
+"""重试间隔上限，单位秒"""
+HALF_OPEN_POLL = 1.0
+"""熔断试探期间其他请求的等待间隔，单位秒"""
+
+
+class CircuitBreaker:
+    """
+    熔断器，连续失败达到阈值后在冷却时间内拒绝请求，
+    冷却结束后只放行一个试探请求，成功则恢复
+    """
+
+    threshold: int
+    """连续失败阈值，0 表示不熔断"""
+    cooldown: float
+    """熔断冷却时间，单位秒"""
+    failures: int
+    """连续失败次数"""
+    opened: int
+    """熔断次数"""
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """熔断状态: closed、open、half_open"""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> float:
+        """
+        说明:
+            请求前调用，判断是否放行
+
+        返回:
+            * `float`: 需要等待的秒数，0 表示放行
+        """
+        if self._opened_at is None:
+            return 0
+        remain = self._opened_at + self.cooldown - time.monotonic()
+        if remain > 0:
+            return remain
+        if self._trial:
+            return HALF_OPEN_POLL
+        self._trial = True
+        return 0
+
+    def success(self) -> None:
+        """请求成功"""
+        if self._opened_at is not None:
+            log("SUCCESS", "<g>webhook地址恢复，关闭熔断...</g>")
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def failure(self) -> None:
+        """请求失败"""
+        self.failures += 1
+        if self._trial or (self.threshold > 0 and self.failures == self.threshold):
+            self._opened_at = time.monotonic()
+            self._trial = False
+            self.opened += 1
+
+
+class WebhookEndpoint:
+    """
+    单个webhook上报地址
+    """
+
+    url: str
+    """上报地址"""
+    max_in_flight: int
+    """同时进行的请求数量上限"""
+    batch_size: int
+    """单次请求的事件数量上限，1 表示不合并"""
+    flush_interval: float
+    """合并批次时等待后续事件的最长时间，单位秒"""
+    retries: int
+    """失败后的重试次数"""
+    backoff: float
+    """首次重试间隔，单位秒，之后每次翻倍"""
+    breaker: CircuitBreaker
+    """熔断器"""
+    delivered: int
+    """成功上报的事件数量"""
+    retried: int
+    """重试的请求数量"""
+    dropped: int
+    """丢弃的事件数量(队列溢出、重试耗尽或被应用端拒绝)"""
+
+    def __init__(
+        self,
+        url: str,
+        request: Callable[[str, str], Awaitable[Response]],
+        *,
+        queue_size: int,
+        max_in_flight: int,
+        batch_size: int,
+        flush_interval: float,
+        retries: int,
+        backoff: float,
+        breaker_threshold: int,
+        breaker_cooldown: float,
+    ) -> None:
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.delivered = 0
+        self.retried = 0
+        self.dropped = 0
+        self._request = request
+        self._queue: asyncio.Queue[Payload] = asyncio.Queue(queue_size)
+        self._workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        """开启worker"""
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.max_in_flight)
+        ]
+
+    async def stop(self) -> None:
+        """停止worker，丢弃未发送的事件"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def put(self, payload: Payload) -> None:
+        """
+        说明:
+            事件加入上报队列，队列已满时丢弃最旧的事件
+
+        参数:
+            * `payload`: 编码后的事件
+        """
+        if self._queue.full():
+            self._finish([self._queue.get_nowait()], "dropped")
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                log(
+                    "WARNING",
+                    f"<y>webhook {self.url} 上报缓慢，已丢弃 {self.dropped} 个事件...</y>",
+                )
+        self._queue.put_nowait(payload)
+        if payload.trace is not None:
+            payload.trace.hold()
+
+    def _finish(self, payloads: list[Payload], status: str) -> None:
+        """批次发送完成或被丢弃，结束追踪中的这个上报端"""
+        for payload in payloads:
+            trace = payload.trace
+            if trace is not None:
+                trace.add_span("webhook", payload.created, url=self.url, status=status)
+                trace.release()
+
+    async def _next_batch(self) -> list[Payload]:
+        """取出一个批次，不足批次大小时最多等待`flush_interval`"""
+        queue = self._queue
+        batch = [await queue.get()]
+        if self.batch_size <= 1:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remain = deadline - time.monotonic()
+            if remain <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remain))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.send(batch)
+            except Exception as e:
+                self._finish(batch, "failed")
+                self.dropped += len(batch)
+                log("ERROR", f"<r>webhook {self.url} 上报失败，丢弃 {len(batch)} 个事件: {e}</r>")
+
+    async def send(self, payloads: list[Payload]) -> None:
+        """
+        说明:
+            发送一个批次，失败时按指数退避重试，熔断期间等待冷却结束。
+            应用端明确拒绝(4xx，429除外)时不重试，直接丢弃
+
+        参数:
+            * `payloads`: 事件批次
+
+        错误:
+            * `WebhookFailed`: 重试耗尽
+            * `Exception`: 重试耗尽时最后一次请求的网络错误
+        """
+        if len(payloads) == 1:
+            body = payloads[0].json
+        else:
+            body = "[" + ",".join(payload.json for payload in payloads) + "]"
+        attempt = 0
+        while True:
+            wait = self.breaker.allow()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            error: Exception
+            try:
+                response = await self._request(self.url, body)
+            except Exception as e:
+                error = e
+            else:
+                status = response.status_code
+                if status < 400:
+                    self.breaker.success()
+                    self.delivered += len(payloads)
+                    if metrics.enabled:
+                        now = time.monotonic()
+                        for payload in payloads:
+                            DELIVERY_SECONDS.observe(now - payload.created, "webhook")
+                    self._finish(payloads, "ok")
+                    return
+                if status < 500 and status != 429:
+                    # 应用端可以访问，但拒绝了事件，重试没有意义
+                    self.breaker.success()
+                    self.dropped += len(payloads)
+                    self._finish(payloads, "rejected")
+                    log("ERROR", f"<r>webhook {self.url} 拒绝了事件，状态码: {status}</r>")
+                    return
+                error = WebhookFailed(self.url, status)
+            self.breaker.failure()
+            if attempt >= self.retries:
+                raise error
+            attempt += 1
+            self.retried += 1
+            await asyncio.sleep(min(self.backoff * 2 ** (attempt - 1), MAX_BACKOFF))
+
+    @property
+    def queued(self) -> int:
+        """队列中等待上报的事件数量"""
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """上报统计"""
+        return {
+            "url": self.url,
+            "queued": self.queued,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+        }
+
+
+def register_webhook_metrics(
+    get_endpoints: Callable[[], Iterable[WebhookEndpoint]]
+) -> None:
+    """
+    说明:
+        注册webhook上报指标
+
+    参数:
+        * `get_endpoints`: 返回当前所有上报地址
+    """
+    metrics.collector(
+        "wechat_webhook_queue_depth",
+        "webhook上报队列中的事件数量",
+        ("url",),
+        lambda: [
+            ((endpoint.url,), endpoint.queued) for endpoint in get_endpoints()
+        ],
+    )
+    metrics.collector(
+        "wechat_webhook_events_total",
+        "webhook上报成功与丢弃的事件数量",
+        ("url", "result"),
+        lambda: [
+            ((endpoint.url, key), getattr(endpoint, key))
+            for endpoint in get_endpoints()
+            for key in ("delivered", "dropped")
+        ],
+        type="counter",
+    )
+    metrics.collector(
+        "wechat_webhook_breaker_open",
+        "webhook是否处于熔断状态",
+        ("url",),
+        lambda: [
+            ((endpoint.url,), int(endpoint.breaker.state != "closed"))
+            for endpoint in get_endpoints()
+        ],
+    )
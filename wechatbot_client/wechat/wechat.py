@@ -1,5 +1,6 @@
 import time
 from pathlib import Path
+from typing import AsyncGenerator, Optional, Union
 from uuid import uuid4
 
 from pydantic import ValidationError
@@ -12,21 +13,38 @@ from wechatbot_client.action_manager import (
     WsActionResponse,
     check_action_params,
 )
-from wechatbot_client.com_wechat import Message, MessageHandler
+from wechatbot_client.com_wechat import (
+    Message,
+    MessageHandler,
+    MessageRecord,
+    WxType,
+    is_member_notice,
+    parse_message,
+)
 from wechatbot_client.config import Config
-from wechatbot_client.consts import FILE_CACHE
+from wechatbot_client.consts import (
+    DATABASE_PATH,
+    FILE_CACHE,
+    MSG_SPILL_FILE,
+    PREFIX,
+)
 from wechatbot_client.file_manager import FileManager
+from wechatbot_client.log import register_log_metrics
+from wechatbot_client.metrics import MESSAGES, PARSE_FAILURES, metrics
 from wechatbot_client.onebot12 import (
     BotSelf,
     BotStatus,
     Event,
+    LiteEvent,
     Status,
     StatusUpdateEvent,
 )
+from wechatbot_client.trace import current_trace, tracer
 from wechatbot_client.typing import overrides
 from wechatbot_client.utils import logger_wrapper
 
 from .adapter import Adapter
+from .pipeline import MessagePipeline
 
 log = logger_wrapper("WeChat Manager")
 
@@ -44,13 +62,42 @@ class WeChatManager(Adapter):
     """api管理模块"""
     message_handler: MessageHandler
     """消息处理器"""
+    pipeline: MessagePipeline
+    """接收消息流水线"""
 
     def __init__(self, config: Config) -> None:
         super().__init__(config)
         self.self_id = None
         self.message_handler = None
         self.action_manager = ActionManager()
-        self.file_manager = FileManager()
+        self.file_manager = FileManager(self.driver.get_http_client)
+        self.pipeline = MessagePipeline(
+            parser=self.parse_msg,
+            handler=self.handle_msg,
+            maxsize=config.msg_queue_size,
+            worker_count=config.msg_workers,
+            policy=config.msg_overflow_policy,
+            spill_path=Path(f"./{DATABASE_PATH}") / MSG_SPILL_FILE,
+        )
+        metrics.enabled = config.metrics_enabled
+        if metrics.enabled:
+            self.register_metrics()
+        tracer.configure(
+            config.trace_sample_rate,
+            config.trace_buffer_size,
+            config.trace_export,
+            config.log_days,
+        )
+
+    @overrides(Adapter)
+    def register_metrics(self) -> None:
+        """注册各模块的指标"""
+        super().register_metrics()
+        self.pipeline.register_metrics()
+        self.action_manager.send_scheduler.register_metrics()
+        self.action_manager.com.register_metrics()
+        self.action_manager.com_api.group_members.register_metrics()
+        register_log_metrics()
 
     def init(self) -> None:
         """
@@ -68,14 +115,22 @@ class WeChatManager(Adapter):
         self.message_handler = MessageHandler(
             image_path, voice_path, video_path, self.file_manager
         )
-        self.action_manager.register_message_handler(self.handle_msg)
+        self.action_manager.register_message_handler(self.pipeline.put)
         log("DEBUG", "<g>微信id获取成功...</g>")
         log("INFO", "<g>初始化完成，启动uvicorn...</g>")
 
+    async def refresh_contacts(self) -> None:
+        """
+        重新加载通讯录
+        """
+        nums = await self.action_manager.refresh_contacts()
+        log("DEBUG", f"通讯录刷新完成，共 {nums} 个联系人")
+
     def open_recv_msg(self, file_path: str) -> None:
         """
         开始接收消息
         """
+        self.pipeline.start()
         self.action_manager.open_recv_msg(file_path)
 
     def close(self) -> None:
@@ -83,31 +138,15 @@ class WeChatManager(Adapter):
         管理微信管理模块
         """
         self.action_manager.close()
+        self.pipeline.stop()
+        tracer.stop()
 
     @overrides(Adapter)
     async def action_request(self, request: ActionRequest) -> ActionResponse:
         """
         发起action请求
         """
-        # 验证action
-        try:
-            action_name, action_model = check_action_params(request)
-        except TypeError:
-            return ActionResponse(
-                status="failed",
-                retcode=10002,
-                data=None,
-                message=f"未实现的action: {request.action}",
-            )
-        except ValueError:
-            return ActionResponse(
-                status="failed",
-                retcode=10003,
-                data=None,
-                message="Param参数错误",
-            )
-        # 调用api
-        return await self.action_manager.request(action_name, action_model)
+        return await self.action_manager.call_action(request)
 
     @overrides(Adapter)
     def get_status_update_event(slef) -> StatusUpdateEvent:
@@ -132,15 +171,73 @@ class WeChatManager(Adapter):
         )
         return WsActionResponse(echo=echo, **response.dict())
 
-    async def handle_msg(self, msg: str) -> None:
+    @overrides(Adapter)
+    async def action_ws_responses(
+        self, request: WsActionRequest
+    ) -> AsyncGenerator[WsActionResponse, None]:
         """
-        消息处理函数
+        处理ws请求，`stream`为真的批量action每完成一项就返回一帧，最后返回汇总帧
         """
+        if request.action != f"{PREFIX}.batch" or not request.params.get("stream"):
+            yield await self.action_ws_request(request)
+            return
+        echo = request.echo
         try:
-            message = Message.parse_raw(msg)
+            _, model = check_action_params(
+                ActionRequest(action=request.action, params=request.params)
+            )
+        except ValueError:
+            yield WsActionResponse(
+                echo=echo, status="failed", retcode=10003, data=None, message="Param参数错误"
+            )
+            return
+        if error := self.action_manager.check_batch(model.actions, model.concurrency):
+            yield WsActionResponse(echo=echo, **error.dict())
+            return
+        failed = 0
+        async for index, response in self.action_manager.run_batch(
+            model.actions, model.concurrency, model.ordered
+        ):
+            if response.status != "ok":
+                failed += 1
+            yield WsActionResponse(
+                echo=echo,
+                status="ok",
+                retcode=0,
+                data={"index": index, "done": False, "response": response},
+            )
+        yield WsActionResponse(
+            echo=echo,
+            status="ok",
+            retcode=0,
+            data={"done": True, "total": len(model.actions), "failed": failed},
+        )
+
+    def parse_msg(self, msg: str) -> Optional[Union[Message, MessageRecord]]:
+        """
+        解析原始消息，失败返回None
+        """
+        try:
+            return parse_message(msg)
         except ValidationError as e:
             log("ERROR", f"微信消息实例化失败:{e}")
-            return
+            if metrics.enabled:
+                PARSE_FAILURES.inc()
+            return None
+
+    async def handle_msg(self, message: Message) -> None:
+        """
+        消息处理函数
+        """
+        if metrics.enabled:
+            MESSAGES.inc(message.type.name)
+        if message.type in (WxType.SYSTEM_NOTICE, WxType.SYSTEM_MSG):
+            # 添加好友、加入群聊时会收到系统消息，借此增量更新通讯录
+            await self.action_manager.sync_contact(message.sender)
+            if message.sender.endswith("@chatroom") and is_member_notice(
+                message.type, message.message
+            ):
+                await self.action_manager.invalidate_group_members(message.sender)
         if message.isSendMsg:
             await self.handle_self_msg(message)
         else:
@@ -159,13 +256,24 @@ class WeChatManager(Adapter):
         """
         处理event消息
         """
+        trace = current_trace.get() if tracer.enabled else None
+        begin = time.monotonic()
         try:
-            event: Event = await self.message_handler.message_to_event(msg)
+            event: Union[Event, LiteEvent] = await self.message_handler.message_to_event(
+                msg
+            )
         except Exception as e:
+            if trace is not None:
+                trace.add_span("message_to_event", begin, status="failed")
             log("ERROR", f"生成事件出错:{e}")
             return
+        if trace is not None:
+            trace.add_span("message_to_event", begin, event=event is not None)
         if event is None:
             log("DEBUG", "未生成合适事件")
             return
-        log("SUCCESS", f"生成事件<g>[{event.__repr_name__()}]</g>:{event.dict()}")
+        log(
+            "SUCCESS",
+            lambda: f"生成事件<g>[{event.__repr_name__()}]</g>:{event.dict()}",
+        )
         await self.handle_event(event)
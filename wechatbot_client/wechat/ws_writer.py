@@ -0,0 +1,246 @@
+"""
+websocket连接的发送队列，每个连接有独立的有界队列与发送任务，
+单个连接发送缓慢不会影响其他连接，也不会无限占用内存
+"""
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional, Union
+
+from wechatbot_client.config import WsOverflowPolicy
+from wechatbot_client.driver import BackwardWebSocket, FastAPIWebSocket
+from wechatbot_client.metrics import DELIVERY_SECONDS, metrics
+from wechatbot_client.utils import logger_wrapper
+
+from .payload import EventPayload
+
+log = logger_wrapper("WebSocket")
+
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+"""队列溢出断开连接时使用的关闭码"""
+WS_CLOSE_INTERNAL_ERROR = 1011
+"""发送失败断开连接时使用的关闭码"""
+
+
+class WebSocketWriter:
+    """
+    单个websocket连接的事件发送队列
+    """
+
+    seq: int
+    """连接编号"""
+    websocket: Union[FastAPIWebSocket, BackwardWebSocket]
+    """websocket连接"""
+    max_size: int
+    """队列大小上限"""
+    policy: WsOverflowPolicy
+    """队列溢出策略"""
+    sent: int
+    """已发送的事件数量"""
+    dropped: int
+    """丢弃的事件数量"""
+    coalesced: int
+    """被更新的元事件替换的事件数量"""
+    max_depth: int
+    """队列曾达到的最大长度"""
+    lag: float
+    """最近发送的事件在队列中等待的时间，单位秒"""
+
+    def __init__(
+        self,
+        seq: int,
+        websocket: Union[FastAPIWebSocket, BackwardWebSocket],
+        encode: Callable[[EventPayload], Union[str, bytes]],
+        max_size: int,
+        policy: WsOverflowPolicy,
+    ) -> None:
+        self.seq = seq
+        self.websocket = websocket
+        self.max_size = max_size
+        self.policy = policy
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.lag = 0.0
+        self._encode = encode
+        self._queue: deque[tuple[float, EventPayload]] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def depth(self) -> int:
+        """队列中待发送的事件数量"""
+        return len(self._queue)
+
+    def start(self) -> None:
+        """开启发送任务"""
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """停止发送任务，丢弃未发送的事件"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._discard(self._queue)
+        self._queue.clear()
+
+    def _finish(self, queued_at: float, payload: EventPayload, status: str) -> None:
+        """事件发送完成或被丢弃，结束追踪中的这个上报端"""
+        trace = payload.trace
+        if trace is not None:
+            trace.add_span("websocket", queued_at, seq=self.seq, status=status)
+            trace.release()
+
+    def _discard(self, items: Iterable[tuple[float, EventPayload]]) -> None:
+        """结束被丢弃事件的追踪"""
+        for queued_at, payload in items:
+            self._finish(queued_at, payload, "dropped")
+
+    def put(self, payload: EventPayload) -> bool:
+        """
+        说明:
+            事件加入发送队列，队列已满时按溢出策略处理
+
+        参数:
+            * `payload`: 编码后的事件
+
+        返回:
+            * `bool`: 事件是否加入了队列
+        """
+        if self._closing:
+            return False
+        if len(self._queue) >= self.max_size and not self._overflow():
+            return False
+        # 合并元事件时会替换队列
+        queue = self._queue
+        queue.append((time.monotonic(), payload))
+        if payload.trace is not None:
+            payload.trace.hold()
+        if len(queue) > self.max_depth:
+            self.max_depth = len(queue)
+        self._ready.set()
+        return True
+
+    def _overflow(self) -> bool:
+        """队列已满时的处理，返回新事件能否加入队列"""
+        if self.policy == WsOverflowPolicy.Disconnect:
+            self._closing = True
+            self.dropped += len(self._queue) + 1
+            self._discard(self._queue)
+            self._queue.clear()
+            log(
+                "WARNING",
+                f"<y>编号为: {self.seq} 的websocket发送队列已满，断开连接...</y>",
+            )
+            asyncio.create_task(
+                self._close(WS_CLOSE_TRY_AGAIN_LATER, "send queue overflow")
+            )
+            return False
+        if self.policy == WsOverflowPolicy.Coalesce and self._coalesce():
+            return True
+        self._discard((self._queue.popleft(),))
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            log(
+                "WARNING",
+                f"<y>编号为: {self.seq} 的websocket发送缓慢，"
+                f"已丢弃 {self.dropped} 个事件...</y>",
+            )
+        return True
+
+    def _coalesce(self) -> bool:
+        """
+        移除队列中已被更新的元事件替代的元事件(心跳、状态更新等)，
+        每种元事件只保留最新的一个，返回是否腾出了空位
+        """
+        latest: set[str] = set()
+        kept: deque[tuple[float, EventPayload]] = deque()
+        for item in reversed(self._queue):
+            event = item[1].event
+            if event.type == "meta":
+                if event.detail_type in latest:
+                    continue
+                latest.add(event.detail_type)
+            kept.appendleft(item)
+        removed = len(self._queue) - len(kept)
+        if removed == 0:
+            return False
+        self.coalesced += removed
+        self._queue = kept
+        return True
+
+    async def _close(self, code: int, reason: str) -> None:
+        with contextlib.suppress(Exception):
+            await self.websocket.close(code, reason)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            queued_at, payload = self._queue.popleft()
+            try:
+                await self.websocket.send(self._encode(payload))
+            except Exception as e:
+                # 连接已不可用，丢弃剩余事件并断开，由连接处理移除发送队列
+                self._closing = True
+                self._finish(queued_at, payload, "failed")
+                dropped = len(self._queue) + 1
+                self.dropped += dropped
+                self._discard(self._queue)
+                self._queue.clear()
+                log(
+                    "ERROR",
+                    f"发送ws消息出错，编号: {self.seq}:{e}，"
+                    f"断开连接，丢弃 {dropped} 个事件",
+                )
+                await self._close(WS_CLOSE_INTERNAL_ERROR, "send failed")
+                return
+            self.sent += 1
+            now = time.monotonic()
+            self.lag = now - queued_at
+            if metrics.enabled:
+                DELIVERY_SECONDS.observe(now - payload.created, "websocket")
+            if payload.trace is not None:
+                self._finish(queued_at, payload, "ok")
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        """发送统计，`lag`单位为毫秒"""
+        return {
+            "seq": self.seq,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "lag": round(self.lag * 1000, 3),
+        }
+
+
+def register_ws_metrics(get_writers: Callable[[], Iterable[WebSocketWriter]]) -> None:
+    """
+    说明:
+        注册websocket发送队列指标
+
+    参数:
+        * `get_writers`: 返回当前所有连接的发送队列
+    """
+    metrics.collector(
+        "wechat_ws_queue_depth",
+        "websocket连接发送队列中的事件数量",
+        ("seq",),
+        lambda: [((str(writer.seq),), writer.depth) for writer in get_writers()],
+    )
+    metrics.collector(
+        "wechat_ws_events_total",
+        "websocket连接发送、丢弃与合并的事件数量",
+        ("seq", "result"),
+        lambda: [
+            ((str(writer.seq), key), getattr(writer, key))
+            for writer in get_writers()
+            for key in ("sent", "dropped", "coalesced")
+        ],
+        type="counter",
+    )